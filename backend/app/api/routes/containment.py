@@ -1,9 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import csv
+import io
+import json
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import StreamingResponse
+from sqlalchemy import case, exists, func
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Dict, Any, Literal, Optional
 from app.core.database import get_db
-from app.integrations.firewall import FirewallIntegration
-from app.models.database import Incident, BlockedIP
+from app.integrations.firewall_stats import firewall_stats
+from app.integrations.allowlist import protected_ranges
+from app.integrations.action_log import action_log, action_summary, query_actions, iter_actions
+from app.integrations.blocklist import BlocklistManager
+from app.integrations.containment_jobs import enqueue_job, job_summary
+from app.integrations.reconciliation import reconcile_firewall, reconciliation_metrics
+from app.core.config import settings
+from app.core.ip_index import IPRangeIndex, parse_network
+from app.models.database import Incident, Alert, BlockedIP, ContainmentJob, ProtectedRange
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -13,6 +26,24 @@ class BlockIPRequest(BaseModel):
     ip_addresses: List[str]
     reason: str
     incident_id: int
+    ttl_seconds: Optional[int] = None  # None = BLOCK_DEFAULT_TTL_SECONDS, 0 = permanent
+
+class UnblockIPsRequest(BaseModel):
+    ip_addresses: List[str]
+    incident_id: int
+
+class RateLimitRequest(BaseModel):
+    config: Dict[str, Any]
+    incident_id: Optional[int] = None
+
+class FirewallRuleRequest(BaseModel):
+    rule: Dict[str, Any]
+    incident_id: Optional[int] = None
+
+class ProtectedRangeRequest(BaseModel):
+    network: str
+    label: str
+    category: str = "allowlist"
 
 class ContainmentStatus(BaseModel):
     blocked_ips: List[str]
@@ -20,55 +51,96 @@ class ContainmentStatus(BaseModel):
     blocked_connections: int
     rate_limiting_active: bool
 
+SEVERITY_RANK = {"low": 1, "medium": 2, "high": 3, "critical": 4}
+
 @router.get("/incident/{incident_id}/attacker-ips")
-async def get_attacker_ips(incident_id: int, db: Session = Depends(get_db)):
-    """Get list of attacker IPs for the incident"""
+async def get_attacker_ips(incident_id: int, limit: int = 1000, db: Session = Depends(get_db)):
+    """Get attacker IPs for the incident, aggregated from its linked alerts"""
     incident = db.query(Incident).filter(Incident.id == incident_id).first()
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
-    # Extract IPs from detection data and alerts
-    attacker_ips = []
-    if incident.detection_data and "suspicious_ips" in incident.detection_data:
-        attacker_ips.extend(incident.detection_data["suspicious_ips"])
+    # One GROUP BY over the (incident_id, source_ip, severity, created_at)
+    # index; the blocked flag is a correlated EXISTS on blocked_ips.ip_address
+    severity_rank = case(
+        *[(Alert.severity == name, rank) for name, rank in SEVERITY_RANK.items()], else_=0
+    )
+    blocked = exists().where(BlockedIP.ip_address == Alert.source_ip, BlockedIP.is_active == True)
+    rows = db.query(
+        Alert.source_ip,
+        func.count(Alert.id).label("alert_count"),
+        func.min(Alert.created_at).label("first_seen"),
+        func.max(Alert.created_at).label("last_seen"),
+        func.max(severity_rank).label("severity_rank"),
+        blocked.label("blocked")
+    ).filter(
+        Alert.incident_id == incident_id,
+        Alert.source_ip.isnot(None),
+        Alert.source_ip != ""
+    ).group_by(Alert.source_ip).order_by(func.count(Alert.id).desc()).limit(limit).all()
     
-    # Get IPs from related alerts
-    # This would typically query the alerts table
+    # CIDR blocks cannot be matched by the EXISTS; there are few, so check them here
+    cidr_blocks = IPRangeIndex()
+    cidr_blocks.bulk_load(
+        (row.ip_address, row.ip_address)
+        for row in db.query(BlockedIP.ip_address).filter(BlockedIP.is_active == True, BlockedIP.ip_address.contains("/"))
+    )
+    severity_names = {rank: name for name, rank in SEVERITY_RANK.items()}
+    attackers = [
+        {
+            "ip": row.source_ip,
+            "alert_count": row.alert_count,
+            "first_seen": row.first_seen.isoformat() if row.first_seen else None,
+            "last_seen": row.last_seen.isoformat() if row.last_seen else None,
+            "max_severity": severity_names.get(row.severity_rank),
+            "blocked": bool(row.blocked) or (len(cidr_blocks) > 0 and cidr_blocks.contains(row.source_ip))
+        }
+        for row in rows
+    ]
+    
+    # IPs recorded on the incident itself (e.g. from manual analysis)
+    seen = {attacker["ip"] for attacker in attackers}
+    extra = [ip for ip in dict.fromkeys((incident.detection_data or {}).get("suspicious_ips", [])) if ip not in seen]
+    if extra:
+        blocked_extra = {
+            row.ip_address for row in db.query(BlockedIP.ip_address).filter(
+                BlockedIP.ip_address.in_(extra), BlockedIP.is_active == True
+            )
+        }
+        attackers.extend(
+            {"ip": ip, "alert_count": 0, "first_seen": None, "last_seen": None, "max_severity": None,
+             "blocked": ip in blocked_extra or (len(cidr_blocks) > 0 and cidr_blocks.contains(ip))}
+            for ip in extra
+        )
     
     return {
         "incident_id": incident_id,
-        "attacker_ips": list(set(attacker_ips)),
-        "total_count": len(set(attacker_ips))
+        "attacker_ips": [attacker["ip"] for attacker in attackers],
+        "attackers": attackers,
+        "total_count": len(attackers)
     }
 
-@router.post("/block-ips")
-async def block_ips(request: BlockIPRequest, db: Session = Depends(get_db)):
-    """Block IP addresses on firewall"""
+@router.post("/block-ips", status_code=202)
+async def block_ips(request: BlockIPRequest, idempotency_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """Queue blocking of IP addresses on the firewall; poll /jobs/{job_id} for the outcome"""
+    # Addresses inside allowlisted / critical ranges are refused up front
+    conflicts = protected_ranges.conflicts(request.ip_addresses)
+    ip_addresses = [ip for ip in request.ip_addresses if ip not in conflicts]
+    if not ip_addresses:
+        raise HTTPException(status_code=409, detail={
+            "message": "All requested IP addresses are protected; nothing queued",
+            "conflicts": conflicts
+        })
     try:
-        firewall = FirewallIntegration()
-        
-        blocked_ips = []
-        for ip in request.ip_addresses:
-            # Block on firewall
-            success = await firewall.block_ip(ip, request.reason)
-            
-            if success:
-                # Record in database
-                blocked_ip = BlockedIP(
-                    incident_id=request.incident_id,
-                    ip_address=ip,
-                    reason=request.reason,
-                    is_active=True
-                )
-                db.add(blocked_ip)
-                blocked_ips.append(ip)
-        
-        db.commit()
-        
+        job, created = enqueue_job(db, "block", {
+            "ip_addresses": ip_addresses,
+            "reason": request.reason,
+            "ttl_seconds": request.ttl_seconds
+        }, request.incident_id, idempotency_key)
         return {
-            "message": f"Successfully blocked {len(blocked_ips)} IP addresses",
-            "blocked_ips": blocked_ips,
-            "failed_ips": [ip for ip in request.ip_addresses if ip not in blocked_ips]
+            "message": f"Blocking of {len(ip_addresses)} IP addresses queued" if created else "Duplicate request; returning the original job",
+            "conflicts": conflicts,
+            **job_summary(job)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to block IPs: {str(e)}")
@@ -83,45 +155,129 @@ async def get_containment_status(incident_id: int, db: Session = Depends(get_db)
             BlockedIP.is_active == True
         ).all()
         
-        firewall = FirewallIntegration()
-        connection_stats = await firewall.get_connection_stats()
+        # Shared snapshot refreshed in the background, not a device call per request
+        connection_stats = await firewall_stats.get()
         
         return {
             "incident_id": incident_id,
             "blocked_ips_count": len(blocked_ips),
             "blocked_ips": [ip.ip_address for ip in blocked_ips],
-            "active_connections": connection_stats["active"],
-            "blocked_connections": connection_stats["blocked"],
-            "rate_limiting_active": connection_stats["rate_limiting"],
-            "last_updated": datetime.utcnow()
+            "active_connections": connection_stats.get("active", 0),
+            "blocked_connections": connection_stats.get("blocked", 0),
+            "rate_limiting_active": connection_stats.get("rate_limiting", False),
+            "last_updated": datetime.utcnow(),
+            **firewall_stats.metadata()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get status: {str(e)}")
 
-@router.post("/unblock-ip/{ip_address}")
-async def unblock_ip(ip_address: str, incident_id: int, db: Session = Depends(get_db)):
-    """Unblock a specific IP address"""
+@router.post("/unblock-ip/{ip_address}", status_code=202)
+async def unblock_ip(ip_address: str, incident_id: int, idempotency_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """Queue unblocking of a specific IP address"""
     try:
-        firewall = FirewallIntegration()
-        success = await firewall.unblock_ip(ip_address)
-        
-        if success:
-            # Update database
-            blocked_ip = db.query(BlockedIP).filter(
-                BlockedIP.ip_address == ip_address,
-                BlockedIP.incident_id == incident_id,
-                BlockedIP.is_active == True
-            ).first()
-            
-            if blocked_ip:
-                blocked_ip.is_active = False
-                blocked_ip.unblocked_at = datetime.utcnow()
-                db.commit()
-        
-        return {"message": f"IP {ip_address} unblocked successfully"}
+        job, _ = enqueue_job(db, "unblock", {"ip_addresses": [ip_address]}, incident_id, idempotency_key)
+        return {"message": f"Unblock of IP {ip_address} queued", **job_summary(job)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to unblock IP: {str(e)}")
 
+@router.post("/unblock-ips", status_code=202)
+async def unblock_ips(request: UnblockIPsRequest, idempotency_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """Queue unblocking of multiple IP addresses"""
+    try:
+        job, _ = enqueue_job(db, "unblock", {"ip_addresses": request.ip_addresses}, request.incident_id, idempotency_key)
+        return {"message": f"Unblock of {len(request.ip_addresses)} IP addresses queued", **job_summary(job)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to unblock IPs: {str(e)}")
+
+@router.post("/rate-limiting", status_code=202)
+async def enable_rate_limiting(request: RateLimitRequest, idempotency_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """Queue enabling rate limiting on the firewall"""
+    try:
+        job, _ = enqueue_job(db, "rate_limit", request.config, request.incident_id, idempotency_key)
+        return {"message": "Rate limiting queued", **job_summary(job)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to enable rate limiting: {str(e)}")
+
+@router.post("/rules", status_code=202)
+async def create_rule(request: FirewallRuleRequest, idempotency_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """Queue creation of a firewall rule"""
+    try:
+        job, _ = enqueue_job(db, "rule", request.rule, request.incident_id, idempotency_key)
+        return {"message": "Firewall rule queued", **job_summary(job)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create rule: {str(e)}")
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Status and result of a containment job"""
+    job = db.query(ContainmentJob).filter(ContainmentJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_summary(job)
+
+@router.get("/jobs")
+async def list_jobs(incident_id: Optional[int] = None, status: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db)):
+    """Recent containment jobs, newest first"""
+    query = db.query(ContainmentJob)
+    if incident_id is not None:
+        query = query.filter(ContainmentJob.incident_id == incident_id)
+    if status:
+        query = query.filter(ContainmentJob.status == status)
+    jobs = query.order_by(ContainmentJob.id.desc()).limit(limit).all()
+    return {"jobs": [job_summary(job) for job in jobs], "total": len(jobs)}
+
+@router.get("/protected-ranges")
+async def get_protected_ranges(db: Session = Depends(get_db)):
+    """Ranges that block requests are checked against"""
+    rows = db.query(ProtectedRange).filter(ProtectedRange.is_active == True).all()
+    return {
+        "ranges": [{"id": r.id, "network": r.network, "label": r.label, "category": r.category} for r in rows],
+        "config_ranges": [n.strip() for n in settings.FIREWALL_ALLOWLIST.split(",") if n.strip()]
+    }
+
+@router.post("/protected-ranges")
+async def add_protected_range(request: ProtectedRangeRequest, db: Session = Depends(get_db)):
+    """Protect an address or CIDR from blocking"""
+    if parse_network(request.network) is None:
+        raise HTTPException(status_code=400, detail=f"Invalid network: {request.network}")
+    row = ProtectedRange(network=request.network, label=request.label, category=request.category, is_active=True)
+    db.add(row)
+    db.commit()
+    protected_ranges.reload(db)
+    return {"message": f"{request.network} is now protected", "id": row.id}
+
+@router.delete("/protected-ranges/{range_id}")
+async def remove_protected_range(range_id: int, db: Session = Depends(get_db)):
+    """Stop protecting a range"""
+    row = db.query(ProtectedRange).filter(ProtectedRange.id == range_id, ProtectedRange.is_active == True).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Protected range not found")
+    row.is_active = False
+    db.commit()
+    protected_ranges.reload(db)
+    return {"message": f"{row.network} is no longer protected"}
+
+@router.post("/blocklist/compile")
+async def compile_blocklist(dry_run: bool = True, tolerance: Optional[float] = None, db: Session = Depends(get_db)):
+    """Aggregate active blocks into covering prefixes and push only the changed rules"""
+    try:
+        return await BlocklistManager(db).compile_and_apply(tolerance, dry_run)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to compile blocklist: {str(e)}")
+
+@router.post("/reconcile")
+async def reconcile(dry_run: bool = False, db: Session = Depends(get_db)):
+    """Diff the device blocklist against our records and correct the drift"""
+    try:
+        return await reconcile_firewall(db, dry_run)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to reconcile firewall: {str(e)}")
+
+@router.get("/reconcile/status")
+async def get_reconcile_status():
+    """Drift size and timing of recent reconciliation runs"""
+    return reconciliation_metrics
+
 @router.post("/containment-complete/{incident_id}")
 async def mark_containment_complete(incident_id: int, db: Session = Depends(get_db)):
     """Mark containment phase as complete and move to eradication"""
@@ -153,16 +309,42 @@ async def mark_containment_complete(incident_id: int, db: Session = Depends(get_
     }
 
 @router.get("/logs/{incident_id}")
-async def get_containment_logs(incident_id: int):
-    """Get logs of containment actions"""
+async def get_containment_logs(incident_id: int, limit: int = 100, cursor: Optional[str] = None,
+                               target: Optional[str] = None, db: Session = Depends(get_db)):
+    """Get logs of containment actions, newest first; pass next_cursor to page back"""
     try:
-        firewall = FirewallIntegration()
-        logs = await firewall.get_containment_logs(incident_id)
+        # Pending group-commit rows should be visible to the reader
+        await asyncio.to_thread(action_log.flush)
+        rows, next_cursor = query_actions(db, incident_id, min(max(limit, 1), 1000), cursor, target)
+        logs = [action_summary(row) for row in rows]
         
         return {
             "incident_id": incident_id,
             "logs": logs,
-            "total_actions": len(logs)
+            "total_actions": len(logs),
+            "next_cursor": next_cursor
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get logs: {str(e)}")
+
+@router.get("/logs/{incident_id}/export")
+async def export_containment_logs(incident_id: int, format: Literal["csv", "jsonl"] = "jsonl"):
+    """Stream every containment action of an incident as JSON lines or CSV"""
+    await asyncio.to_thread(action_log.flush)
+    
+    def generate():
+        if format == "csv":
+            yield "id,timestamp,action,target,result,user,details\n"
+        for row in iter_actions(incident_id):
+            entry = action_summary(row)
+            if format == "csv":
+                buffer = io.StringIO()
+                csv.writer(buffer).writerow([entry[k] for k in ("id", "timestamp", "action", "target", "result", "user", "details")])
+                yield buffer.getvalue()
+            else:
+                yield json.dumps(entry) + "\n"
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(generate(), media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename=containment-actions-{incident_id}.{'csv' if format == 'csv' else 'jsonl'}"
+    })
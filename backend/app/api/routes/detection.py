@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from itertools import chain
 from app.core.database import get_db
 from app.integrations.siem import SIEMIntegration
 from app.integrations.ids import IDSIntegration
-from app.models.database import Alert, Incident
+from app.integrations.alert_enrichment import AlertEnrichment
+from app.integrations.ioc_graph import pivot_graph, alert_edges, node_key
+from app.models.database import Alert, Incident, Notification
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -20,6 +23,7 @@ class AlertResponse(BaseModel):
     destination_ip: str
     created_at: datetime
     acknowledged: bool
+    triage_score: Optional[int] = None
 
 class ConfirmAttackRequest(BaseModel):
     alert_ids: List[int]
@@ -39,9 +43,13 @@ async def get_live_alerts(db: Session = Depends(get_db)):
         ids = IDSIntegration()
         ids_alerts = await ids.get_live_alerts()
         
+        # Match alert indicators against the local threat feed
+        enrichment = AlertEnrichment()
+        incoming = enrichment.enrich_alerts(siem_alerts + ids_alerts)
+        
         # Store alerts in database
         all_alerts = []
-        for alert_data in siem_alerts + ids_alerts:
+        for alert_data in incoming:
             alert = Alert(
                 source=alert_data["source"],
                 alert_type=alert_data["type"],
@@ -49,12 +57,16 @@ async def get_live_alerts(db: Session = Depends(get_db)):
                 severity=alert_data["severity"],
                 source_ip=alert_data.get("source_ip", ""),
                 destination_ip=alert_data.get("destination_ip", ""),
-                raw_data=alert_data
+                raw_data=alert_data,
+                triage_score=alert_data["triage_score"]
             )
             db.add(alert)
             all_alerts.append(alert)
         
         db.commit()
+        pivot_graph.link_many(chain.from_iterable(
+            alert_edges(alert.id, alert.incident_id, alert.raw_data or {}) for alert in all_alerts
+        ))
         
         # Return recent unacknowledged alerts
         recent_alerts = db.query(Alert).filter(
@@ -110,6 +122,7 @@ async def confirm_attack(request: ConfirmAttackRequest, db: Session = Depends(ge
             "incident_id": incident.id
         })
         db.commit()
+        pivot_graph.link_many((node_key("alert", alert_id), node_key("incident", incident.id)) for alert_id in request.alert_ids)
         
         return {
             "message": "Attack confirmed successfully",
@@ -147,3 +160,42 @@ async def acknowledge_alert(alert_id: int, db: Session = Depends(get_db)):
     db.commit()
     
     return {"message": "Alert acknowledged successfully"}
+
+@router.get("/notifications")
+async def get_notifications(incident_id: Optional[int] = None, unread_only: bool = True, limit: int = 50, db: Session = Depends(get_db)):
+    """Get analyst notifications, e.g. indicators newly flagged by a feed update"""
+    query = db.query(Notification)
+    if incident_id is not None:
+        query = query.filter(Notification.incident_id == incident_id)
+    if unread_only:
+        query = query.filter(Notification.read == False)
+    notifications = query.order_by(Notification.id.desc()).limit(min(limit, 500)).all()
+    
+    return {
+        "notifications": [
+            {
+                "id": n.id,
+                "incident_id": n.incident_id,
+                "category": n.category,
+                "severity": n.severity,
+                "message": n.message,
+                "details": n.details,
+                "read": n.read,
+                "created_at": n.created_at
+            }
+            for n in notifications
+        ],
+        "total_count": len(notifications)
+    }
+
+@router.post("/notifications/{notification_id}/read")
+async def mark_notification_read(notification_id: int, db: Session = Depends(get_db)):
+    """Mark a notification as read"""
+    notification = db.query(Notification).filter(Notification.id == notification_id).first()
+    if not notification:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    
+    notification.read = True
+    db.commit()
+    
+    return {"message": "Notification marked as read"}
@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import time
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from typing import List, Dict
-from app.core.database import get_db
+from typing import List, Dict, Optional, AsyncIterator
+from app.core.config import settings
+from app.core.database import get_db, SessionLocal
 from app.integrations.threat_intel import ThreatIntelIntegration
 from app.integrations.log_analysis import LogAnalysisIntegration
-from app.integrations.vulnerability import VulnerabilityIntegration
+from app.integrations.vulnerability import VulnerabilityIntegration, SEVERITIES
+from app.integrations.cve_store import import_vulnerability_data
+from app.integrations.feed_summary import build_feed_summary, feed_summary
+from app.integrations.patch_rollout import PatchRollout, patch_targets, rollouts, active_rollout, load_rollout
+from app.integrations.ioc_clusters import incident_clusters
+from app.integrations.ioc_graph import pivot_graph, start_node, node_key
 from app.models.database import Incident, ThreatIndicator
 from pydantic import BaseModel
 from datetime import datetime
@@ -53,38 +64,97 @@ async def get_log_analysis(incident_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to analyze logs: {str(e)}")
 
+def _ioc_result(indicator: str, intel: Dict) -> Dict:
+    return {
+        "indicator": indicator,
+        "malicious": True,
+        "sources": intel.get("sources", []),
+        "threat_score": intel.get("score", 0),
+        "first_seen": intel.get("first_seen"),
+        "last_seen": intel.get("last_seen")
+    }
+
+def _persist_indicators(rows: List[Dict]):
+    """Bulk insert of malicious hits, then the cluster and pivot indexes (run in a thread)"""
+    db = SessionLocal()
+    try:
+        db.execute(insert(ThreatIndicator), rows)
+        db.commit()
+    finally:
+        db.close()
+    for row in rows:
+        incident_clusters.add(row["incident_id"], row["indicator_type"], row["value"])
+    pivot_graph.link_many(
+        (node_key(row["indicator_type"], row["value"]), node_key("incident", row["incident_id"])) for row in rows
+    )
+
+async def _iter_ioc_search(request: IOCSearchRequest) -> AsyncIterator[Dict]:
+    """Result events as lookups finish, then a summary event.
+    
+    Malicious hits are written with bulk inserts every IOC_PERSIST_BATCH_SIZE
+    rows or IOC_PERSIST_FLUSH_SECONDS, and whatever is pending is written when
+    the search ends or the client goes away. Writes run in a worker thread so
+    the stream keeps flowing while they commit.
+    """
+    threat_intel = ThreatIntelIntegration()
+    pending: List[Dict] = []
+    last_flush = time.monotonic()
+    started = time.perf_counter()
+    searched = malicious = 0
+    
+    async def flush():
+        nonlocal pending, last_flush
+        rows, pending = pending, []
+        last_flush = time.monotonic()
+        if rows:
+            # Shielded: a client disconnect must not drop hits already found
+            await asyncio.shield(asyncio.to_thread(_persist_indicators, rows))
+    
+    try:
+        async for values, classified, intel in threat_intel.search_concurrently(request.indicators):
+            hit = bool(intel and intel.get("malicious", False))
+            if hit:
+                # Keyed on the canonical form so feed updates can re-score it
+                pending.append({
+                    "incident_id": request.incident_id,
+                    "indicator_type": intel["type"],
+                    "value": classified.canonical,
+                    "source": intel["source"],
+                    "threat_score": intel.get("score", 0),
+                    "indicator_metadata": intel
+                })
+            for indicator in values:
+                searched += 1
+                malicious += hit
+                yield {"type": "result", **(_ioc_result(indicator, intel) if hit else {"indicator": indicator, "malicious": False})}
+            
+            if len(pending) >= settings.IOC_PERSIST_BATCH_SIZE or time.monotonic() - last_flush >= settings.IOC_PERSIST_FLUSH_SECONDS:
+                await flush()
+        await flush()
+        yield {
+            "type": "summary",
+            "incident_id": request.incident_id,
+            "searched_indicators": searched,
+            "malicious_indicators": malicious,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    finally:
+        await flush()
+
 @router.post("/search-iocs")
-async def search_threat_indicators(request: IOCSearchRequest, db: Session = Depends(get_db)):
+async def search_threat_indicators(request: IOCSearchRequest):
     """Search threat intelligence for indicators of compromise"""
     try:
-        threat_intel = ThreatIntelIntegration()
-        
         ioc_results = []
-        for indicator in request.indicators:
-            # Search in threat intelligence feeds
-            intel_data = await threat_intel.search_indicator(indicator)
-            
-            if intel_data and intel_data.get("malicious", False):
-                # Store in database
-                threat_indicator = ThreatIndicator(
-                    incident_id=request.incident_id,
-                    indicator_type=intel_data["type"],
-                    value=indicator,
-                    source=intel_data["source"],
-                    threat_score=intel_data.get("score", 0),
-                    indicator_metadata=intel_data
-                )
-                db.add(threat_indicator)
-                ioc_results.append({
-                    "indicator": indicator,
-                    "malicious": True,
-                    "sources": intel_data.get("sources", []),
-                    "threat_score": intel_data.get("score", 0),
-                    "first_seen": intel_data.get("first_seen"),
-                    "last_seen": intel_data.get("last_seen")
-                })
+        async for event in _iter_ioc_search(request):
+            if event["type"] == "result" and event["malicious"]:
+                ioc_results.append({k: v for k, v in event.items() if k != "type"})
         
-        db.commit()
+        # Lookups finish out of order; report in submission order
+        position = {}
+        for i, indicator in enumerate(request.indicators):
+            position.setdefault(indicator, i)
+        ioc_results.sort(key=lambda r: position.get(r["indicator"], len(position)))
         
         return {
             "incident_id": request.incident_id,
@@ -95,6 +165,26 @@ async def search_threat_indicators(request: IOCSearchRequest, db: Session = Depe
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to search IOCs: {str(e)}")
 
+@router.post("/search-iocs/stream")
+async def stream_threat_indicators(request: IOCSearchRequest, format: str = "ndjson"):
+    """Search indicators concurrently and stream each result as it resolves (NDJSON or SSE)"""
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or sse")
+    
+    async def body():
+        try:
+            async for event in _iter_ioc_search(request):
+                if format == "sse":
+                    yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+                else:
+                    yield json.dumps(event, default=str) + "\n"
+        except Exception as e:
+            error = {"type": "error", "detail": f"Failed to search IOCs: {str(e)}"}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n" if format == "sse" else json.dumps(error) + "\n"
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
 @router.get("/vulnerabilities/{incident_id}")
 async def get_vulnerability_status(incident_id: int):
     """Get vulnerability and patch status"""
@@ -107,67 +197,72 @@ async def get_vulnerability_status(incident_id: int):
         # Get patch status
         patch_status = await vuln_scanner.get_patch_status()
         
+        by_severity = {severity: [] for severity in SEVERITIES}
+        patched = 0
+        for v in vulnerabilities:
+            if v["severity"] in by_severity:
+                by_severity[v["severity"]].append(v)
+            patched += bool(v.get("patched", False))
+        
         return {
             "incident_id": incident_id,
-            "vulnerabilities": {
-                "critical": [v for v in vulnerabilities if v["severity"] == "critical"],
-                "high": [v for v in vulnerabilities if v["severity"] == "high"],
-                "medium": [v for v in vulnerabilities if v["severity"] == "medium"],
-                "low": [v for v in vulnerabilities if v["severity"] == "low"]
-            },
+            "vulnerabilities": by_severity,
             "patch_status": patch_status,
             "summary": {
                 "total_vulnerabilities": len(vulnerabilities),
-                "patched": len([v for v in vulnerabilities if v.get("patched", False)]),
-                "pending_patches": len([v for v in vulnerabilities if not v.get("patched", False)])
+                "patched": patched,
+                "pending_patches": len(vulnerabilities) - patched,
+                "compliance": await vuln_scanner.get_incident_compliance(incident_id)
             }
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get vulnerability status: {str(e)}")
 
-@router.post("/apply-patches")
+@router.post("/vulnerability-data/import")
+async def import_vulnerability_feeds(force: bool = False):
+    """Import NVD_FEED_PATHS and ASSET_INVENTORY_PATH now (files unchanged since the last import are skipped unless forced)"""
+    try:
+        return await asyncio.to_thread(import_vulnerability_data, None, force)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to import vulnerability data: {str(e)}")
+
+@router.post("/apply-patches", status_code=202)
 async def apply_patches(request: PatchRequest, db: Session = Depends(get_db)):
-    """Apply patches for vulnerabilities"""
+    """Start a wave-based patch rollout; poll /patch-rollouts/{rollout_id} or eradication_data for progress"""
+    incident = db.query(Incident).filter(Incident.id == request.incident_id).first()
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    running = active_rollout(db, request.incident_id)
+    if running:
+        raise HTTPException(status_code=409, detail=f"Patch rollout {running.id} is already running for this incident")
     try:
-        vuln_scanner = VulnerabilityIntegration()
-        
-        patch_results = []
-        for vuln_id in request.vulnerability_ids:
-            result = await vuln_scanner.apply_patch(vuln_id)
-            patch_results.append({
-                "vulnerability_id": vuln_id,
-                "success": result["success"],
-                "message": result["message"]
-            })
-        
-        # Update incident data
-        incident = db.query(Incident).filter(Incident.id == request.incident_id).first()
-        if incident:
-            eradication_data = incident.eradication_data or {}
-            eradication_data.update({
-                "patches_applied": patch_results,
-                "patch_timestamp": datetime.utcnow().isoformat()
-            })
-            incident.eradication_data = eradication_data
-            db.commit()
-        
-        successful_patches = [r for r in patch_results if r["success"]]
-        
+        targets = await patch_targets(request.incident_id, request.vulnerability_ids)
+        rollout = rollouts.start(PatchRollout(request.incident_id, targets))
         return {
-            "message": f"Applied {len(successful_patches)} patches successfully",
-            "results": patch_results,
-            "success_count": len(successful_patches),
-            "failure_count": len(patch_results) - len(successful_patches)
+            "message": f"Patch rollout started for {len(request.vulnerability_ids)} vulnerabilities "
+                       f"on {len(targets)} hosts in {len(rollout.waves)} waves",
+            **rollout.summary()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to apply patches: {str(e)}")
 
+@router.get("/patch-rollouts/{rollout_id}")
+async def get_patch_rollout(rollout_id: str, db: Session = Depends(get_db)):
+    """Progress of a patch rollout, with per-host results"""
+    rollout = load_rollout(db, rollout_id)
+    if not rollout:
+        raise HTTPException(status_code=404, detail="Patch rollout not found")
+    return rollout
+
 @router.get("/malware-analysis/{incident_id}")
 async def get_malware_analysis(incident_id: int):
     """Get malware analysis results"""
     try:
         log_analyzer = LogAnalysisIntegration()
         malware_analysis = await log_analyzer.analyze_malware(incident_id)
+        if "feed_matches" in malware_analysis:
+            # Only analyses of real logs / artifacts feed the pivot graph, not the canned sample
+            pivot_graph.link_malware_analysis(incident_id, malware_analysis)
         
         return {
             "incident_id": incident_id,
@@ -176,11 +271,39 @@ async def get_malware_analysis(incident_id: int):
             "file_hashes": malware_analysis.get("hashes", []),
             "persistence_mechanisms": malware_analysis.get("persistence", []),
             "network_communications": malware_analysis.get("network", []),
-            "recommended_actions": malware_analysis.get("recommendations", [])
+            "recommended_actions": malware_analysis.get("recommendations", []),
+            "related_incidents": incident_clusters.related(incident_id, limit=10)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to analyze malware: {str(e)}")
 
+@router.get("/incident/{incident_id}/related-incidents")
+async def get_related_incidents(incident_id: int, limit: int = 20):
+    """Other incidents sharing hashes, domains or IPs with this one, directly or through a chain of incidents"""
+    return {
+        "incident_id": incident_id,
+        "related": incident_clusters.related(incident_id, limit),
+        "cluster": incident_clusters.cluster(incident_id),
+        "hub_indicators": incident_clusters.hub_indicators(incident_id),
+        "index": incident_clusters.stats()
+    }
+
+@router.get("/ioc/{value:path}/graph")
+async def get_ioc_graph(value: str, depth: int = 2, fanout: int = 50, max_nodes: int = 500):
+    """Pivot graph around an IP, domain or hash (or a node key such as incident:12 / alert:40 / family:emotet)"""
+    start = start_node(value)
+    if not start:
+        raise HTTPException(status_code=400, detail=f"Not an IP, domain, hash or node key: {value}")
+    graph = pivot_graph.pivot(
+        start,
+        depth=max(1, min(depth, settings.IOC_GRAPH_MAX_DEPTH)),
+        fanout=max(1, fanout),
+        max_nodes=max(1, min(max_nodes, settings.IOC_GRAPH_MAX_NODES))
+    )
+    if graph is None:
+        raise HTTPException(status_code=404, detail=f"{value} is not in the pivot graph")
+    return {**graph, "graph": pivot_graph.stats()}
+
 @router.post("/eradication-complete/{incident_id}")
 async def mark_eradication_complete(incident_id: int, db: Session = Depends(get_db)):
     """Mark eradication phase as complete and move to recovery"""
@@ -210,18 +333,14 @@ async def mark_eradication_complete(incident_id: int, db: Session = Depends(get_
     }
 
 @router.get("/threat-feed")
-async def get_threat_intelligence_feed():
-    """Get latest threat intelligence feed"""
+async def get_threat_intelligence_feed(if_none_match: Optional[str] = Header(None)):
+    """Get latest threat intelligence feed (precomputed at startup and on each feed refresh; honours If-None-Match)"""
     try:
-        threat_intel = ThreatIntelIntegration()
-        feed_data = await threat_intel.get_latest_feed()
-        
-        return {
-            "feed_updated": feed_data.get("last_updated"),
-            "new_indicators": feed_data.get("new_indicators", 0),
-            "total_indicators": feed_data.get("total_indicators", 0),
-            "top_threats": feed_data.get("top_threats", []),
-            "trending_malware": feed_data.get("trending_malware", [])
-        }
+        snapshot = feed_summary.snapshot or await build_feed_summary()
+        headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+        if if_none_match and (if_none_match.strip() == "*" or snapshot.etag in
+                              (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+            return Response(status_code=304, headers=headers)
+        return Response(content=snapshot.body, media_type="application/json", headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get threat feed: {str(e)}")
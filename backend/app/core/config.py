@@ -21,10 +21,64 @@ class Settings(BaseSettings):
     # Firewall API
     FIREWALL_API_URL: Optional[str] = None
     FIREWALL_API_KEY: Optional[str] = None
+    FIREWALL_BATCH_SUPPORTED: Optional[bool] = None  # None = detect on first batch call
+    FIREWALL_BATCH_SIZE: int = 500
+    FIREWALL_MAX_CONCURRENCY: int = 16
+    FIREWALL_STATS_REFRESH_SECONDS: float = 10.0  # background refresh of the shared stats snapshot
+    FIREWALL_STATS_MAX_AGE_SECONDS: float = 30.0  # older snapshots trigger a refresh on read
+    FIREWALL_PAGE_SIZE: int = 5000  # entries per blocked-ips page
+    FIREWALL_MAX_PAGES: int = 1000  # blocked-ips listings longer than this are treated as a device error
+    FIREWALL_RECONCILE_SECONDS: int = 3600  # 0 disables scheduled reconciliation
+    FIREWALL_RECONCILE_REMOVE_UNMANAGED: bool = False  # also remove device blocks the platform never made
+    BLOCK_DEFAULT_TTL_SECONDS: int = 0  # 0 = permanent blocks
+    BLOCK_ESCALATION_FACTOR: float = 4.0  # TTL multiplier per previous block of the same IP
+    BLOCK_MAX_TTL_SECONDS: int = 30 * 24 * 3600
+    BLOCK_PERMANENT_AFTER: int = 0  # offenses after which blocks become permanent; 0 = never
+    BLOCK_EXPIRY_TICK_SECONDS: int = 5
+    FIREWALL_JOB_CONCURRENCY: int = 4  # containment jobs running at once per firewall
+    PROTECTED_RANGES_RELOAD_SECONDS: int = 60  # standalone workers re-read protected_ranges
+    FIREWALL_ALLOWLIST: str = ""  # comma-separated IPs/CIDRs that must never be blocked (plus protected_ranges table)
+    BLOCKLIST_OVERBLOCK_TOLERANCE: float = 0.0  # max fraction of unrequested addresses per aggregate
+    BLOCKLIST_MIN_PREFIX_V4: int = 16  # never aggregate broader than this
+    BLOCKLIST_MIN_PREFIX_V6: int = 48
     
     # Threat Intelligence
     VIRUSTOTAL_API_KEY: Optional[str] = None
     ALIENVAULT_API_KEY: Optional[str] = None
+    THREAT_FEED_PATH: Optional[str] = None  # local JSON / JSON-lines indicator file
+    THREAT_FEED_REFRESH_SECONDS: int = 900  # 0 disables background refresh
+    THREAT_INTEL_CONCURRENCY: int = 16  # indicator lookups in flight per IOC search
+    IOC_PERSIST_BATCH_SIZE: int = 200
+    IOC_PERSIST_FLUSH_SECONDS: float = 1.0
+    INCIDENT_CLUSTER_REFRESH_SECONDS: int = 60  # pick up indicators stored by other processes; 0 disables
+    INCIDENT_CLUSTER_MAX_FANOUT: int = 100  # indicators in more incidents than this no longer link them
+    IOC_GRAPH_REFRESH_SECONDS: int = 30  # add alerts / indicators stored by other processes; 0 disables
+    IOC_GRAPH_COMPACT_RATIO: float = 0.25  # merge new edges into the CSR arrays at this share of the base
+    IOC_GRAPH_MAX_DEPTH: int = 4
+    IOC_GRAPH_MAX_NODES: int = 2000
+    REENRICH_ALERT_WINDOW_HOURS: int = 72
+    REENRICH_MALICIOUS_SCORE: int = 7
+    
+    # Log Analysis
+    LOG_PATHS: Optional[str] = None  # comma-separated local log files
+    LOG_ANALYSIS_WORKERS: Optional[int] = None  # defaults to CPU count
+    LOG_BRUTE_FORCE_THRESHOLD: int = 20  # auth failures from one source within the window
+    MALWARE_SCAN_PATHS: Optional[str] = None  # comma-separated directories / mounted images to hash
+    MALWARE_SCAN_STATE_REFRESH_SECONDS: int = 60  # re-walk of MALWARE_SCAN_PATHS behind the malware cache key; 0 walks on every view
+    ANALYSIS_CACHE_SETTLE_SECONDS: int = 60  # newer log lines are re-read on every view instead of cached (late writes)
+    
+    # Vulnerability data (offline)
+    NVD_FEED_PATHS: Optional[str] = None  # comma-separated NVD JSON feeds (.json / .json.gz), modified feed last
+    ASSET_INVENTORY_PATH: Optional[str] = None  # JSON list / JSON-lines of hosts and installed software
+    VULN_FEED_REFRESH_SECONDS: int = 3600  # re-import changed feed files; 0 disables
+    
+    # Patch rollout
+    PATCH_PARALLELISM: int = 10  # hosts patched at once
+    PATCH_CANARY_SIZE: int = 1  # hosts in the first wave, which must fully succeed; 0 = no canary
+    PATCH_WAVE_SIZE: int = 25  # hosts per wave after the canary; 0 = all at once
+    PATCH_MAX_FAILURE_RATIO: float = 0.1  # halt once more than this share of patched hosts failed
+    PATCH_HOST_TIMEOUT_SECONDS: float = 1800  # per patch on one host; 0 = no timeout
+    PATCH_ROLLOUT_LEASE_SECONDS: int = 120  # active rollouts whose process has not checked in for this long are marked failed
     
     # Automation
     ANSIBLE_PLAYBOOK_PATH: str = "/opt/ansible/playbooks"
@@ -36,6 +90,25 @@ class Settings(BaseSettings):
     # Redis (for background tasks)
     REDIS_URL: str = "redis://localhost:6379"
     
+    # API rate limiting (GCRA token bucket)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory or redis (shared across API processes)
+    RATE_LIMIT_DEFAULT: str = "20/second:40"  # per client across all routes; empty disables
+    RATE_LIMIT_ROUTES: str = ""  # JSON overrides, e.g. {"GET /api/detection/alerts": "10/minute:5"}
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # key clients by X-Forwarded-For behind a proxy
+    
+    # Containment job queue (database backed)
+    CONTAINMENT_WORKERS: int = 4  # in-process workers; 0 = run workers separately
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_SECONDS: float = 2.0
+    JOB_RETRY_MAX_SECONDS: float = 300.0
+    JOB_LEASE_SECONDS: int = 300  # running jobs older than this are picked up again
+    JOB_POLL_SECONDS: float = 1.0
+    
+    # Containment action log (group commits)
+    ACTION_LOG_BATCH_SIZE: int = 1000
+    ACTION_LOG_FLUSH_SECONDS: float = 1.0
+    
     class Config:
         env_file = ".env"
 
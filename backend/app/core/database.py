@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -14,3 +14,32 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def upgrade_schema(bind=engine):
+    """Add model columns and indexes missing from tables that already exist.
+
+    create_all only creates missing tables, so a database created before a
+    column or index was added to a model keeps the old table. New columns are
+    added as nullable and existing rows get the column's scalar default.
+    """
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    existing_tables = set(inspector.get_table_names())
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=bind.dialect)}"
+                ))
+                if column.default is not None and column.default.is_scalar:
+                    conn.execute(table.update().values({column.name: column.default.arg}))
+            indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
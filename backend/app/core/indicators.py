@@ -0,0 +1,81 @@
+import re
+import socket
+from typing import List, Iterable, NamedTuple
+
+DOMAIN_PATTERN = re.compile(r'^([a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}$')
+HASH_LENGTHS = frozenset((32, 40, 64, 128))  # MD5, SHA1, SHA256, SHA512
+HEX_CHARS = frozenset("0123456789abcdefABCDEF")
+IPV4_CHARS = frozenset("0123456789.")
+
+class ClassifiedIndicator(NamedTuple):
+    """Type, canonical form and validity of a raw indicator value"""
+    value: str
+    type: str  # ip, domain, hash, unknown
+    canonical: str
+    valid: bool
+
+def _canonical_ip(value: str):
+    """Canonical text form of an IP address (compressed for IPv6), or None"""
+    try:
+        if ":" in value:
+            address, sep, scope = value.partition("%")
+            packed = socket.inet_pton(socket.AF_INET6, address)
+            return socket.inet_ntop(socket.AF_INET6, packed) + sep + scope
+        if IPV4_CHARS.issuperset(value):
+            return socket.inet_ntop(socket.AF_INET, socket.inet_pton(socket.AF_INET, value))
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _canonical_domain(value: str):
+    """Lowercase IDNA (punycode) form of a domain, or None"""
+    domain = value.rstrip(".")
+    if not domain.isascii():
+        try:
+            domain = domain.encode("idna").decode("ascii")
+        except UnicodeError:
+            return None
+    if DOMAIN_PATTERN.match(domain) is None:
+        return None
+    return domain.lower()
+
+def is_ip(value: str) -> bool:
+    """Check if value is an IP address"""
+    return _canonical_ip(value) is not None
+
+def is_domain(value: str) -> bool:
+    """Check if value is a domain"""
+    return DOMAIN_PATTERN.match(value) is not None
+
+def is_hash(value: str) -> bool:
+    """Check if value is a file hash"""
+    return len(value) in HASH_LENGTHS and HEX_CHARS.issuperset(value)
+
+def classify_indicator(value: str) -> ClassifiedIndicator:
+    """Classify and normalize a single indicator in one pass"""
+    stripped = value.strip()
+
+    if len(stripped) in HASH_LENGTHS and HEX_CHARS.issuperset(stripped):
+        return ClassifiedIndicator(value, "hash", stripped.lower(), True)
+
+    canonical = _canonical_ip(stripped)
+    if canonical is not None:
+        return ClassifiedIndicator(value, "ip", canonical, True)
+
+    if "." in stripped:
+        canonical = _canonical_domain(stripped)
+        if canonical is not None:
+            return ClassifiedIndicator(value, "domain", canonical, True)
+
+    return ClassifiedIndicator(value, "unknown", stripped, False)
+
+def classify_indicators(values: Iterable[str]) -> List[ClassifiedIndicator]:
+    """Classify and normalize a batch of indicators; repeated values are classified once"""
+    seen = {}
+    results = []
+    for value in values:
+        result = seen.get(value)
+        if result is None:
+            result = seen[value] = classify_indicator(value)
+        results.append(result)
+    return results
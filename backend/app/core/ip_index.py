@@ -0,0 +1,202 @@
+import socket
+from typing import List, Dict, Optional, Iterable, Tuple, Any
+
+MAX_BITS = {4: 32, 6: 128}
+
+def parse_ip(value: str) -> Optional[Tuple[int, int]]:
+    """Parse an IPv4/IPv6 address into (version, integer), or None if invalid"""
+    try:
+        if ":" in value:
+            return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, value.split("%", 1)[0]), "big")
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, value), "big")
+    except (OSError, ValueError):
+        return None
+
+def parse_network(value: str) -> Optional[Tuple[int, int, int]]:
+    """Parse an address or CIDR block into (version, network integer, prefix length)"""
+    address, _, length = value.strip().partition("/")
+    parsed = parse_ip(address)
+    if parsed is None:
+        return None
+    version, number = parsed
+    max_bits = MAX_BITS[version]
+    try:
+        prefix_len = int(length) if length else max_bits
+    except ValueError:
+        return None
+    if not 0 <= prefix_len <= max_bits:
+        return None
+    # Non-strict: host bits are masked off, as ipaddress.ip_network(strict=False) does
+    host_bits = max_bits - prefix_len
+    return version, (number >> host_bits) << host_bits, prefix_len
+
+def format_network(version: int, number: int, prefix_len: int) -> str:
+    """Render a parsed network back to CIDR notation"""
+    family = socket.AF_INET if version == 4 else socket.AF_INET6
+    address = socket.inet_ntop(family, number.to_bytes(MAX_BITS[version] // 8, "big"))
+    return f"{address}/{prefix_len}"
+
+MAX_TEXT_RANGES = 256
+# Every spelling of an IPv6 address starts with a hex digit or ':'
+IPV6_TEXT = [("0", ":"), (":", ";"), ("a", "g")]
+
+def text_ranges(network: str) -> List[Tuple[str, str]]:
+    """[low, high) string bounds that hold the text of every address in a block.
+
+    Lets an index on a text IP column answer a CIDR query. IPv4 blocks widen to
+    whole octets and IPv6 blocks to their first hextet (compressed, lower
+    case), so a range can hold addresses outside the block and callers filter
+    what it returns. IPv6 blocks wider than /8 cover every IPv6 spelling.
+    """
+    parsed = parse_network(network)
+    if parsed is None:
+        return []
+    version, number, prefix_len = parsed
+    if version == 4:
+        octets = max(1, -(-prefix_len // 8))
+        first = number >> (32 - 8 * octets)
+        ranges = []
+        for n in range(first, first + (1 << (8 * octets - prefix_len))):
+            text = ".".join(str(n >> 8 * i & 255) for i in reversed(range(octets)))
+            # '/' sorts right after '.', and "\0" right after the exact address
+            ranges.append((text, text + "\0") if octets == 4 else (text + ".", text + "/"))
+        return ranges
+    count = 1 << max(0, 16 - prefix_len)
+    if count > MAX_TEXT_RANGES:
+        return list(IPV6_TEXT)
+    first = number >> 112
+    ranges = [(f"{h:x}:", f"{h:x};") for h in range(first, first + count)]
+    if first == 0:
+        ranges.append((":", ";"))  # leading zeros compress to "::"
+    return ranges
+
+class IPRangeIndex:
+    """Longest-prefix / covering-prefix index over IPv4 and IPv6 CIDR blocks.
+
+    Blocks are bucketed per (version, prefix length) in dicts keyed by the
+    network bits, so a query is one shift and one dict probe per distinct
+    prefix length in use: O(prefix length) worst case, usually a handful.
+    """
+
+    def __init__(self):
+        self._tables: Dict[int, Dict[int, Dict[int, List[Any]]]] = {4: {}, 6: {}}
+        self._lengths: Dict[int, List[int]] = {4: [], 6: []}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, network: str, entry: Any = None) -> bool:
+        """Add a block (or single address) with an attached entry"""
+        parsed = parse_network(network)
+        if parsed is None:
+            return False
+        self._insert(*parsed, entry)
+        self._refresh_lengths(parsed[0])
+        return True
+
+    def bulk_load(self, items: Iterable[Tuple[str, Any]]) -> int:
+        """Add many (network, entry) pairs; returns the number of invalid networks skipped"""
+        skipped = 0
+        for network, entry in items:
+            parsed = parse_network(network)
+            if parsed is None:
+                skipped += 1
+                continue
+            self._insert(*parsed, entry)
+        self._refresh_lengths(4)
+        self._refresh_lengths(6)
+        return skipped
+
+    def remove(self, network: str, entry: Any = None) -> bool:
+        """Remove a block; with an entry, only that entry is removed"""
+        parsed = parse_network(network)
+        if parsed is None:
+            return False
+        version, number, prefix_len = parsed
+        table = self._tables[version].get(prefix_len, {})
+        key = number >> (MAX_BITS[version] - prefix_len)
+        entries = table.get(key)
+        if not entries:
+            return False
+        if entry is None:
+            removed = len(entries)
+            del table[key]
+        else:
+            if entry not in entries:
+                return False
+            entries.remove(entry)
+            removed = 1
+            if not entries:
+                del table[key]
+        self._count -= removed
+        if not table:
+            self._tables[version].pop(prefix_len, None)
+            self._refresh_lengths(version)
+        return True
+
+    def _insert(self, version: int, number: int, prefix_len: int, entry: Any):
+        table = self._tables[version].setdefault(prefix_len, {})
+        table.setdefault(number >> (MAX_BITS[version] - prefix_len), []).append(entry)
+        self._count += 1
+
+    def _refresh_lengths(self, version: int):
+        # Most specific first so the first hit is the longest match
+        self._lengths[version] = sorted(self._tables[version], reverse=True)
+
+    def _covering(self, version: int, number: int, first_only: bool) -> List[Tuple[str, Any]]:
+        max_bits = MAX_BITS[version]
+        tables = self._tables[version]
+        found = []
+        for prefix_len in self._lengths[version]:
+            key = number >> (max_bits - prefix_len)
+            entries = tables[prefix_len].get(key)
+            if entries:
+                network = format_network(version, key << (max_bits - prefix_len), prefix_len)
+                found.extend((network, entry) for entry in entries)
+                if first_only:
+                    break
+        return found
+
+    def covering(self, ip: str) -> List[Tuple[str, Any]]:
+        """All (network, entry) pairs covering ip, most specific first"""
+        parsed = parse_ip(ip)
+        if parsed is None or not self._lengths[parsed[0]]:
+            return []
+        return self._covering(parsed[0], parsed[1], False)
+
+    def longest_match(self, ip: str) -> Optional[Tuple[str, Any]]:
+        """The most specific (network, entry) covering ip"""
+        parsed = parse_ip(ip)
+        if parsed is None or not self._lengths[parsed[0]]:
+            return None
+        found = self._covering(parsed[0], parsed[1], True)
+        return found[0] if found else None
+
+    def contains(self, ip: str) -> bool:
+        """Whether any block covers ip"""
+        return self.longest_match(ip) is not None
+
+    def covering_many(self, ips: Iterable[str]) -> Dict[str, List[Tuple[str, Any]]]:
+        """Batch query; only addresses with at least one covering block are returned"""
+        results = {}
+        if not self._count:
+            return results
+        for ip in ips:
+            if ip in results:
+                continue
+            found = self.covering(ip)
+            if found:
+                results[ip] = found
+        return results
+
+    def networks(self) -> List[Tuple[str, Any]]:
+        """Every (network, entry) pair in the index"""
+        items = []
+        for version, tables in self._tables.items():
+            max_bits = MAX_BITS[version]
+            for prefix_len, table in tables.items():
+                for key, entries in table.items():
+                    network = format_network(version, key << (max_bits - prefix_len), prefix_len)
+                    items.extend((network, entry) for entry in entries)
+        return items
@@ -0,0 +1,235 @@
+import json
+import re
+import time
+from typing import Dict, List, Optional, Tuple, NamedTuple
+from app.core.config import settings
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional: falls back to the in-process limiter
+    aioredis = None
+
+PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0}
+
+# Endpoints that fan out to SIEM / threat intel / firewall calls
+DEFAULT_ROUTE_LIMITS = {
+    "GET /api/detection/alerts": "30/minute:10",
+    "GET /api/detection/suspicious-ips": "30/minute:10",
+    "GET /api/detection/traffic-analysis": "30/minute:10",
+    "POST /api/eradication/search-iocs": "20/minute:5",
+    "POST /api/eradication/search-iocs/stream": "20/minute:5",
+    "GET /api/eradication/threat-feed": "20/minute:5",
+    "GET /api/eradication/malware-analysis/{incident_id}": "20/minute:5",
+    "GET /api/eradication/ioc/{value:path}/graph": "20/minute:5",
+    "POST /api/containment/block-ips": "60/minute:20",
+    "POST /api/containment/reconcile": "6/minute:2",
+    "POST /api/containment/blocklist/compile": "6/minute:2",
+}
+
+class Limit(NamedTuple):
+    interval: float  # seconds between requests at the sustained rate
+    burst: int
+
+def parse_limit(text: str) -> Limit:
+    """'<count>/<second|minute|hour>[:burst]', e.g. '30/minute:10'"""
+    rate, _, burst = text.partition(":")
+    count, _, period = rate.partition("/")
+    interval = PERIODS[period.strip() or "second"] / float(count)
+    return Limit(interval, int(burst) if burst else max(1, int(float(count))))
+
+class GCRALimiter:
+    """Generic cell rate algorithm: one float (theoretical arrival time) per key.
+
+    A request is allowed when it arrives no earlier than TAT - (burst - 1) * interval;
+    allowing it moves TAT forward by one interval. Each check is a dict lookup
+    and a few float operations.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self._tat: Dict[str, float] = {}
+        self.max_keys = max_keys
+
+    def allow(self, key: str, limit: Limit, now: Optional[float] = None) -> Tuple[bool, float, int]:
+        """Returns (allowed, retry_after_seconds, remaining burst)"""
+        now = time.monotonic() if now is None else now
+        tat = max(self._tat.get(key, now), now)
+        allow_at = tat - (limit.burst - 1) * limit.interval
+        if now < allow_at:
+            return False, allow_at - now, 0
+        new_tat = tat + limit.interval
+        if len(self._tat) >= self.max_keys and key not in self._tat:
+            self._evict(now)
+        self._tat[key] = new_tat
+        remaining = int((now - (new_tat - limit.burst * limit.interval)) / limit.interval)
+        return True, 0.0, max(remaining, 0)
+
+    def refund(self, key: str, limit: Limit):
+        """Gives back the request last allowed for key"""
+        tat = self._tat.get(key)
+        if tat is not None:
+            self._tat[key] = tat - limit.interval
+
+    def _evict(self, now: float):
+        # Keys whose TAT has passed carry no state beyond a fresh key
+        self._tat = {k: v for k, v in self._tat.items() if v > now}
+
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local allow_at = tat - (burst - 1) * interval
+if now < allow_at then
+    return {0, tostring(allow_at - now)}
+end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1000)
+return {1, tostring(math.floor((now - (new_tat - burst * interval)) / interval))}
+"""
+
+REFUND_SCRIPT = """
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if tat then
+    redis.call('SET', KEYS[1], tostring(tat - tonumber(ARGV[1])), 'KEEPTTL')
+end
+return 1
+"""
+
+class RedisGCRALimiter:
+    """Same algorithm shared across API processes through one atomic Lua call"""
+
+    def __init__(self, url: str):
+        self._client = aioredis.from_url(url)
+        self._script = self._client.register_script(GCRA_SCRIPT)
+        self._refund = self._client.register_script(REFUND_SCRIPT)
+
+    async def allow(self, key: str, limit: Limit) -> Tuple[bool, float, int]:
+        allowed, value = await self._script(keys=[f"ratelimit:{key}"], args=[time.time(), limit.interval, limit.burst])
+        if int(allowed):
+            return True, 0.0, max(int(float(value)), 0)
+        return False, float(value), 0
+
+    async def refund(self, key: str, limit: Limit):
+        await self._refund(keys=[f"ratelimit:{key}"], args=[limit.interval])
+
+class RateLimitMetrics:
+    def __init__(self):
+        self.allowed: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+        self.backend_errors = 0
+
+    def record(self, route: str, allowed: bool):
+        counters = self.allowed if allowed else self.rejected
+        counters[route] = counters.get(route, 0) + 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "allowed": dict(self.allowed),
+            "rejected": dict(self.rejected),
+            "total_allowed": sum(self.allowed.values()),
+            "total_rejected": sum(self.rejected.values()),
+            "backend_errors": self.backend_errors
+        }
+
+rate_limit_metrics = RateLimitMetrics()
+
+class RateLimitMiddleware:
+    """ASGI middleware applying a per-client default limit plus per-route limits"""
+
+    def __init__(self, app, route_limits: Optional[Dict[str, str]] = None):
+        self.app = app
+        routes = dict(DEFAULT_ROUTE_LIMITS)
+        routes.update(route_limits if route_limits is not None else json.loads(settings.RATE_LIMIT_ROUTES or "{}"))
+        self.default_limit = parse_limit(settings.RATE_LIMIT_DEFAULT) if settings.RATE_LIMIT_DEFAULT else None
+
+        # Exact templates resolve with one dict probe; parameterised ones via regex
+        self.exact: Dict[Tuple[str, str], Tuple[str, Limit]] = {}
+        self.patterns: List[Tuple[str, re.Pattern, str, Limit]] = []
+        for template, text in routes.items():
+            method, path = template.split(" ", 1)
+            limit = parse_limit(text)
+            if "{" in path:
+                # {name:path} spans slashes, like the Starlette converter
+                regex = re.sub(r"\{[^/{}]+:path\}", ".+", path)
+                regex = re.compile("^" + re.sub(r"\{[^/]+\}", "[^/]+", regex) + "$")
+                self.patterns.append((method, regex, template, limit))
+            else:
+                self.exact[(method, path)] = (template, limit)
+
+        self.local = GCRALimiter()
+        self.remote = RedisGCRALimiter(settings.REDIS_URL) if settings.RATE_LIMIT_BACKEND == "redis" and aioredis else None
+
+    def _route(self, method: str, path: str) -> Optional[Tuple[str, Limit]]:
+        found = self.exact.get((method, path))
+        if found:
+            return found
+        for pattern_method, regex, template, limit in self.patterns:
+            if pattern_method == method and regex.match(path):
+                return template, limit
+        return None
+
+    def _client(self, scope) -> str:
+        if settings.RATE_LIMIT_TRUST_FORWARDED:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    return value.decode().split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def _allow(self, key: str, limit: Limit) -> Tuple[bool, float, int]:
+        if self.remote is not None:
+            try:
+                return await self.remote.allow(key, limit)
+            except Exception:
+                # Redis trouble must not take the API down; limit locally instead
+                rate_limit_metrics.backend_errors += 1
+        return self.local.allow(key, limit)
+
+    async def _refund(self, key: str, limit: Limit):
+        if self.remote is not None:
+            try:
+                await self.remote.refund(key, limit)
+                return
+            except Exception:
+                rate_limit_metrics.backend_errors += 1
+        self.local.refund(key, limit)
+
+    async def __call__(self, scope, receive, send):
+        # CORS preflights carry no work and must not eat into the client's budget
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or not settings.RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        client = self._client(scope)
+        route = self._route(scope["method"], scope["path"])
+        checks = []
+        if self.default_limit:
+            checks.append(("default", f"default|{client}", self.default_limit))
+        if route:
+            checks.append((route[0], f"{route[0]}|{client}", route[1]))
+
+        for number, (name, key, limit) in enumerate(checks):
+            allowed, retry_after, _ = await self._allow(key, limit)
+            if not allowed:
+                # A rejected request costs nothing under the limits it already passed
+                for _, passed_key, passed_limit in checks[:number]:
+                    await self._refund(passed_key, passed_limit)
+                rate_limit_metrics.record(name, False)
+                await self._reject(send, retry_after)
+                return
+        rate_limit_metrics.record(route[0] if route else "default", True)
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send, retry_after: float):
+        body = json.dumps({"detail": "Rate limit exceeded", "retry_after": round(retry_after, 2)}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"retry-after", str(max(1, int(retry_after + 0.999))).encode()),
+                (b"content-length", str(len(body)).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
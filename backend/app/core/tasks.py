@@ -0,0 +1,77 @@
+import asyncio
+from typing import Callable, Awaitable, Dict, List, Optional
+from datetime import datetime
+
+class PeriodicTask:
+    """Runs an async callable on a fixed interval in the background"""
+
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable], run_immediately: bool = False):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.run_immediately = run_immediately
+        self.last_run: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.runs = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name=self.name)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self):
+        try:
+            await self.func()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Error in background task {self.name}: {e}")
+        self.runs += 1
+        self.last_run = datetime.utcnow().isoformat()
+
+    async def _loop(self):
+        if not self.run_immediately:
+            await asyncio.sleep(self.interval)
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def status(self) -> Dict:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "running": self._task is not None and not self._task.done(),
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_error": self.last_error
+        }
+
+background_tasks: Dict[str, PeriodicTask] = {}
+
+def register_periodic(name: str, interval: float, func: Callable[[], Awaitable], run_immediately: bool = False) -> Optional[PeriodicTask]:
+    """Register a background task; an interval of 0 or less disables it"""
+    if interval <= 0:
+        return None
+    task = PeriodicTask(name, interval, func, run_immediately)
+    background_tasks[name] = task
+    return task
+
+def start_background_tasks():
+    for task in background_tasks.values():
+        task.start()
+
+async def stop_background_tasks():
+    for task in background_tasks.values():
+        await task.stop()
+
+def background_task_status() -> List[Dict]:
+    return [task.status() for task in background_tasks.values()]
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
+from datetime import datetime
+from sqlalchemy import and_, or_, insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.database import ContainmentAction
+
+class ActionLogWriter:
+    """Buffers containment actions and writes them in group commits.
+
+    Firewall operations call record()/record_many() on the hot path; rows are
+    inserted with one bulk INSERT per ACTION_LOG_BATCH_SIZE entries or per
+    flush() from the background task, instead of a commit per action. Async
+    callers run the flush in a thread so its commit does not block the event
+    loop. The timestamp is taken when the action happens, not when it is written.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or settings.ACTION_LOG_BATCH_SIZE
+        self._buffer: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def record(self, incident_id: Optional[int], action: str, target: str, success: bool,
+               details: Optional[str] = None, actor: str = "system"):
+        self.record_many(incident_id, action, [(target, success)], details, actor)
+
+    def record_many(self, incident_id: Optional[int], action: str, outcomes: Iterable[Tuple[str, bool]],
+                    details: Optional[str] = None, actor: str = "system"):
+        now = datetime.utcnow()
+        rows = [
+            {
+                "incident_id": incident_id,
+                "timestamp": now,
+                "action": action,
+                "target": target,
+                "result": "success" if success else "failure",
+                "details": details,
+                "actor": actor
+            }
+            for target, success in outcomes
+        ]
+        with self._lock:
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            try:
+                # Called from async firewall code: commit off the event loop
+                asyncio.get_running_loop().run_in_executor(None, self.flush)
+            except RuntimeError:
+                self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        db = SessionLocal()
+        try:
+            for i in range(0, len(rows), self.batch_size):
+                db.execute(insert(ContainmentAction), rows[i:i + self.batch_size])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error writing containment action log: {e}")
+            # Keep the rows for the next flush rather than losing the audit trail
+            with self._lock:
+                self._buffer = rows + self._buffer
+            return 0
+        finally:
+            db.close()
+        return len(rows)
+
+action_log = ActionLogWriter()
+
+async def flush_action_log():
+    await asyncio.to_thread(action_log.flush)
+
+def action_summary(row: ContainmentAction) -> Dict:
+    return {
+        "id": row.id,
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+        "action": row.action,
+        "target": row.target,
+        "result": row.result,
+        "details": row.details,
+        "user": row.actor
+    }
+
+def encode_cursor(row: ContainmentAction) -> str:
+    return f"{row.timestamp.isoformat()}_{row.id}"
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    timestamp, row_id = cursor.rsplit("_", 1)
+    return datetime.fromisoformat(timestamp), int(row_id)
+
+def query_actions(db: Session, incident_id: int, limit: int, cursor: Optional[str] = None,
+                  target: Optional[str] = None) -> Tuple[List[ContainmentAction], Optional[str]]:
+    """One keyset page, newest first, over the (incident_id, timestamp, id) index"""
+    query = db.query(ContainmentAction).filter(ContainmentAction.incident_id == incident_id)
+    if target:
+        query = query.filter(ContainmentAction.target == target)
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            ContainmentAction.timestamp < timestamp,
+            and_(ContainmentAction.timestamp == timestamp, ContainmentAction.id < row_id)
+        ))
+    rows = query.order_by(ContainmentAction.timestamp.desc(), ContainmentAction.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def iter_actions(incident_id: int, page_size: int = 5000) -> Iterator[ContainmentAction]:
+    """Walk every action of an incident page by page in its own session (for streaming)"""
+    db = SessionLocal()
+    try:
+        cursor = None
+        while True:
+            rows, cursor = query_actions(db, incident_id, page_size, cursor)
+            yield from rows
+            db.expunge_all()
+            if cursor is None:
+                return
+    finally:
+        db.close()
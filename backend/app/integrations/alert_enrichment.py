@@ -0,0 +1,68 @@
+from typing import List, Dict, Optional
+from app.integrations.threat_feed import ThreatFeedStore, feed_store
+
+SEVERITY_BASE_SCORE = {"low": 1, "medium": 3, "high": 6, "critical": 8}
+
+# Alert fields that may carry indicators, by indicator kind
+IP_FIELDS = ("source_ip", "destination_ip")
+DOMAIN_FIELDS = ("domain", "domains", "hostname")
+HASH_FIELDS = ("hash", "hashes", "file_hash", "md5", "sha1", "sha256")
+CANDIDATE_FIELDS = IP_FIELDS + DOMAIN_FIELDS + HASH_FIELDS
+
+class AlertEnrichment:
+    """Ingest-time matching of alert indicators against the local threat feed"""
+
+    def __init__(self, store: Optional[ThreatFeedStore] = None):
+        self.store = store or feed_store
+
+    def enrich(self, alert_data: Dict) -> Dict:
+        """Return feed matches and a triage score for a raw alert"""
+        lookup, normalize = self.store.lookup, self.store.normalize
+        networks = self.store.networks
+        matches = []
+        for field in CANDIDATE_FIELDS:
+            value = alert_data.get(field)
+            if not value:
+                continue
+            if isinstance(value, str):
+                candidates = (value,)
+            elif isinstance(value, list):
+                # Payloads are free-form; skip numbers, nulls and nested objects
+                candidates = [v for v in value if isinstance(v, str)]
+            else:
+                continue
+            for candidate in candidates:
+                key = candidate.strip().lower()
+                entry = lookup(normalize(key) if ":" in key else key)
+                if entry:
+                    matches.append(self._match(field, candidate, entry))
+                elif field in IP_FIELDS and len(networks):
+                    for network, block in networks.covering(candidate):
+                        matches.append(dict(self._match(field, candidate, block), network=network))
+
+        triage_score = SEVERITY_BASE_SCORE.get(alert_data.get("severity"), 3)
+        if matches:
+            triage_score = max(triage_score, max(m["score"] for m in matches))
+            triage_score = min(triage_score + len(matches) - 1, 10)
+
+        return {"matches": matches, "triage_score": triage_score}
+
+    @staticmethod
+    def _match(field: str, value: str, entry) -> Dict:
+        return {
+            "field": field,
+            "value": value,
+            "type": entry.type,
+            "score": entry.score,
+            "source": entry.source,
+            "name": entry.name
+        }
+
+    def enrich_alerts(self, alerts: List[Dict]) -> List[Dict]:
+        """Enrich a batch of raw alerts in place, attaching matches to the payload"""
+        for alert_data in alerts:
+            result = self.enrich(alert_data)
+            if result["matches"]:
+                alert_data["ioc_matches"] = result["matches"]
+            alert_data["triage_score"] = result["triage_score"]
+        return alerts
@@ -0,0 +1,127 @@
+import array
+import socket
+import sys
+from bisect import bisect_right
+from itertools import repeat, compress
+from operator import and_
+from typing import List, Dict, Iterable
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.ip_index import IPRangeIndex, MAX_BITS, parse_network
+from app.models.database import ProtectedRange
+
+class ProtectedRangeStore:
+    """Allowlist / critical-asset ranges that must never be blocked.
+
+    Ranges come from FIREWALL_ALLOWLIST and the protected_ranges table. Besides
+    the IPRangeIndex used to explain a conflict, the merged IPv4 ranges are
+    kept as one sorted boundary list: an address is protected exactly when
+    bisect_right lands on an odd position, which lets a whole batch be checked
+    with C-level map() calls instead of a Python loop per address.
+    """
+
+    def __init__(self):
+        self.index = IPRangeIndex()
+        self._v4_bounds: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def load(self, ranges: Iterable[Dict]):
+        index = IPRangeIndex()
+        index.bulk_load((r["network"], r) for r in ranges)
+
+        intervals = []
+        for network, _ in index.networks():
+            version, start, prefix_len = parse_network(network)
+            if version == 4:
+                intervals.append((start, start + (1 << (MAX_BITS[4] - prefix_len))))
+        bounds: List[int] = []
+        for start, end in sorted(intervals):
+            if bounds and start <= bounds[-1]:
+                bounds[-1] = max(bounds[-1], end)
+            else:
+                bounds.extend((start, end))
+
+        self.index, self._v4_bounds = index, bounds
+
+    def reload(self, db: Session):
+        ranges = [
+            {"network": network, "label": "FIREWALL_ALLOWLIST", "category": "allowlist"}
+            for network in (n.strip() for n in settings.FIREWALL_ALLOWLIST.split(",")) if network
+        ]
+        ranges.extend(
+            {"network": row.network, "label": row.label, "category": row.category}
+            for row in db.query(ProtectedRange).filter(ProtectedRange.is_active == True)
+        )
+        self.load(ranges)
+
+    def networks(self) -> List[str]:
+        return [network for network, _ in self.index.networks()]
+
+    def _candidates(self, targets: List[str]) -> List[str]:
+        """Targets that may touch a protected range (exact for plain IPv4 addresses)"""
+        try:
+            packed = b"".join(map(socket.inet_pton, repeat(socket.AF_INET), targets))
+        except (OSError, TypeError):
+            # IPv6, CIDRs or junk in the batch: split and take the fast path for the IPv4 part
+            v4 = [t for t in targets if ":" not in t and "/" not in t]
+            rest = [t for t in targets if ":" in t or "/" in t]
+            valid_v4 = []
+            for target in v4:
+                try:
+                    socket.inet_pton(socket.AF_INET, target)
+                    valid_v4.append(target)
+                except OSError:
+                    pass
+            return (self._candidates(valid_v4) if valid_v4 else []) + rest
+
+        numbers = array.array("I")
+        numbers.frombytes(packed)
+        if sys.byteorder == "little":
+            numbers.byteswap()
+        positions = map(bisect_right, repeat(self._v4_bounds), numbers)
+        return list(compress(targets, map(and_, positions, repeat(1))))
+
+    def conflicts(self, targets: Iterable[str]) -> Dict[str, List[Dict]]:
+        """Protected ranges touched by each target (address or CIDR); only conflicts are returned"""
+        if not len(self.index):
+            return {}
+        targets = list(dict.fromkeys(targets))
+        found: Dict[str, List[Dict]] = {}
+        for target in self._candidates(targets):
+            if "/" in target:
+                matches = self._overlapping(target)
+            else:
+                matches = [entry for _, entry in self.index.covering(target)]
+            if matches:
+                found[target] = [dict(m) for m in matches]
+        return found
+
+    def _overlapping(self, network: str) -> List[Dict]:
+        """Ranges that contain or sit inside a requested CIDR"""
+        parsed = parse_network(network)
+        if parsed is None:
+            return []
+        version, start, prefix_len = parsed
+        end = start + (1 << (MAX_BITS[version] - prefix_len)) - 1
+        matches = []
+        for candidate, entry in self.index.networks():
+            c_version, c_start, c_len = parse_network(candidate)
+            if c_version == version and c_start <= end and start <= c_start + (1 << (MAX_BITS[version] - c_len)) - 1:
+                matches.append(entry)
+        return matches
+
+protected_ranges = ProtectedRangeStore()
+
+def load_protected_ranges():
+    db = SessionLocal()
+    try:
+        protected_ranges.reload(db)
+    finally:
+        db.close()
+
+async def refresh_protected_ranges():
+    # Picks up changes made through another process (e.g. the API for a standalone worker)
+    load_protected_ranges()
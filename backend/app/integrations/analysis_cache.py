@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import json
+import os
+import weakref
+from datetime import datetime
+from typing import List, Dict, Optional, Iterable, Tuple
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.database import AnalysisResult, Alert, ThreatIndicator
+
+def fingerprint(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def file_state(paths: Iterable[str]) -> Dict[str, Optional[List[int]]]:
+    """[device, inode, size, mtime_ns] of each file, None when it cannot be read"""
+    state = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+            state[path] = [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+        except OSError:
+            state[path] = None
+    return state
+
+def appended_only(before: Dict[str, Optional[List[int]]], now: Dict[str, Optional[List[int]]]) -> bool:
+    """Every file is the one seen before and has at most grown (compressed files must be untouched)"""
+    if before.keys() != now.keys():
+        return False
+    for path, old in before.items():
+        new = now[path]
+        if old is None or new is None or path.endswith(".gz"):
+            if old != new:
+                return False
+        elif new[:2] != old[:2] or new[2] < old[2]:
+            return False
+    return True
+
+def incident_inputs(db: Session, incident_id: int) -> List[int]:
+    """Alert and indicator counts and highest ids for the incident; any new or reassigned row changes them"""
+    alerts = db.query(func.count(Alert.id), func.max(Alert.id)).filter(Alert.incident_id == incident_id).one()
+    indicators = db.query(func.count(ThreatIndicator.id), func.max(ThreatIndicator.id)).filter(
+        ThreatIndicator.incident_id == incident_id
+    ).one()
+    return [*alerts, *indicators]
+
+class AnalysisCache:
+    """Eradication analysis results stored per incident and kind.
+
+    An entry is only reused while its fingerprint, a digest of everything the
+    analysis read (files, incident alerts and indicators, feed and CVE data),
+    matches the current one; a mismatch is a miss and the caller recomputes
+    and stores over it. Log analysis additionally keeps its merged counters
+    so that a longer window only reads the new stretch of the logs.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, incident_id: int, kind: str) -> Optional[AnalysisResult]:
+        return self.db.query(AnalysisResult).filter(
+            AnalysisResult.incident_id == incident_id, AnalysisResult.kind == kind
+        ).first()
+
+    def lookup(self, incident_id: int, kind: str, key: str) -> Optional[Dict]:
+        entry = self.get(incident_id, kind)
+        return entry.result if entry and entry.fingerprint == key else None
+
+    def store(self, incident_id: int, kind: str, key: str, result: Optional[Dict] = None, state: Optional[Dict] = None,
+              window_start: Optional[datetime] = None, window_end: Optional[datetime] = None):
+        entry = self.get(incident_id, kind)
+        if entry is None:
+            entry = AnalysisResult(incident_id=incident_id, kind=kind)
+            self.db.add(entry)
+        entry.fingerprint = key
+        entry.result = result
+        entry.state = state
+        entry.window_start = window_start
+        entry.window_end = window_end
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # Another process stored the same analysis first
+            self.db.rollback()
+
+# Held only by the views using a lock, so an entry goes away once its analysis is done
+_locks: "weakref.WeakValueDictionary[Tuple[int, str], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def analysis_lock(incident_id: int, kind: str) -> asyncio.Lock:
+    """Serializes one analysis per incident and kind, so concurrent views wait for a single run and then hit the cache"""
+    lock = _locks.get((incident_id, kind))
+    if lock is None:
+        lock = _locks[(incident_id, kind)] = asyncio.Lock()
+    return lock
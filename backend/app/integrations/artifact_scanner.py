@@ -0,0 +1,221 @@
+import asyncio
+import os
+import stat
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
+from sqlalchemy import insert, delete, and_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.integrations.threat_feed import ThreatFeedStore, feed_store
+from app.models.database import FileHash
+
+READ_SIZE = 1024 * 1024
+
+# (device, inode, size, mtime_ns): a file whose key is unchanged has unchanged content
+FileKey = Tuple[int, int, int, int]
+
+def walk(roots: Iterable[str]) -> Iterator[Tuple[str, FileKey]]:
+    """Regular files under the roots without following symlinks (mounted images are just directories)"""
+    stack = list(roots)
+    while stack:
+        path = stack.pop()
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            yield path, (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+            continue
+        if not stat.S_ISDIR(st.st_mode):
+            continue
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            st = entry.stat(follow_symlinks=False)
+                            yield entry.path, (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+def tree_digest(keys: Iterable[FileKey]) -> str:
+    return hashlib.sha256(repr(sorted(keys)).encode()).hexdigest()
+
+class ScanPathState:
+    """Digest of the file keys under the scan roots, kept current in the background.
+
+    Malware-analysis views key their cache on it instead of walking the tree.
+    Changes on disk show up after the next refresh (every
+    MALWARE_SCAN_STATE_REFRESH_SECONDS, and after each scan); with the refresh
+    disabled, every lookup walks the tree.
+    """
+
+    def __init__(self):
+        self.digests: Dict[Tuple[str, ...], str] = {}
+
+    def refresh(self, roots: List[str]) -> str:
+        digest = self.digests[tuple(roots)] = tree_digest(key for _, key in walk(roots))
+        return digest
+
+    def record(self, roots: List[str], keys: Iterable[FileKey]):
+        self.digests[tuple(roots)] = tree_digest(keys)
+
+    def current(self, roots: List[str]) -> str:
+        digest = self.digests.get(tuple(roots))
+        if digest is None or not settings.MALWARE_SCAN_STATE_REFRESH_SECONDS:
+            digest = self.refresh(roots)
+        return digest
+
+scan_path_state = ScanPathState()
+
+async def refresh_scan_path_state():
+    roots = [p.strip() for p in (settings.MALWARE_SCAN_PATHS or "").split(",") if p.strip()]
+    if roots:
+        await asyncio.to_thread(scan_path_state.refresh, roots)
+
+def hash_file(path: str) -> Optional[Tuple[str, str, str]]:
+    """MD5, SHA-1 and SHA-256 of a file from a single read pass (None if unreadable)"""
+    md5, sha1, sha256 = hashlib.md5(), hashlib.sha1(), hashlib.sha256()
+    buffer = bytearray(READ_SIZE)
+    view = memoryview(buffer)
+    try:
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                chunk = view[:n]
+                md5.update(chunk)
+                sha1.update(chunk)
+                sha256.update(chunk)
+    except OSError:
+        return None
+    return md5.hexdigest(), sha1.hexdigest(), sha256.hexdigest()
+
+class HashCache:
+    """Previously computed hashes in the file_hashes table, keyed by FileKey"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def lookup(self, keys: Iterable[FileKey]) -> Dict[FileKey, Tuple[str, str, str]]:
+        by_device: Dict[int, List[int]] = {}
+        wanted = set()
+        for key in keys:
+            by_device.setdefault(key[0], []).append(key[1])
+            wanted.add(key)
+        found = {}
+        for device, inodes in by_device.items():
+            for i in range(0, len(inodes), 500):
+                rows = self.db.query(FileHash).filter(
+                    FileHash.device == device, FileHash.inode.in_(inodes[i:i + 500])
+                )
+                for row in rows:
+                    key = (row.device, row.inode, row.size, row.mtime_ns)
+                    if key in wanted:
+                        found[key] = (row.md5, row.sha1, row.sha256)
+        return found
+
+    def store(self, entries: List[Tuple[str, FileKey, Tuple[str, str, str]]]):
+        """Insert new hashes, dropping older versions of the same inodes"""
+        if not entries:
+            return
+        by_device: Dict[int, List[int]] = {}
+        for _, key, _ in entries:
+            by_device.setdefault(key[0], []).append(key[1])
+        for device, inodes in by_device.items():
+            for i in range(0, len(inodes), 500):
+                self.db.execute(delete(FileHash).where(and_(
+                    FileHash.device == device, FileHash.inode.in_(inodes[i:i + 500])
+                )))
+        self.db.execute(insert(FileHash), [
+            {
+                "device": key[0], "inode": key[1], "size": key[2], "mtime_ns": key[3],
+                "path": path, "md5": digests[0], "sha1": digests[1], "sha256": digests[2]
+            }
+            for path, key, digests in entries
+        ])
+        self.db.commit()
+
+class ArtifactScanner:
+    """Hashes every file under the scan roots and checks the hashes against the feed.
+
+    Files whose (device, inode, size, mtime) key is in the hash cache are not
+    read again, so a re-scan after cleanup only hashes new or changed files.
+    The rest are hashed on a process pool, each file in one buffered pass
+    feeding all three digests.
+    """
+
+    def __init__(self, workers: Optional[int] = None, store: Optional[ThreatFeedStore] = None):
+        self.workers = workers
+        self.store = store or feed_store
+
+    def scan(self, roots: List[str], db: Optional[Session] = None) -> Dict:
+        started = time.perf_counter()
+        own_session = db is None
+        db = db or SessionLocal()
+        try:
+            files = dict(walk(roots))
+            scan_path_state.record(roots, files.values())
+            cache = HashCache(db)
+            known = cache.lookup(files.values())
+            # Hard links share a key and are read once
+            pending: Dict[FileKey, str] = {}
+            for path, key in files.items():
+                if key not in known and key not in pending:
+                    pending[key] = path
+
+            hashed = self._hash(list(pending.values()))
+            fresh = [(path, key, digests) for (key, path), digests in zip(pending.items(), hashed) if digests]
+            cache.store(fresh)
+        finally:
+            if own_session:
+                db.close()
+
+        digests_by_key = dict(known)
+        digests_by_key.update((key, digests) for _, key, digests in fresh)
+        matches = self.match({path: digests_by_key[key] for path, key in files.items() if key in digests_by_key})
+        return {
+            "files_seen": len(files),
+            "files_hashed": len(fresh),
+            "cache_hits": len(files) - len(pending),
+            "errors": len(pending) - len(fresh),
+            "bytes_hashed": sum(key[2] for _, key, _ in fresh),
+            "matches": matches,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    def _hash(self, paths: List[str]) -> List[Optional[Tuple[str, str, str]]]:
+        if len(paths) < 32 or self.workers == 1:
+            return [hash_file(path) for path in paths]
+        workers = self.workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(hash_file, paths, chunksize=max(1, min(64, len(paths) // (workers * 4)))))
+
+    def match(self, digests_by_path: Dict[str, Tuple[str, str, str]]) -> List[Dict]:
+        """Files with any digest present in the feed"""
+        matches = []
+        lookup = self.store.lookup
+        for path, digests in digests_by_path.items():
+            for algorithm, digest in zip(("md5", "sha1", "sha256"), digests):
+                entry = lookup(digest)
+                if entry:
+                    matches.append({
+                        "path": path,
+                        "md5": digests[0],
+                        "sha1": digests[1],
+                        "sha256": digests[2],
+                        "matched": algorithm,
+                        "name": entry.name,
+                        "score": entry.score,
+                        "source": entry.source
+                    })
+                    break
+        return sorted(matches, key=lambda m: m["path"])
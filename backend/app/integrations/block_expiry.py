@@ -0,0 +1,167 @@
+import heapq
+from typing import List, Dict, Optional, Iterable, Tuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.integrations.blocklist import BlocklistManager
+from app.integrations.firewall import FirewallIntegration
+from app.models.database import BlockedIP, AggregatedBlock
+
+def _chunks(values: List[str], size: int):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _timestamp(value: datetime) -> float:
+    # Naive datetimes in this codebase are UTC (datetime.utcnow / SQLite)
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+def block_ttl(ttl_seconds: Optional[int], previous_offenses: int) -> int:
+    """TTL for a new block; repeat offenders get BLOCK_ESCALATION_FACTOR times longer per offense.
+
+    None uses BLOCK_DEFAULT_TTL_SECONDS; 0 means permanent.
+    """
+    ttl = settings.BLOCK_DEFAULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    if ttl <= 0:
+        return 0
+    if settings.BLOCK_PERMANENT_AFTER and previous_offenses >= settings.BLOCK_PERMANENT_AFTER:
+        return 0
+    ttl = ttl * settings.BLOCK_ESCALATION_FACTOR ** previous_offenses
+    return int(min(ttl, settings.BLOCK_MAX_TTL_SECONDS))
+
+def previous_offenses(db: Session, ip_addresses: List[str]) -> Dict[str, int]:
+    """Number of earlier blocks per IP (indexed lookup on ip_address)"""
+    counts: Dict[str, int] = {}
+    for chunk in _chunks(ip_addresses, 500):
+        counts.update(
+            db.query(BlockedIP.ip_address, func.count(BlockedIP.id))
+            .filter(BlockedIP.ip_address.in_(chunk))
+            .group_by(BlockedIP.ip_address)
+        )
+    return counts
+
+class BlockExpiryScheduler:
+    """Min-heap of (expires_at, ip) for temporary blocks.
+
+    Only the head of the heap is inspected on each tick, so finding due blocks
+    costs O(k log n) for k expirations. Entries are not removed on manual
+    unblocks; the database row is re-checked when the entry comes due.
+
+    Expiry is owned by the API process. Blocks recorded by any process,
+    including standalone containment workers, reach the heap through sync(),
+    which picks up blocked_ips rows by id past a watermark.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        self.last_id = 0  # highest BlockedIP.id scheduled or skipped
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, ip_address: str, expires_at: datetime):
+        heapq.heappush(self._heap, (_timestamp(expires_at), ip_address))
+
+    def schedule_many(self, entries: Iterable[Tuple[str, datetime]]):
+        self._heap.extend((_timestamp(expires_at), ip) for ip, expires_at in entries)
+        heapq.heapify(self._heap)
+
+    def next_expiry(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[str]:
+        cutoff = _timestamp(now or datetime.utcnow())
+        due = []
+        while self._heap and self._heap[0][0] <= cutoff:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def restore(self, db: Session) -> int:
+        """Rebuild the heap from active temporary blocks (uses the expires_at index)"""
+        # Taken first: rows added during the load are scheduled again by sync, which is harmless
+        self.last_id = db.query(func.max(BlockedIP.id)).scalar() or 0
+        self._heap = []
+        self.schedule_many(
+            (row.ip_address, row.expires_at)
+            for row in db.query(BlockedIP.ip_address, BlockedIP.expires_at).filter(
+                BlockedIP.expires_at.isnot(None),
+                BlockedIP.is_active == True
+            ).yield_per(5000)
+        )
+        return len(self._heap)
+
+    def sync(self, db: Session) -> int:
+        """Schedule temporary blocks recorded since the last restore / sync"""
+        rows = db.query(BlockedIP.id, BlockedIP.ip_address, BlockedIP.expires_at, BlockedIP.is_active).filter(
+            BlockedIP.id > self.last_id
+        ).order_by(BlockedIP.id).all()
+        if not rows:
+            return 0
+        scheduled = 0
+        for row in rows:
+            if row.expires_at and row.is_active:
+                self.schedule(row.ip_address, row.expires_at)
+                scheduled += 1
+        self.last_id = rows[-1].id
+        return scheduled
+
+block_expiry = BlockExpiryScheduler()
+
+def restore_block_expiry():
+    db = SessionLocal()
+    try:
+        block_expiry.restore(db)
+    finally:
+        db.close()
+
+async def expire_blocks(db: Optional[Session] = None) -> Dict:
+    """Unblock every block whose TTL has passed with batched firewall calls"""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        block_expiry.sync(db)
+        due = block_expiry.pop_due()
+        if not due:
+            return {"expired": 0}
+
+        now = datetime.utcnow()
+        rows = []
+        for chunk in _chunks(list(dict.fromkeys(due)), 500):
+            rows.extend(db.query(BlockedIP.id, BlockedIP.incident_id, BlockedIP.ip_address).filter(
+                BlockedIP.ip_address.in_(chunk),
+                BlockedIP.is_active == True,
+                BlockedIP.expires_at <= now
+            ))
+        if not rows:
+            return {"expired": 0}
+
+        ips = list(dict.fromkeys(row.ip_address for row in rows))
+        # One batch per incident so the action log attributes each unblock
+        by_incident: Dict[Optional[int], List[str]] = {}
+        for row in rows:
+            by_incident.setdefault(row.incident_id, []).append(row.ip_address)
+        outcome: Dict[str, bool] = {}
+        for incident_id, incident_ips in by_incident.items():
+            outcome.update(await FirewallIntegration(incident_id, "expiry").unblock_ips_batch(incident_ips))
+        expired_ids = [row.id for row in rows if outcome.get(row.ip_address)]
+        for chunk in _chunks(expired_ids, 500):
+            db.query(BlockedIP).filter(BlockedIP.id.in_(chunk)).update(
+                {"is_active": False, "unblocked_at": now}, synchronize_session=False
+            )
+        db.commit()
+
+        # Failed unblocks are retried on a later tick
+        retry_at = now + timedelta(seconds=settings.BLOCK_EXPIRY_TICK_SECONDS * 6)
+        for ip in ips:
+            if not outcome.get(ip):
+                block_expiry.schedule(ip, retry_at)
+
+        # Expired addresses may still sit inside an aggregated prefix
+        if expired_ids and db.query(AggregatedBlock.id).filter(AggregatedBlock.is_active == True).first():
+            await BlocklistManager(db).compile_and_apply()
+
+        return {"expired": len(expired_ids), "failed": len(ips) - sum(1 for ip in ips if outcome.get(ip))}
+    finally:
+        if own_session:
+            db.close()
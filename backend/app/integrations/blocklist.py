@@ -0,0 +1,224 @@
+from bisect import bisect_right
+from typing import List, Dict, Optional, Iterable, Tuple
+from datetime import datetime
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.ip_index import MAX_BITS, parse_network, format_network
+from app.integrations.allowlist import protected_ranges
+from app.integrations.firewall import FirewallIntegration
+from app.models.database import BlockedIP, AggregatedBlock
+
+def _intervals(networks: Iterable[str]) -> Dict[int, List[Tuple[int, int]]]:
+    """Parse networks into sorted, merged [start, end] integer intervals per IP version"""
+    raw: Dict[int, List[Tuple[int, int]]] = {4: [], 6: []}
+    for network in networks:
+        parsed = parse_network(network)
+        if parsed:
+            version, start, prefix_len = parsed
+            raw[version].append((start, start + (1 << (MAX_BITS[version] - prefix_len)) - 1))
+
+    merged = {}
+    for version, items in raw.items():
+        items.sort()
+        out = []
+        for start, end in items:
+            if out and start <= out[-1][1] + 1:
+                if end > out[-1][1]:
+                    out[-1] = (out[-1][0], end)
+            else:
+                out.append((start, end))
+        merged[version] = out
+    return merged
+
+def _subtract(blocks: List[Tuple[int, int]], holes: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Remove the (sorted, merged) hole intervals from the block intervals"""
+    result = []
+    i = 0
+    for start, end in blocks:
+        while i < len(holes) and holes[i][1] < start:
+            i += 1
+        j = i
+        while j < len(holes) and holes[j][0] <= end:
+            if holes[j][0] > start:
+                result.append((start, holes[j][0] - 1))
+            start = max(start, holes[j][1] + 1)
+            j += 1
+        if start <= end:
+            result.append((start, end))
+    return result
+
+def _to_prefixes(start: int, end: int, max_bits: int) -> List[Tuple[int, int]]:
+    """Minimal list of (network, prefix_len) exactly covering [start, end]"""
+    prefixes = []
+    while start <= end:
+        # Largest aligned block starting at start that does not pass end
+        size = (start & -start) if start else 1 << max_bits
+        while size > end - start + 1:
+            size >>= 1
+        prefixes.append((start, max_bits - size.bit_length() + 1))
+        start += size
+    return prefixes
+
+def render_network(version: int, number: int, prefix_len: int) -> str:
+    """CIDR text; host routes are rendered as bare addresses like individual blocks"""
+    text = format_network(version, number, prefix_len)
+    return text.rsplit("/", 1)[0] if prefix_len == MAX_BITS[version] else text
+
+def canonical_network(network: str) -> str:
+    """Normalise an address or CIDR to the form used for firewall rules"""
+    parsed = parse_network(network)
+    return render_network(*parsed) if parsed else network
+
+class BlocklistCompiler:
+    """Collapses blocked addresses into a minimal set of covering prefixes.
+
+    Exact aggregation merges adjacent/overlapping entries losslessly. With a
+    non-zero tolerance, a parent prefix may replace its blocked children when
+    at most that fraction of its addresses were not requested, as long as it
+    is no broader than the configured minimum prefix and touches no
+    allowlisted range. Allowlisted ranges are always carved out.
+    """
+
+    def __init__(self, tolerance: float = 0.0, allowlist: Iterable[str] = (),
+                 min_prefix: Optional[Dict[int, int]] = None):
+        self.tolerance = max(0.0, min(tolerance, 0.99))
+        self.allow = _intervals(allowlist)
+        self.allow_starts = {v: [s for s, _ in items] for v, items in self.allow.items()}
+        self.min_prefix = min_prefix or {4: settings.BLOCKLIST_MIN_PREFIX_V4, 6: settings.BLOCKLIST_MIN_PREFIX_V6}
+
+    def _touches_allowlist(self, version: int, start: int, end: int) -> bool:
+        i = bisect_right(self.allow_starts[version], end) - 1
+        return i >= 0 and self.allow[version][i][1] >= start
+
+    def compile(self, networks: Iterable[str]) -> Dict:
+        """Compile networks; returns the prefixes and aggregation statistics"""
+        networks = list(networks)
+        compiled: List[str] = []
+        requested = blocked = 0
+
+        for version, intervals in _intervals(networks).items():
+            intervals = _subtract(intervals, self.allow[version])
+            max_bits = MAX_BITS[version]
+            requested += sum(end - start + 1 for start, end in intervals)
+
+            # Level-by-level bottom-up merge: nodes are keyed by their network
+            # bits at the current prefix length and carry (covered addresses,
+            # prefixes emitted if they are not aggregated further up)
+            by_length: Dict[int, Dict[int, Tuple[int, List[Tuple[int, int]]]]] = {}
+            for start, end in intervals:
+                for number, prefix_len in _to_prefixes(start, end, max_bits):
+                    key = number >> (max_bits - prefix_len)
+                    by_length.setdefault(prefix_len, {})[key] = (1 << (max_bits - prefix_len), [(number, prefix_len)])
+
+            floor = self.min_prefix[version]
+            final: List[Tuple[int, int]] = []
+            level: Dict[int, Tuple[int, List[Tuple[int, int]]]] = {}
+            for prefix_len in range(max_bits, floor - 1, -1):
+                for key, node in by_length.get(prefix_len, {}).items():
+                    level[key] = node
+                if prefix_len == floor:
+                    break
+                parent_len = prefix_len - 1
+                parent_size = 1 << (max_bits - parent_len)
+                parents: Dict[int, Tuple[int, List[Tuple[int, int]]]] = {}
+                for key, (covered, members) in level.items():
+                    parent = key >> 1
+                    if parent in parents:
+                        other_covered, other_members = parents[parent]
+                        parents[parent] = (covered + other_covered, other_members + members)
+                    else:
+                        parents[parent] = (covered, members)
+                level = {}
+                for parent, (covered, members) in parents.items():
+                    if len(members) > 1 or self.tolerance:
+                        start = parent << (max_bits - parent_len)
+                        if covered >= parent_size * (1 - self.tolerance) and \
+                                not self._touches_allowlist(version, start, start + parent_size - 1):
+                            members = [(start, parent_len)]
+                    level[parent] = (covered, members)
+            for covered, members in level.values():
+                final.extend(members)
+            # Prefixes broader than the floor were never merged further
+            for prefix_len in range(0, floor):
+                for covered, members in by_length.get(prefix_len, {}).values():
+                    final.extend(members)
+
+            for number, prefix_len in sorted(final):
+                compiled.append(render_network(version, number, prefix_len))
+                blocked += 1 << (max_bits - prefix_len)
+
+        return {
+            "input_entries": len(networks),
+            "compiled_entries": len(compiled),
+            "requested_addresses": requested,
+            "overblocked_addresses": blocked - requested,
+            "prefixes": compiled
+        }
+
+class BlocklistManager:
+    """Compiles active BlockedIP rows and applies only the diff to the firewall"""
+
+    def __init__(self, db: Session, firewall: Optional[FirewallIntegration] = None):
+        self.db = db
+        self.firewall = firewall or FirewallIntegration(actor="blocklist-compiler")
+
+    def current_device_rules(self) -> Tuple[set, set]:
+        """Rules the platform has placed on the firewall: (aggregated set, individual blocks)"""
+        active = {row.network for row in self.db.query(AggregatedBlock.network).filter(AggregatedBlock.is_active == True)}
+        last_applied = self.db.query(func.max(AggregatedBlock.applied_at)).scalar()
+        individual = self.db.query(BlockedIP.ip_address).filter(BlockedIP.is_active == True)
+        if last_applied is not None:
+            # Blocks pushed one by one after the last compile are still individual rules
+            individual = individual.filter(BlockedIP.blocked_at > last_applied)
+        return active, {canonical_network(row.ip_address) for row in individual}
+
+    async def compile_and_apply(self, tolerance: Optional[float] = None, dry_run: bool = False) -> Dict:
+        tolerance = settings.BLOCKLIST_OVERBLOCK_TOLERANCE if tolerance is None else tolerance
+        compiler = BlocklistCompiler(tolerance, protected_ranges.networks())
+
+        active = [row.ip_address for row in self.db.query(BlockedIP.ip_address).filter(BlockedIP.is_active == True)]
+        result = compiler.compile(active)
+        desired = set(result["prefixes"])
+        aggregated, individual = self.current_device_rules()
+        current = aggregated | individual
+        to_add = sorted(desired - current)
+        to_remove = sorted(current - desired)
+
+        summary = {
+            **{k: v for k, v in result.items() if k != "prefixes"},
+            "tolerance": compiler.tolerance,
+            "to_add": len(to_add),
+            "to_remove": len(to_remove),
+            "dry_run": dry_run
+        }
+        if dry_run:
+            summary["preview"] = {"add": to_add[:100], "remove": to_remove[:100]}
+            return summary
+
+        # Add covering rules before removing the rules they replace so nothing slips through
+        added = await self.firewall.block_ips_batch(to_add, "Aggregated blocklist") if to_add else {}
+        removed = await self.firewall.unblock_ips_batch(to_remove) if to_remove else {}
+
+        now = datetime.utcnow()
+        applied = [network for network in to_add if added.get(network)]
+        # Individual rules that survive unchanged become part of the aggregated set
+        adopted = sorted((desired & individual) - aggregated)
+        if applied or adopted:
+            self.db.execute(insert(AggregatedBlock), [
+                {"network": network, "is_active": True, "applied_at": now} for network in applied + adopted
+            ])
+        dropped = [network for network in to_remove if removed.get(network)]
+        if dropped:
+            self.db.query(AggregatedBlock).filter(
+                AggregatedBlock.network.in_(dropped),
+                AggregatedBlock.is_active == True
+            ).update({"is_active": False, "removed_at": now}, synchronize_session=False)
+        self.db.commit()
+
+        summary.update({
+            "applied": len(applied),
+            "removed": len(dropped),
+            "failed": [n for n in to_add if not added.get(n)] + [n for n in to_remove if not removed.get(n)]
+        })
+        return summary
@@ -0,0 +1,260 @@
+from typing import List, Dict, Optional, Iterable, Set, Tuple
+from datetime import datetime
+from sqlalchemy import insert, delete
+from sqlalchemy.orm import Session
+from app.models.database import Asset, ComplianceCounter, IncidentFinding, VulnerabilityFinding
+
+SCOPES = ("severity", "group", "incident")
+UNGROUPED = "ungrouped"
+
+# (scope, key) -> [total delta, patched delta]
+Deltas = Dict[Tuple[str, str], List[int]]
+
+def _add(deltas: Deltas, scope: str, key, total: int, patched: int):
+    entry = deltas.setdefault((scope, str(key)), [0, 0])
+    entry[0] += total
+    entry[1] += patched
+
+def _ratio(total: int, patched: int) -> float:
+    return round(100.0 * patched / total, 1) if total else 100.0
+
+class ComplianceTracker:
+    """Patch compliance counters per severity, asset group and incident.
+
+    Findings (one per host and CVE) are written when vulnerability data is
+    synced, linked to incidents when their hosts turn up in one, and marked
+    patched as patch results arrive. Each of those steps adjusts the
+    compliance_counters rows by the same deltas, so dashboards read a few
+    precomputed rows instead of matching the inventory on every request.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _apply(self, deltas: Deltas):
+        for (scope, key), (total, patched) in deltas.items():
+            if not total and not patched:
+                continue
+            updated = self.db.query(ComplianceCounter).filter(
+                ComplianceCounter.scope == scope, ComplianceCounter.key == key
+            ).update({
+                "total": ComplianceCounter.total + total,
+                "patched": ComplianceCounter.patched + patched,
+                "updated_at": datetime.utcnow()
+            }, synchronize_session=False)
+            if not updated:
+                self.db.execute(insert(ComplianceCounter), [{"scope": scope, "key": key, "total": total, "patched": patched}])
+
+    def _incidents_of(self, finding_ids: List[int]) -> Dict[int, List[int]]:
+        linked: Dict[int, List[int]] = {}
+        for i in range(0, len(finding_ids), 500):
+            rows = self.db.query(IncidentFinding.finding_id, IncidentFinding.incident_id).filter(
+                IncidentFinding.finding_id.in_(finding_ids[i:i + 500])
+            )
+            for finding_id, incident_id in rows:
+                linked.setdefault(finding_id, []).append(incident_id)
+        return linked
+
+    def _findings(self, pairs: Set[Tuple[str, str]], *columns) -> List:
+        """Finding rows (id, system, cve_id, *columns) for (system, cve_id) pairs"""
+        # Row-value IN is a table scan on SQLite; select by host through the
+        # key index and keep the exact pairs here
+        by_system: Dict[str, Set[str]] = {}
+        for system, cve_id in pairs:
+            by_system.setdefault(system, set()).add(cve_id)
+        systems = list(by_system)
+        found = []
+        for i in range(0, len(systems), 200):
+            rows = self.db.query(VulnerabilityFinding.id, VulnerabilityFinding.system, VulnerabilityFinding.cve_id, *columns).filter(
+                VulnerabilityFinding.system.in_(systems[i:i + 200])
+            )
+            found.extend(row for row in rows if row.cve_id in by_system[row.system])
+        return found
+
+    def _mark_patched(self, findings: List[Tuple[int, str, str]], deltas: Deltas):
+        """findings: (id, severity, group) of open findings now fixed"""
+        if not findings:
+            return
+        ids = [finding_id for finding_id, _, _ in findings]
+        linked = self._incidents_of(ids)
+        now = datetime.utcnow()
+        for i in range(0, len(ids), 500):
+            self.db.query(VulnerabilityFinding).filter(VulnerabilityFinding.id.in_(ids[i:i + 500])).update(
+                {"patched": True, "patched_at": now}, synchronize_session=False
+            )
+        for finding_id, severity, group in findings:
+            _add(deltas, "severity", severity, 0, 1)
+            _add(deltas, "group", group, 0, 1)
+            for incident_id in linked.get(finding_id, []):
+                _add(deltas, "incident", incident_id, 0, 1)
+
+    def _retire(self, findings: List[Tuple[int, str, str, int]], deltas: Deltas):
+        """findings: (id, severity, group, patched) to remove with their incident links"""
+        if not findings:
+            return
+        ids = [finding_id for finding_id, _, _, _ in findings]
+        linked = self._incidents_of(ids)
+        for finding_id, severity, group, patched in findings:
+            _add(deltas, "severity", severity, -1, -patched)
+            _add(deltas, "group", group, -1, -patched)
+            for incident_id in linked.get(finding_id, []):
+                _add(deltas, "incident", incident_id, -1, -patched)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            self.db.execute(delete(IncidentFinding).where(IncidentFinding.finding_id.in_(chunk)))
+            self.db.execute(delete(VulnerabilityFinding).where(VulnerabilityFinding.id.in_(chunk)))
+
+    def sync_findings(self, vulnerabilities: List[Dict]) -> Dict:
+        """Bring findings in line with a match of the whole inventory (CVEStore.match_assets).
+
+        New host/CVE pairs open findings. Open findings no longer matched were
+        remediated outside the platform (upgraded or removed software) and are
+        marked patched, and findings of hosts gone from the inventory are
+        dropped. Findings follow re-scored CVEs to their new severity and
+        hosts to their new asset group. Patched findings stay patched: the
+        inventory usually lags behind the patch results.
+        """
+        groups = {
+            row.hostname or row.ip_address: row.asset_group or UNGROUPED
+            for row in self.db.query(Asset.hostname, Asset.ip_address, Asset.asset_group)
+        }
+        current: Dict[Tuple[str, str], str] = {}
+        for v in vulnerabilities:
+            for system in v["affected_systems"]:
+                current[(system, v["cve_id"])] = v["severity"] or "unknown"
+
+        deltas: Deltas = {}
+        fixed, reclassified, retired = [], [], []
+        regrouped: Dict[str, List[int]] = {}
+        existing = set()
+        rows = self.db.query(
+            VulnerabilityFinding.id, VulnerabilityFinding.system, VulnerabilityFinding.cve_id,
+            VulnerabilityFinding.severity, VulnerabilityFinding.asset_group, VulnerabilityFinding.patched
+        )
+        for finding_id, system, cve_id, severity, group, patched in rows:
+            existing.add((system, cve_id))
+            if system not in groups:
+                # Host left the inventory: drop its findings rather than count them as patched
+                retired.append((finding_id, severity, group, int(bool(patched))))
+                continue
+            group_now = groups[system]
+            if group_now != group:
+                # Host moved to another asset group: move the finding's counts with it
+                regrouped.setdefault(group_now, []).append(finding_id)
+                _add(deltas, "group", group, -1, -int(bool(patched)))
+                _add(deltas, "group", group_now, 1, int(bool(patched)))
+            severity_now = current.get((system, cve_id))
+            if severity_now is None:
+                if not patched:
+                    fixed.append((finding_id, severity, group_now))
+            elif severity_now != severity:
+                # Re-scored CVE: move the finding to its new severity bucket
+                reclassified.append((finding_id, severity_now))
+                _add(deltas, "severity", severity, -1, -int(patched))
+                _add(deltas, "severity", severity_now, 1, int(patched))
+
+        self._mark_patched(fixed, deltas)
+        self._retire(retired, deltas)
+        for finding_id, severity in reclassified:
+            self.db.query(VulnerabilityFinding).filter(VulnerabilityFinding.id == finding_id).update(
+                {"severity": severity}, synchronize_session=False
+            )
+        for group, ids in regrouped.items():
+            for i in range(0, len(ids), 500):
+                self.db.query(VulnerabilityFinding).filter(VulnerabilityFinding.id.in_(ids[i:i + 500])).update(
+                    {"asset_group": group}, synchronize_session=False
+                )
+        new_rows = [
+            {"system": system, "cve_id": cve_id, "severity": severity,
+             "asset_group": groups.get(system, UNGROUPED), "patched": False}
+            for (system, cve_id), severity in current.items() if (system, cve_id) not in existing
+        ]
+        for i in range(0, len(new_rows), 1000):
+            self.db.execute(insert(VulnerabilityFinding), new_rows[i:i + 1000])
+        for row in new_rows:
+            _add(deltas, "severity", row["severity"], 1, 0)
+            _add(deltas, "group", row["asset_group"], 1, 0)
+        self._apply(deltas)
+        self.db.commit()
+
+        return {"opened": len(new_rows), "remediated": len(fixed), "reclassified": len(reclassified),
+                "regrouped": sum(len(ids) for ids in regrouped.values()), "retired": len(retired)}
+
+    def attribute(self, incident_id: int, vulnerabilities: List[Dict]) -> Dict[Tuple[str, str], bool]:
+        """Link the findings behind an incident's vulnerabilities to it; returns (system, cve_id) -> patched"""
+        pairs = {(system, v["cve_id"]) for v in vulnerabilities for system in v["affected_systems"]}
+        findings = {
+            row.id: (row.system, row.cve_id, bool(row.patched))
+            for row in self._findings(pairs, VulnerabilityFinding.patched)
+        }
+        if not findings:
+            return {}
+
+        linked = {row.finding_id for row in self.db.query(IncidentFinding.finding_id).filter(
+            IncidentFinding.incident_id == incident_id
+        )}
+        new_links = [finding_id for finding_id in findings if finding_id not in linked]
+        if new_links:
+            self.db.execute(insert(IncidentFinding), [
+                {"incident_id": incident_id, "finding_id": finding_id} for finding_id in new_links
+            ])
+            deltas: Deltas = {}
+            _add(deltas, "incident", incident_id, len(new_links), sum(findings[f][2] for f in new_links))
+            self._apply(deltas)
+            self.db.commit()
+        return {(system, cve_id): patched for system, cve_id, patched in findings.values()}
+
+    def record_patches(self, results: Iterable[Dict]):
+        """Close the findings of successful patch results ({"vulnerability_id", "host", "success"})"""
+        pairs = {(r["host"], r["vulnerability_id"]) for r in results if r.get("success") and r.get("host")}
+        fixed = [
+            (row.id, row.severity, row.asset_group)
+            for row in self._findings(pairs, VulnerabilityFinding.patched, VulnerabilityFinding.severity,
+                                      VulnerabilityFinding.asset_group)
+            if not row.patched
+        ]
+        if not fixed:
+            return
+        deltas: Deltas = {}
+        self._mark_patched(fixed, deltas)
+        self._apply(deltas)
+        self.db.commit()
+
+    def counters(self, scope: Optional[str] = None, key: Optional[str] = None) -> Dict[str, Dict[str, Dict]]:
+        """scope -> key -> {"total", "patched", "unpatched", "compliance"}"""
+        query = self.db.query(ComplianceCounter.scope, ComplianceCounter.key,
+                              ComplianceCounter.total, ComplianceCounter.patched)
+        if scope:
+            query = query.filter(ComplianceCounter.scope == scope)
+        if key is not None:
+            query = query.filter(ComplianceCounter.key == str(key))
+        result: Dict[str, Dict[str, Dict]] = {}
+        for row_scope, row_key, total, patched in query:
+            result.setdefault(row_scope, {})[row_key] = {
+                "total": total,
+                "patched": patched,
+                "unpatched": total - patched,
+                "compliance": _ratio(total, patched)
+            }
+        return result
+
+    def rebuild(self):
+        """Recompute every counter from the findings (after restores or manual edits)"""
+        deltas: Deltas = {}
+        for severity, group, patched in self.db.query(
+            VulnerabilityFinding.severity, VulnerabilityFinding.asset_group, VulnerabilityFinding.patched
+        ):
+            _add(deltas, "severity", severity, 1, int(bool(patched)))
+            _add(deltas, "group", group, 1, int(bool(patched)))
+        rows = self.db.query(IncidentFinding.incident_id, VulnerabilityFinding.patched).join(
+            VulnerabilityFinding, VulnerabilityFinding.id == IncidentFinding.finding_id
+        )
+        for incident_id, patched in rows:
+            _add(deltas, "incident", incident_id, 1, int(bool(patched)))
+        self.db.execute(delete(ComplianceCounter))
+        if deltas:
+            self.db.execute(insert(ComplianceCounter), [
+                {"scope": scope, "key": key, "total": total, "patched": patched}
+                for (scope, key), (total, patched) in deltas.items()
+            ])
+        self.db.commit()
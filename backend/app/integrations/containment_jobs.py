@@ -0,0 +1,372 @@
+import argparse
+import asyncio
+import random
+import socket
+import uuid
+from typing import List, Dict, Optional, Tuple, Callable, Awaitable
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.ip_index import IPRangeIndex
+from app.core.tasks import register_periodic, start_background_tasks, stop_background_tasks
+from app.integrations.allowlist import protected_ranges, load_protected_ranges, refresh_protected_ranges
+from app.integrations.action_log import action_log, flush_action_log
+from app.integrations.block_expiry import block_ttl, previous_offenses
+from app.integrations.blocklist import BlocklistManager
+from app.integrations.firewall import FirewallIntegration
+from app.models.database import AggregatedBlock, BlockedIP, ContainmentJob
+
+FINISHED = ("succeeded", "failed")
+
+# Handlers return (result, retry payload or None when the job is complete)
+Handler = Callable[[Session, FirewallIntegration, ContainmentJob], Awaitable[Tuple[Dict, Optional[Dict]]]]
+
+async def block_and_record(db: Session, firewall: FirewallIntegration, incident_id: int, ip_addresses: List[str],
+                           reason: str, ttl_seconds: Optional[int] = None) -> Dict:
+    """Block IPs not already covered by an active block and record each success"""
+    # Skip addresses already covered by an active block (single IP or CIDR)
+    active_blocks = IPRangeIndex()
+    active_blocks.bulk_load(
+        (row.ip_address, row.ip_address)
+        for row in db.query(BlockedIP.ip_address).filter(BlockedIP.is_active == True)
+    )
+    already_blocked = {
+        ip: [network for network, _ in covering]
+        for ip, covering in active_blocks.covering_many(ip_addresses).items()
+    }
+
+    # Never send protected addresses, whatever path queued the job
+    protected = protected_ranges.conflicts(ip_addresses)
+    to_block = [ip for ip in dict.fromkeys(ip_addresses) if ip not in already_blocked and ip not in protected]
+
+    # Repeat offenders get escalating TTLs; one batch call per distinct TTL
+    offenses = previous_offenses(db, to_block)
+    ttls = {ip: block_ttl(ttl_seconds, offenses.get(ip, 0)) for ip in to_block}
+    outcome = {}
+    for ttl in set(ttls.values()):
+        group = [ip for ip in to_block if ttls[ip] == ttl]
+        outcome.update(await firewall.block_ips_batch(group, reason, f"{ttl}s" if ttl else "permanent"))
+    blocked_ips = [ip for ip in to_block if outcome.get(ip)]
+
+    # Record every successful block with a single bulk insert
+    if blocked_ips:
+        now = datetime.utcnow()
+        rows = [
+            {
+                "incident_id": incident_id,
+                "ip_address": ip,
+                "reason": reason,
+                "blocked_at": now,
+                "expires_at": now + timedelta(seconds=ttls[ip]) if ttls[ip] else None,
+                "offense_count": offenses.get(ip, 0) + 1,
+                "is_active": True
+            }
+            for ip in blocked_ips
+        ]
+        # Expiry is scheduled by the API process, which picks the rows up on its next tick
+        db.execute(insert(BlockedIP), rows)
+        db.commit()
+
+    return {
+        "blocked_ips": blocked_ips,
+        "already_blocked": already_blocked,
+        "expires_in": {ip: ttls[ip] for ip in blocked_ips if ttls[ip]},
+        "protected": protected,
+        "failed_ips": [ip for ip in to_block if not outcome.get(ip)]
+    }
+
+async def unblock_and_record(db: Session, firewall: FirewallIntegration, incident_id: int, ip_addresses: List[str]) -> Dict:
+    """Unblock IPs and mark their active blocks for the incident as lifted"""
+    outcome = await firewall.unblock_ips_batch(ip_addresses)
+    unblocked_ips = [ip for ip, success in outcome.items() if success]
+
+    if unblocked_ips:
+        db.query(BlockedIP).filter(
+            BlockedIP.ip_address.in_(unblocked_ips),
+            BlockedIP.incident_id == incident_id,
+            BlockedIP.is_active == True
+        ).update({"is_active": False, "unblocked_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        # As in expire_blocks: a lifted address may still sit inside an aggregated prefix
+        if db.query(AggregatedBlock.id).filter(AggregatedBlock.is_active == True).first():
+            await BlocklistManager(db).compile_and_apply()
+
+    return {
+        "unblocked_ips": unblocked_ips,
+        "failed_ips": [ip for ip, success in outcome.items() if not success]
+    }
+
+def _merge(previous: Optional[Dict], result: Dict) -> Dict:
+    """Accumulate per-IP results across attempts; failures are replaced by the latest attempt"""
+    if not previous:
+        return result
+    merged = dict(result)
+    for key, value in previous.items():
+        if key == "failed_ips":
+            continue
+        if isinstance(value, list):
+            merged[key] = value + result.get(key, [])
+        elif isinstance(value, dict):
+            merged[key] = {**value, **result.get(key, {})}
+    return merged
+
+async def _run_block(db: Session, firewall: FirewallIntegration, job: ContainmentJob):
+    payload = job.payload
+    result = await block_and_record(db, firewall, job.incident_id, payload["ip_addresses"],
+                                    payload["reason"], payload.get("ttl_seconds"))
+    retry = {**payload, "ip_addresses": result["failed_ips"]} if result["failed_ips"] else None
+    return result, retry
+
+async def _run_unblock(db: Session, firewall: FirewallIntegration, job: ContainmentJob):
+    payload = job.payload
+    result = await unblock_and_record(db, firewall, job.incident_id, payload["ip_addresses"])
+    retry = {**payload, "ip_addresses": result["failed_ips"]} if result["failed_ips"] else None
+    return result, retry
+
+async def _run_rate_limit(db: Session, firewall: FirewallIntegration, job: ContainmentJob):
+    success = await firewall.enable_rate_limiting(job.payload)
+    return {"success": success}, None if success else job.payload
+
+async def _run_rule(db: Session, firewall: FirewallIntegration, job: ContainmentJob):
+    result = await firewall.create_firewall_rule(job.payload)
+    return result, None if result.get("success") else job.payload
+
+handlers: Dict[str, Handler] = {
+    "block": _run_block,
+    "unblock": _run_unblock,
+    "rate_limit": _run_rate_limit,
+    "rule": _run_rule
+}
+
+def firewall_target() -> str:
+    return settings.FIREWALL_API_URL or "mock"
+
+def enqueue_job(db: Session, action: str, payload: Dict, incident_id: Optional[int] = None,
+                idempotency_key: Optional[str] = None) -> Tuple[ContainmentJob, bool]:
+    """Queue a containment action; returns (job, created). A repeated key returns the original job."""
+    if action not in handlers:
+        raise ValueError(f"Unknown containment action: {action}")
+    if idempotency_key:
+        existing = db.query(ContainmentJob).filter(ContainmentJob.idempotency_key == idempotency_key).first()
+        if existing:
+            return existing, False
+
+    job = ContainmentJob(
+        idempotency_key=idempotency_key or str(uuid.uuid4()),
+        incident_id=incident_id,
+        action=action,
+        target=firewall_target(),
+        payload=payload,
+        status="queued",
+        attempts=0,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        next_run_at=datetime.utcnow()
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent request carrying the same key
+        db.rollback()
+        return db.query(ContainmentJob).filter(ContainmentJob.idempotency_key == idempotency_key).first(), False
+    db.refresh(job)
+    worker_pool.notify()
+    return job, True
+
+def job_summary(job: ContainmentJob) -> Dict:
+    return {
+        "job_id": job.id,
+        "idempotency_key": job.idempotency_key,
+        "incident_id": job.incident_id,
+        "action": job.action,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "next_run_at": job.next_run_at.isoformat() if job.next_run_at and job.status == "queued" else None,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+def _runnable(now: datetime):
+    lease_cutoff = now - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    return or_(
+        and_(ContainmentJob.status == "queued", ContainmentJob.next_run_at <= now),
+        # A worker that died mid-job leaves it running; reclaim once the lease lapses
+        and_(ContainmentJob.status == "running", ContainmentJob.locked_at < lease_cutoff)
+    )
+
+def claim_job(db: Session, worker_id: str) -> Optional[int]:
+    """Atomically take the next runnable job (a conditional UPDATE, safe across processes)"""
+    now = datetime.utcnow()
+    candidates = db.query(ContainmentJob.id).filter(_runnable(now)).order_by(
+        ContainmentJob.next_run_at, ContainmentJob.id
+    ).limit(10).all()
+    for (job_id,) in candidates:
+        claimed = db.query(ContainmentJob).filter(ContainmentJob.id == job_id, _runnable(now)).update({
+            "status": "running",
+            "locked_by": worker_id,
+            "locked_at": now,
+            "attempts": ContainmentJob.attempts + 1
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return job_id
+    return None
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with jitter"""
+    delay = min(settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1), settings.JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.75, 1.25)
+
+def renew_lease(job_id: int, owner: str) -> bool:
+    """Restart the lease of a running job; False once another worker has reclaimed it"""
+    db = SessionLocal()
+    try:
+        renewed = db.query(ContainmentJob).filter(
+            ContainmentJob.id == job_id, ContainmentJob.locked_by == owner, ContainmentJob.status == "running"
+        ).update({"locked_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        return bool(renewed)
+    finally:
+        db.close()
+
+async def _heartbeat(job_id: int, owner: str):
+    # Own session in a thread: the job's session may be mid-transaction between awaits
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+        try:
+            if not await asyncio.to_thread(renew_lease, job_id, owner):
+                return
+        except Exception as e:
+            print(f"Error renewing lease of containment job {job_id}: {e}")
+
+async def run_job(db: Session, job_id: int, firewall: Optional[FirewallIntegration] = None):
+    job = db.query(ContainmentJob).filter(ContainmentJob.id == job_id).first()
+    owner = job.locked_by
+    firewall = firewall or FirewallIntegration(job.incident_id, f"job-{job.id}")
+
+    heartbeat = asyncio.create_task(_heartbeat(job_id, owner))
+    try:
+        result, retry = await handlers[job.action](db, firewall, job)
+        error = None
+    except Exception as e:
+        db.rollback()
+        result, retry, error = {}, job.payload, str(e)
+    finally:
+        heartbeat.cancel()
+
+    now = datetime.utcnow()
+    outcome = {
+        "result": _merge(job.result, result) if result else job.result,
+        "error": error,
+        "locked_by": None
+    }
+    if retry is None:
+        outcome.update(status="succeeded", finished_at=now)
+    elif job.attempts >= job.max_attempts:
+        outcome.update(status="failed", finished_at=now)
+    else:
+        # Only the part that failed is retried
+        outcome.update(status="queued", payload=retry, next_run_at=now + timedelta(seconds=retry_delay(job.attempts)))
+    # Written only while this run still holds the job; a reclaimed job reports the newer run
+    updated = db.query(ContainmentJob).filter(
+        ContainmentJob.id == job_id, ContainmentJob.locked_by == owner
+    ).update(outcome, synchronize_session=False)
+    db.commit()
+    if not updated:
+        print(f"Containment job {job_id} was reclaimed while {owner} ran it; discarding this run's outcome")
+
+class ContainmentWorkerPool:
+    """Async workers draining the containment job table.
+
+    Several processes can run pools against the same database: jobs are
+    claimed with a conditional UPDATE and hold a lease that a heartbeat renews
+    while they run. FIREWALL_JOB_CONCURRENCY limits the jobs running against
+    one target firewall within a single process only; N processes may run up
+    to N times as many.
+    """
+
+    def __init__(self):
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self.worker_prefix = f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self, workers: int):
+        self._wakeup = asyncio.Event()
+        for n in range(workers):
+            self._tasks.append(asyncio.create_task(self._worker(f"{self.worker_prefix}-{n}"), name=f"containment-worker-{n}"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _worker(self, worker_id: str):
+        while True:
+            db = SessionLocal()
+            try:
+                job_id = claim_job(db, worker_id)
+                if job_id is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), settings.JOB_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                target = db.query(ContainmentJob.target).filter(ContainmentJob.id == job_id).scalar()
+                limit = self._limits.setdefault(target, asyncio.Semaphore(settings.FIREWALL_JOB_CONCURRENCY))
+                async with limit:
+                    # The lease counts from here; a job reclaimed while waiting for a slot is dropped
+                    if renew_lease(job_id, worker_id):
+                        await run_job(db, job_id)
+                # More work may be waiting for the other workers too
+                self.notify()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in containment worker {worker_id}: {e}")
+                await asyncio.sleep(settings.JOB_POLL_SECONDS)
+            finally:
+                db.close()
+
+worker_pool = ContainmentWorkerPool()
+
+async def _serve(workers: int):
+    load_protected_ranges()
+    # Block expiry stays with the API process (see BlockExpiryScheduler); running
+    # it here too would unblock and log every expiration once per process
+    register_periodic("protected_ranges_reload", settings.PROTECTED_RANGES_RELOAD_SECONDS, refresh_protected_ranges)
+    register_periodic("action_log_flush", settings.ACTION_LOG_FLUSH_SECONDS, flush_action_log)
+    start_background_tasks()
+    worker_pool.start(workers)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker_pool.stop()
+        await stop_background_tasks()
+        action_log.flush()
+
+def main():
+    """Standalone worker process: python -m app.integrations.containment_jobs --workers 8"""
+    parser = argparse.ArgumentParser(description="Containment job worker")
+    parser.add_argument("--workers", type=int, default=settings.CONTAINMENT_WORKERS or 4)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.workers))
+
+if __name__ == "__main__":
+    main()
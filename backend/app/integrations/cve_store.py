@@ -0,0 +1,392 @@
+import os
+import re
+import asyncio
+import json
+import gzip
+import time
+from functools import lru_cache
+from itertools import zip_longest
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple
+from datetime import datetime
+from sqlalchemy import insert, delete, tuple_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.integrations.compliance import ComplianceTracker
+from app.models.database import Asset, Vulnerability, VulnerableRange
+
+READ_SIZE = 1024 * 1024
+IMPORT_BATCH_SIZE = 1000
+
+# Top-level arrays holding CVE entries: NVD 1.1 data feeds and NVD API 2.0 dumps
+ITEM_ARRAYS = ("CVE_Items", "vulnerabilities")
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[\s,]*")
+
+def _open(path: str):
+    return gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, "r", encoding="utf-8")
+
+def iter_feed_items(path: str) -> Iterator[Dict]:
+    """Yield the entries of an NVD feed one by one without loading the whole document.
+
+    The file is read in blocks; once the opening bracket of the CVE array is
+    found, each entry is decoded with JSONDecoder.raw_decode as soon as it is
+    complete in the buffer, so memory holds one block plus one entry.
+    """
+    with _open(path) as f:
+        buffer = ""
+        # Find the start of the entry array
+        while True:
+            block = f.read(READ_SIZE)
+            buffer += block
+            match = re.search(r'"(%s)"\s*:\s*\[' % "|".join(ITEM_ARRAYS), buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            if not block:
+                return
+            buffer = buffer[-64:]
+
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                block = f.read(READ_SIZE)
+                if not block:
+                    raise
+                buffer = buffer[pos:] + block
+                pos = 0
+                continue
+            yield item
+            pos = end
+            if pos > READ_SIZE:
+                buffer, pos = buffer[pos:], 0
+
+def parse_cpe(cpe: str) -> Optional[Tuple[str, str, str]]:
+    """(vendor, product, version) of a CPE 2.3 name"""
+    parts = cpe.split(":")
+    if len(parts) < 6 or parts[0] != "cpe":
+        return None
+    return parts[3].lower(), parts[4].lower(), parts[5]
+
+PRE_RELEASE = ("dev", "alpha", "a", "beta", "b", "pre", "preview", "rc")
+
+@lru_cache(maxsize=65536)
+def version_key(version: str) -> Tuple[Tuple[int, object], ...]:
+    """Sortable form of a version string: numbers compare numerically, pre-release tags sort first"""
+    key = []
+    for token in re.findall(r"\d+|[a-z]+", version.lower()):
+        if token.isdigit():
+            key.append((2, int(token)))
+        elif token in PRE_RELEASE:
+            key.append((0, token))
+        else:
+            # Letter suffixes (1.1.1k) are later releases
+            key.append((3, token))
+    return tuple(key)
+
+def compare_versions(a: str, b: str) -> int:
+    # Missing components count as 0, so 1.0 == 1.0.0 and 2.0rc1 < 2.0 < 2.0.1
+    for x, y in zip_longest(version_key(a), version_key(b), fillvalue=(2, 0)):
+        if x != y:
+            return -1 if x < y else 1
+    return 0
+
+def in_range(version: str, exact: Optional[str], start_including: Optional[str], start_excluding: Optional[str],
+             end_including: Optional[str], end_excluding: Optional[str]) -> bool:
+    """Whether an installed version falls inside a vulnerable CPE range"""
+    if exact not in (None, "", "*", "-"):
+        return compare_versions(version, exact) == 0
+    if start_including and compare_versions(version, start_including) < 0:
+        return False
+    if start_excluding and compare_versions(version, start_excluding) <= 0:
+        return False
+    if end_including and compare_versions(version, end_including) > 0:
+        return False
+    if end_excluding and compare_versions(version, end_excluding) >= 0:
+        return False
+    return True
+
+def _cpe_matches_11(nodes: List[Dict]) -> Iterator[Dict]:
+    for node in nodes:
+        yield from node.get("cpe_match", [])
+        yield from _cpe_matches_11(node.get("children", []))
+
+def parse_entry(item: Dict) -> Optional[Tuple[Dict, List[Dict]]]:
+    """(vulnerability row, vulnerable range rows) from an NVD 1.1 or 2.0 entry"""
+    if "CVE_data_meta" in item.get("cve", {}):
+        cve = item["cve"]
+        cve_id = cve["CVE_data_meta"]["ID"]
+        descriptions = cve.get("description", {}).get("description_data", [])
+        metric = item.get("impact", {}).get("baseMetricV3", {}).get("cvssV3") or \
+            item.get("impact", {}).get("baseMetricV2", {}).get("cvssV2", {})
+        severity = metric.get("baseSeverity") or item.get("impact", {}).get("baseMetricV2", {}).get("severity")
+        matches = (
+            {
+                "criteria": m.get("cpe23Uri", ""),
+                "vulnerable": m.get("vulnerable", False),
+                "start_including": m.get("versionStartIncluding"),
+                "start_excluding": m.get("versionStartExcluding"),
+                "end_including": m.get("versionEndIncluding"),
+                "end_excluding": m.get("versionEndExcluding")
+            }
+            for m in _cpe_matches_11(item.get("configurations", {}).get("nodes", []))
+        )
+        published, modified = item.get("publishedDate"), item.get("lastModifiedDate")
+    elif "id" in item.get("cve", {}):
+        cve = item["cve"]
+        cve_id = cve["id"]
+        descriptions = cve.get("descriptions", [])
+        metrics = cve.get("metrics", {})
+        metric = {}
+        for name in ("cvssMetricV31", "cvssMetricV30", "cvssMetricV2"):
+            if metrics.get(name):
+                metric = dict(metrics[name][0].get("cvssData", {}))
+                metric.setdefault("baseSeverity", metrics[name][0].get("baseSeverity"))
+                break
+        severity = metric.get("baseSeverity")
+        matches = (
+            {
+                "criteria": m.get("criteria", ""),
+                "vulnerable": m.get("vulnerable", False),
+                "start_including": m.get("versionStartIncluding"),
+                "start_excluding": m.get("versionStartExcluding"),
+                "end_including": m.get("versionEndIncluding"),
+                "end_excluding": m.get("versionEndExcluding")
+            }
+            for config in cve.get("configurations", [])
+            for node in config.get("nodes", [])
+            for m in node.get("cpeMatch", [])
+        )
+        published, modified = cve.get("published"), cve.get("lastModified")
+        if cve.get("vulnStatus") == "Rejected":
+            descriptions = [{"lang": "en", "value": "** REJECT **"}]
+    else:
+        return None
+
+    description = next((d.get("value", "") for d in descriptions if d.get("lang") == "en"), "")
+    vulnerability = {
+        "cve_id": cve_id,
+        "description": description,
+        "score": metric.get("baseScore"),
+        "severity": (severity or "unknown").lower(),
+        "published": published,
+        "last_modified": modified
+    }
+
+    ranges, seen = [], set()
+    for match in matches:
+        parsed = parse_cpe(match.pop("criteria"))
+        if not match.pop("vulnerable") or not parsed:
+            continue
+        vendor, product, version = parsed
+        row = {"cve_id": cve_id, "vendor": vendor, "product": product, "version": version, **match}
+        key = tuple(row.values())
+        if key not in seen:
+            seen.add(key)
+            ranges.append(row)
+    return vulnerability, ranges
+
+class CVEStore:
+    """Local CVE database imported from NVD JSON feeds.
+
+    Entries are streamed from the feed files and written in batches; an
+    entry whose lastModified matches the stored row is skipped, so importing
+    the NVD "modified" feed (or re-importing a yearly feed) only rewrites the
+    CVEs that changed. Vulnerable configurations are stored one row per CPE
+    range, indexed by (vendor, product) for asset matching.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def import_feed(self, path: str) -> Dict:
+        started = time.perf_counter()
+        known = dict(self.db.query(Vulnerability.cve_id, Vulnerability.last_modified))
+        stats = {"path": path, "entries": 0, "added": 0, "updated": 0, "unchanged": 0, "rejected": 0}
+        batch: List[Tuple[Dict, List[Dict]]] = []
+        rejected: List[str] = []
+
+        for item in iter_feed_items(path):
+            parsed = parse_entry(item)
+            if parsed is None:
+                continue
+            stats["entries"] += 1
+            vulnerability, ranges = parsed
+            cve_id = vulnerability["cve_id"]
+            if vulnerability["description"].startswith("** REJECT **"):
+                if cve_id in known:
+                    rejected.append(cve_id)
+                    known.pop(cve_id)
+                    stats["rejected"] += 1
+                continue
+            previous = known.get(cve_id, False)
+            if previous is not False and previous == vulnerability["last_modified"]:
+                stats["unchanged"] += 1
+                continue
+            stats["updated" if previous is not False else "added"] += 1
+            known[cve_id] = vulnerability["last_modified"]
+            batch.append(parsed)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                self._write(batch)
+                batch = []
+
+        self._write(batch)
+        self._remove(rejected)
+        stats["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return stats
+
+    def _remove(self, cve_ids: List[str]):
+        for i in range(0, len(cve_ids), 500):
+            chunk = cve_ids[i:i + 500]
+            self.db.execute(delete(VulnerableRange).where(VulnerableRange.cve_id.in_(chunk)))
+            self.db.execute(delete(Vulnerability).where(Vulnerability.cve_id.in_(chunk)))
+        self.db.commit()
+
+    def _write(self, batch: List[Tuple[Dict, List[Dict]]]):
+        if not batch:
+            return
+        cve_ids = [vulnerability["cve_id"] for vulnerability, _ in batch]
+        self.db.execute(delete(VulnerableRange).where(VulnerableRange.cve_id.in_(cve_ids)))
+        self.db.execute(delete(Vulnerability).where(Vulnerability.cve_id.in_(cve_ids)))
+        self.db.execute(insert(Vulnerability), [vulnerability for vulnerability, _ in batch])
+        ranges = [row for _, rows in batch for row in rows]
+        if ranges:
+            self.db.execute(insert(VulnerableRange), ranges)
+        self.db.commit()
+
+    def has_data(self) -> bool:
+        return self.db.query(Vulnerability.cve_id).first() is not None
+
+    def match_assets(self, assets: Iterable[Asset]) -> List[Dict]:
+        """CVEs affecting the given assets, most severe first"""
+        installed: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        for asset in assets:
+            for item in asset.software or []:
+                key = (str(item.get("vendor", "")).lower(), str(item.get("product", "")).lower())
+                installed.setdefault(key, []).append((asset.hostname or asset.ip_address, str(item.get("version", ""))))
+        if not installed:
+            return []
+
+        affected: Dict[str, Dict] = {}
+        pairs = list(installed)
+        for i in range(0, len(pairs), 200):
+            rows = self.db.query(
+                VulnerableRange.cve_id, VulnerableRange.vendor, VulnerableRange.product, VulnerableRange.version,
+                VulnerableRange.start_including, VulnerableRange.start_excluding,
+                VulnerableRange.end_including, VulnerableRange.end_excluding
+            ).filter(tuple_(VulnerableRange.vendor, VulnerableRange.product).in_(pairs[i:i + 200]))
+            for cve_id, vendor, product, *bounds in rows:
+                for system, version in installed[(vendor, product)]:
+                    if version and in_range(version, *bounds):
+                        entry = affected.setdefault(cve_id, {"systems": set(), "fixed": set(), "products": set()})
+                        entry["systems"].add(system)
+                        entry["products"].add(f"{vendor}:{product}:{version}")
+                        if bounds[-1]:
+                            entry["fixed"].add(bounds[-1])
+
+        if not affected:
+            return []
+        vulnerabilities = {}
+        cve_ids = list(affected)
+        for i in range(0, len(cve_ids), 500):
+            rows = self.db.query(
+                Vulnerability.cve_id, Vulnerability.severity, Vulnerability.score, Vulnerability.description
+            ).filter(Vulnerability.cve_id.in_(cve_ids[i:i + 500]))
+            for row in rows:
+                vulnerabilities[row.cve_id] = row
+
+        results = []
+        for cve_id, entry in affected.items():
+            row = vulnerabilities.get(cve_id)
+            if row is None:
+                continue
+            results.append({
+                "cve_id": cve_id,
+                "severity": row.severity,
+                "score": row.score,
+                "description": row.description,
+                "affected_systems": sorted(entry["systems"]),
+                "affected_software": sorted(entry["products"]),
+                "patched": False,
+                "patch_available": bool(entry["fixed"]),
+                "fixed_versions": sorted(entry["fixed"], key=version_key)
+            })
+        return sorted(results, key=lambda r: (-(r["score"] or 0), r["cve_id"]))
+
+def _normalize_software(item) -> Optional[Dict]:
+    if isinstance(item, str):
+        parsed = parse_cpe(item)
+        return {"vendor": parsed[0], "product": parsed[1], "version": parsed[2]} if parsed else None
+    if isinstance(item, dict) and item.get("product"):
+        return {"vendor": str(item.get("vendor", "")).lower(), "product": str(item["product"]).lower(),
+                "version": str(item.get("version", ""))}
+    return None
+
+def load_inventory(db: Session, path: str) -> int:
+    """Replace the asset table from a JSON list / JSON-lines inventory file.
+
+    Each host: {"hostname", "ip_address", "group", "software": [CPE 2.3 names or {"vendor", "product", "version"}]}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(1)
+        f.seek(0)
+        records = json.load(f) if head == "[" else [json.loads(line) for line in f if line.strip()]
+    rows = [
+        {
+            "hostname": record.get("hostname"),
+            "ip_address": record.get("ip_address") or record.get("ip"),
+            "asset_group": record.get("group") or record.get("asset_group"),
+            "software": [s for s in map(_normalize_software, record.get("software", [])) if s]
+        }
+        for record in records
+    ]
+    db.execute(delete(Asset))
+    if rows:
+        db.execute(insert(Asset), rows)
+    db.commit()
+    return len(rows)
+
+# (size, mtime_ns) of each source file at its last import in this process
+_imported: Dict[str, Tuple[int, int]] = {}
+
+def _changed(path: str) -> bool:
+    st = os.stat(path)
+    return _imported.get(path) != (st.st_size, st.st_mtime_ns)
+
+def import_vulnerability_data(db: Optional[Session] = None, force: bool = False) -> Dict:
+    """Import configured NVD feeds and asset inventory, skipping files unchanged since the last run"""
+    own_session = db is None
+    db = db or SessionLocal()
+    result = {"feeds": [], "assets": None, "at": datetime.utcnow().isoformat()}
+    try:
+        store = CVEStore(db)
+        for path in [p.strip() for p in (settings.NVD_FEED_PATHS or "").split(",") if p.strip()]:
+            if force or _changed(path):
+                st = os.stat(path)
+                result["feeds"].append(store.import_feed(path))
+                _imported[path] = (st.st_size, st.st_mtime_ns)
+        path = settings.ASSET_INVENTORY_PATH
+        if path and (force or _changed(path)):
+            st = os.stat(path)
+            result["assets"] = load_inventory(db, path)
+            _imported[path] = (st.st_size, st.st_mtime_ns)
+        if (result["feeds"] or result["assets"] is not None) and store.has_data():
+            # Findings and compliance counters only change when the data does
+            result["findings"] = ComplianceTracker(db).sync_findings(store.match_assets(db.query(Asset).all()))
+        return result
+    finally:
+        if own_session:
+            db.close()
+
+async def refresh_vulnerability_data():
+    try:
+        # A full NVD import takes a while; keep it off the event loop
+        await asyncio.to_thread(import_vulnerability_data)
+    except Exception as e:
+        print(f"Error importing vulnerability data: {e}")
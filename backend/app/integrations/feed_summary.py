@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import threading
+from collections import Counter
+from datetime import datetime
+from itertools import chain
+from typing import List, Dict, Optional, NamedTuple, Tuple
+from app.core.config import settings
+from app.integrations.threat_feed import ThreatFeedStore, feed_store
+
+TOP_THREATS = 10
+TRENDING = 5
+SAMPLE_IOCS = 5
+
+class FeedSnapshot(NamedTuple):
+    """A built /threat-feed response: the serialized body and its ETag"""
+    body: bytes
+    etag: str
+    summary: Dict
+    built_at: str
+
+def severity(score: int) -> str:
+    # Inverse of the severity -> score mapping in ThreatFeedStore.load_from_feed
+    if score >= 9:
+        return "critical"
+    if score >= 7:
+        return "high"
+    if score >= 4:
+        return "medium"
+    return "low"
+
+def summarize_store(store: ThreatFeedStore) -> Tuple[Dict, Dict[str, int]]:
+    """Top threats and per-type counts of a locally loaded feed in one pass, plus indicators per threat name"""
+    types = Counter()
+    threats: Dict[str, Dict] = {}
+    # list() copies under the GIL, so an apply_delta running meanwhile cannot break the walk
+    for indicator in chain(list(store.indicators.values()), list(store.blocks.values())):
+        types[indicator.type] += 1
+        if not indicator.name:
+            continue
+        threat = threats.get(indicator.name)
+        if threat is None:
+            threat = threats[indicator.name] = {
+                "name": indicator.name,
+                "type": indicator.tags[0] if indicator.tags else indicator.type,
+                "score": indicator.score,
+                "indicators": 0,
+                "iocs": []
+            }
+        threat["indicators"] += 1
+        threat["score"] = max(threat["score"], indicator.score)
+        if len(threat["iocs"]) < SAMPLE_IOCS:
+            threat["iocs"].append(indicator.value)
+
+    top = sorted(threats.values(), key=lambda t: (-t["score"], -t["indicators"], t["name"]))[:TOP_THREATS]
+    return {
+        "feed_updated": store.last_loaded,
+        "total_indicators": len(store.indicators) + len(store.blocks),
+        "top_threats": [
+            {"name": t["name"], "type": t["type"], "severity": severity(t["score"]), "indicators": t["indicators"], "iocs": t["iocs"]}
+            for t in top
+        ],
+        "indicator_types": dict(types.most_common())
+    }, {name: threat["indicators"] for name, threat in threats.items()}
+
+def trending(counts: Dict[str, int], baseline: Optional[Dict[str, int]]) -> List[Dict]:
+    """Threat names that gained the most indicators relative to the baseline (by size, without growth, when there is none)"""
+    if baseline is None:
+        return [{"name": name, "growth": None} for name, _ in Counter(counts).most_common(TRENDING)]
+    growth = {
+        name: round(100.0 * (n - baseline[name]) / baseline[name], 1) if baseline.get(name) else 100.0
+        for name, n in counts.items() if n > baseline.get(name, 0)
+    }
+    return [{"name": name, "growth": g} for name, g in sorted(growth.items(), key=lambda i: (-i[1], i[0]))[:TRENDING]]
+
+def summarize_feed(feed_data: Dict) -> Dict:
+    """Summary of a feed pulled from the threat intelligence integration"""
+    return {
+        "feed_updated": feed_data.get("last_updated"),
+        "total_indicators": feed_data.get("total_indicators", 0),
+        "top_threats": feed_data.get("top_threats", []),
+        "trending_malware": feed_data.get("trending_malware", []),
+        "indicator_types": feed_data.get("feed_stats", {})
+    }
+
+class FeedSummary:
+    """Precomputed /threat-feed response.
+
+    Built at startup and after every feed refresh, never per request. Each
+    build produces a new FeedSnapshot and publishes it with one attribute
+    assignment; requests read `snapshot` once and use that object, so they
+    never take a lock or see a half-built summary. Only builders serialize
+    on the lock. A build whose content matches the current snapshot keeps it,
+    together with its ETag, so clients sending If-None-Match get a 304 until
+    the feed actually changes.
+    """
+
+    def __init__(self):
+        self.snapshot: Optional[FeedSnapshot] = None
+        # Indicators per threat name in the current feed and before its last change
+        self.counts: Optional[Dict[str, int]] = None
+        self.baseline: Optional[Dict[str, int]] = None
+        self.lock = threading.Lock()
+
+    def build(self, feed_data: Optional[Dict] = None, new_indicators: int = 0) -> FeedSnapshot:
+        with self.lock:
+            if feed_data is None:
+                summary, counts = summarize_store(feed_store)
+                if counts != self.counts:
+                    self.baseline, self.counts = self.counts, counts
+                summary["trending_malware"] = trending(counts, self.baseline)
+                summary["new_indicators"] = new_indicators
+            else:
+                summary = summarize_feed(feed_data)
+                summary["new_indicators"] = feed_data.get("new_indicators", 0)
+
+            current = self.snapshot
+            if current is not None and _content(current.summary) == _content(summary):
+                return current
+            body = json.dumps(summary, separators=(",", ":"), default=str).encode()
+            snapshot = FeedSnapshot(
+                body=body,
+                etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+                summary=summary,
+                built_at=datetime.utcnow().isoformat()
+            )
+            self.snapshot = snapshot
+            return snapshot
+
+def _content(summary: Dict) -> Dict:
+    # A reload of the same feed only moves the timestamp
+    return {k: v for k, v in summary.items() if k != "feed_updated"}
+
+feed_summary = FeedSummary()
+
+async def build_feed_summary(feed_data: Optional[Dict] = None, new_indicators: int = 0) -> FeedSnapshot:
+    """Rebuild the snapshot from the local feed store, or from the live feed when no local feed is configured"""
+    if settings.THREAT_FEED_PATH:
+        # A large local feed takes a while to walk; keep it off the event loop
+        return await asyncio.to_thread(feed_summary.build, None, new_indicators)
+    if feed_data is None:
+        from app.integrations.threat_intel import ThreatIntelIntegration
+        feed_data = await ThreatIntelIntegration().get_latest_feed()
+    return feed_summary.build(feed_data)
+
+async def refresh_feed_summary(feed_data: Optional[Dict] = None, new_indicators: int = 0):
+    try:
+        await build_feed_summary(feed_data, new_indicators)
+    except Exception as e:
+        print(f"Error building threat feed summary: {e}")
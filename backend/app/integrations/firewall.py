@@ -1,22 +1,74 @@
+import asyncio
 import requests
 import json
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, AsyncIterator
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 from app.core.config import settings
+from app.integrations.action_log import action_log
 
 class FirewallIntegration:
     """Integration with Firewall/IPS systems for containment actions"""
     
-    def __init__(self):
+    # Shared across instances: pooled keep-alive connections and a bounded
+    # worker pool so concurrent calls never exceed FIREWALL_MAX_CONCURRENCY
+    _session: Optional[requests.Session] = None
+    _executor: Optional[ThreadPoolExecutor] = None
+    _batch_supported: Optional[bool] = settings.FIREWALL_BATCH_SUPPORTED
+    
+    def __init__(self, incident_id: Optional[int] = None, actor: str = "system"):
+        # Every operation is written to the containment action log under this context
+        self.incident_id = incident_id
+        self.actor = actor
         self.api_url = settings.FIREWALL_API_URL
         self.api_key = settings.FIREWALL_API_KEY
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.batch_size = settings.FIREWALL_BATCH_SIZE
+        self.max_concurrency = settings.FIREWALL_MAX_CONCURRENCY
+    
+    @classmethod
+    def _get_session(cls) -> requests.Session:
+        if cls._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.FIREWALL_MAX_CONCURRENCY)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            cls._session = session
+            cls._executor = ThreadPoolExecutor(
+                max_workers=settings.FIREWALL_MAX_CONCURRENCY,
+                thread_name_prefix="firewall"
+            )
+        return cls._session
+    
+    async def _post(self, path: str, payload: Dict) -> requests.Response:
+        """POST to the firewall API without blocking the event loop"""
+        session = self._get_session()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            lambda: session.post(f"{self.api_url}{path}", json=payload, headers=self.headers, timeout=30)
+        )
+    
+    async def _get(self, path: str, params: Optional[Dict] = None) -> requests.Response:
+        """GET from the firewall API without blocking the event loop"""
+        session = self._get_session()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            lambda: session.get(f"{self.api_url}{path}", params=params, headers=self.headers, timeout=30)
+        )
     
-    async def block_ip(self, ip_address: str, reason: str) -> bool:
+    async def block_ip(self, ip_address: str, reason: str, duration: str = "permanent") -> bool:
         """Block an IP address on the firewall"""
+        success = await self._block_one(ip_address, reason, duration)
+        action_log.record(self.incident_id, "block_ip", ip_address, success, f"{reason} ({duration})", self.actor)
+        return success
+    
+    async def _block_one(self, ip_address: str, reason: str, duration: str) -> bool:
         try:
             if not self.api_url:
                 # Mock successful blocking for demo
@@ -27,16 +79,11 @@ class FirewallIntegration:
                 "ip_address": ip_address,
                 "action": "block",
                 "reason": reason,
-                "duration": "permanent",  # or specify time-based blocking
+                "duration": duration,  # "permanent" or a TTL such as "3600s"
                 "timestamp": datetime.utcnow().isoformat()
             }
             
-            response = requests.post(
-                f"{self.api_url}/api/firewall/block",
-                json=payload,
-                headers=self.headers,
-                timeout=30
-            )
+            response = await self._post("/api/firewall/block", payload)
             
             return response.status_code == 200
             
@@ -46,6 +93,11 @@ class FirewallIntegration:
     
     async def unblock_ip(self, ip_address: str) -> bool:
         """Unblock an IP address"""
+        success = await self._unblock_one(ip_address)
+        action_log.record(self.incident_id, "unblock_ip", ip_address, success, None, self.actor)
+        return success
+    
+    async def _unblock_one(self, ip_address: str) -> bool:
         try:
             if not self.api_url:
                 # Mock successful unblocking for demo
@@ -58,12 +110,7 @@ class FirewallIntegration:
                 "timestamp": datetime.utcnow().isoformat()
             }
             
-            response = requests.post(
-                f"{self.api_url}/api/firewall/unblock",
-                json=payload,
-                headers=self.headers,
-                timeout=30
-            )
+            response = await self._post("/api/firewall/unblock", payload)
             
             return response.status_code == 200
             
@@ -84,11 +131,7 @@ class FirewallIntegration:
                     "last_updated": datetime.utcnow().isoformat()
                 }
             
-            response = requests.get(
-                f"{self.api_url}/api/firewall/stats",
-                headers=self.headers,
-                timeout=30
-            )
+            response = await self._get("/api/firewall/stats")
             
             if response.status_code == 200:
                 return response.json()
@@ -102,40 +145,76 @@ class FirewallIntegration:
     async def get_blocked_ips(self) -> List[Dict]:
         """Get list of currently blocked IPs"""
         try:
-            if not self.api_url:
-                # Mock blocked IPs list
-                return [
-                    {
-                        "ip": "203.0.113.45",
-                        "blocked_at": "2024-01-15T10:30:00Z",
-                        "reason": "Brute force attack",
-                        "rule_id": "fw-001"
-                    },
-                    {
-                        "ip": "198.51.100.25", 
-                        "blocked_at": "2024-01-15T11:45:00Z",
-                        "reason": "Port scanning",
-                        "rule_id": "fw-002"
-                    }
-                ]
-            
-            response = requests.get(
-                f"{self.api_url}/api/firewall/blocked-ips",
-                headers=self.headers,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                return response.json().get("blocked_ips", [])
-            else:
-                return []
-                
+            blocked = []
+            async for page in self.iter_blocked_ips():
+                blocked.extend(page)
+            return blocked
         except Exception as e:
             print(f"Error getting blocked IPs: {e}")
             return []
     
+    async def iter_blocked_ips(self, page_size: Optional[int] = None) -> AsyncIterator[List[Dict]]:
+        """Yield the device blocklist page by page.
+        
+        Sends offset/limit and follows a `next_cursor` when the device returns
+        one; a device that ignores paging answers with everything at once,
+        which ends the iteration after the first page, or with the same page
+        again, which ends it at the repeat. A listing longer than
+        FIREWALL_MAX_PAGES raises instead of looping.
+        """
+        if not self.api_url:
+            # Mock blocked IPs list
+            yield [
+                {
+                    "ip": "203.0.113.45",
+                    "blocked_at": "2024-01-15T10:30:00Z",
+                    "reason": "Brute force attack",
+                    "rule_id": "fw-001"
+                },
+                {
+                    "ip": "198.51.100.25", 
+                    "blocked_at": "2024-01-15T11:45:00Z",
+                    "reason": "Port scanning",
+                    "rule_id": "fw-002"
+                }
+            ]
+            return
+        
+        page_size = page_size or settings.FIREWALL_PAGE_SIZE
+        params: Dict = {"offset": 0, "limit": page_size}
+        previous = None
+        for _ in range(settings.FIREWALL_MAX_PAGES):
+            try:
+                response = await self._get("/api/firewall/blocked-ips", params)
+            except Exception as e:
+                raise RuntimeError(f"Error getting blocked IPs: {e}")
+            if response.status_code != 200:
+                raise RuntimeError(f"Error getting blocked IPs: HTTP {response.status_code}")
+            
+            body = response.json()
+            page = body.get("blocked_ips", [])
+            if page and page == previous:
+                return
+            yield page
+            previous = page
+            
+            cursor = body.get("next_cursor")
+            if cursor:
+                params = {"cursor": cursor, "limit": page_size}
+            elif len(page) == page_size:
+                params = {"offset": params.get("offset", 0) + page_size, "limit": page_size}
+            else:
+                return
+        raise RuntimeError(f"Error getting blocked IPs: more than {settings.FIREWALL_MAX_PAGES} pages")
+    
     async def create_firewall_rule(self, rule_config: Dict) -> Dict:
         """Create a new firewall rule"""
+        result = await self._create_rule(rule_config)
+        action_log.record(self.incident_id, "create_rule", str(rule_config.get("source", rule_config.get("name", "rule"))),
+                          result.get("success", False), json.dumps(rule_config, default=str), self.actor)
+        return result
+    
+    async def _create_rule(self, rule_config: Dict) -> Dict:
         try:
             if not self.api_url:
                 # Mock rule creation
@@ -145,12 +224,7 @@ class FirewallIntegration:
                     "message": "Rule created successfully"
                 }
             
-            response = requests.post(
-                f"{self.api_url}/api/firewall/rules",
-                json=rule_config,
-                headers=self.headers,
-                timeout=30
-            )
+            response = await self._post("/api/firewall/rules", rule_config)
             
             if response.status_code == 201:
                 return {
@@ -172,18 +246,19 @@ class FirewallIntegration:
     
     async def enable_rate_limiting(self, config: Dict) -> bool:
         """Enable rate limiting"""
+        success = await self._enable_rate_limiting(config)
+        action_log.record(self.incident_id, "rate_limit", str(config.get("target", "firewall")), success,
+                          json.dumps(config, default=str), self.actor)
+        return success
+    
+    async def _enable_rate_limiting(self, config: Dict) -> bool:
         try:
             if not self.api_url:
                 # Mock rate limiting enable
                 print(f"Mock: Enabling rate limiting with config: {config}")
                 return True
             
-            response = requests.post(
-                f"{self.api_url}/api/firewall/rate-limiting",
-                json=config,
-                headers=self.headers,
-                timeout=30
-            )
+            response = await self._post("/api/firewall/rate-limiting", config)
             
             return response.status_code == 200
             
@@ -191,41 +266,6 @@ class FirewallIntegration:
             print(f"Error enabling rate limiting: {e}")
             return False
     
-    async def get_containment_logs(self, incident_id: int) -> List[Dict]:
-        """Get logs of containment actions for specific incident"""
-        try:
-            # Mock containment logs
-            return [
-                {
-                    "timestamp": "2024-01-15T10:30:00Z",
-                    "action": "block_ip",
-                    "target": "203.0.113.45",
-                    "result": "success",
-                    "details": "IP blocked due to brute force attack",
-                    "user": "system"
-                },
-                {
-                    "timestamp": "2024-01-15T10:31:15Z",
-                    "action": "enable_rate_limiting",
-                    "target": "login_endpoint",
-                    "result": "success", 
-                    "details": "Rate limiting enabled: 5 requests per minute",
-                    "user": "admin"
-                },
-                {
-                    "timestamp": "2024-01-15T10:32:30Z",
-                    "action": "block_ip",
-                    "target": "198.51.100.25",
-                    "result": "success",
-                    "details": "IP blocked due to port scanning",
-                    "user": "system"
-                }
-            ]
-            
-        except Exception as e:
-            print(f"Error getting containment logs: {e}")
-            return []
-    
     async def get_traffic_rules(self) -> List[Dict]:
         """Get current traffic filtering rules"""
         try:
@@ -254,11 +294,7 @@ class FirewallIntegration:
                     }
                 ]
             
-            response = requests.get(
-                f"{self.api_url}/api/firewall/rules",
-                headers=self.headers,
-                timeout=30
-            )
+            response = await self._get("/api/firewall/rules")
             
             if response.status_code == 200:
                 return response.json().get("rules", [])
@@ -269,20 +305,101 @@ class FirewallIntegration:
             print(f"Error getting traffic rules: {e}")
             return []
     
+    async def block_ips_batch(self, ip_addresses: List[str], reason: str, duration: str = "permanent") -> Dict[str, bool]:
+        """Block many IPs, using the batch API when available; returns success per IP"""
+        return await self._batch_action("block", ip_addresses, {"reason": reason, "duration": duration})
+    
+    async def unblock_ips_batch(self, ip_addresses: List[str]) -> Dict[str, bool]:
+        """Unblock many IPs, using the batch API when available; returns success per IP"""
+        return await self._batch_action("unblock", ip_addresses, {})
+    
+    async def _batch_action(self, action: str, ip_addresses: List[str], extra: Dict) -> Dict[str, bool]:
+        results = await self._run_batch(action, list(dict.fromkeys(ip_addresses)), extra)
+        details = f"{extra['reason']} ({extra.get('duration', 'permanent')})" if action == "block" else None
+        action_log.record_many(self.incident_id, f"{action}_ip", results.items(), details, self.actor)
+        return results
+    
+    async def _run_batch(self, action: str, ip_addresses: List[str], extra: Dict) -> Dict[str, bool]:
+        if not ip_addresses:
+            return {}
+        
+        if not self.api_url:
+            # Mock successful batch for demo
+            print(f"Mock: {action} {len(ip_addresses)} IPs in batch - {extra}")
+            return {ip: True for ip in ip_addresses}
+        
+        results: Dict[str, bool] = {}
+        chunks = [ip_addresses[i:i + self.batch_size] for i in range(0, len(ip_addresses), self.batch_size)]
+        
+        if FirewallIntegration._batch_supported is not False:
+            # The first chunk doubles as the capability probe
+            first = await self._send_batch(action, chunks[0], extra)
+            if first is not None:
+                FirewallIntegration._batch_supported = True
+                results.update(first)
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                
+                async def send(chunk):
+                    async with semaphore:
+                        outcome = await self._send_batch(action, chunk, extra)
+                        return chunk, outcome
+                
+                for chunk, outcome in await asyncio.gather(*(send(c) for c in chunks[1:])):
+                    if outcome is None:
+                        outcome = await self._send_individually(action, chunk, extra)
+                    results.update(outcome)
+                return results
+        
+        results.update(await self._send_individually(action, ip_addresses, extra))
+        return results
+    
+    async def _send_batch(self, action: str, chunk: List[str], extra: Dict) -> Optional[Dict[str, bool]]:
+        """Send one chunk to the batch endpoint; None means the batch API is unavailable"""
+        payload = {
+            "ip_addresses": chunk,
+            "action": action,
+            "timestamp": datetime.utcnow().isoformat(),
+            **extra
+        }
+        try:
+            response = await self._post(f"/api/firewall/{action}/batch", payload)
+        except Exception as e:
+            print(f"Error sending {action} batch: {e}")
+            return {ip: False for ip in chunk}
+        
+        if response.status_code in (404, 405, 501):
+            FirewallIntegration._batch_supported = False
+            return None
+        if response.status_code != 200:
+            return {ip: False for ip in chunk}
+        
+        try:
+            failed = set(response.json().get("failed_ips", []))
+        except ValueError:
+            failed = set()
+        return {ip: ip not in failed for ip in chunk}
+    
+    async def _send_individually(self, action: str, ip_addresses: List[str], extra: Dict) -> Dict[str, bool]:
+        """Fallback: one call per IP with bounded concurrency"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def send(ip):
+            async with semaphore:
+                if action == "block":
+                    return ip, await self._block_one(ip, extra.get("reason", ""), extra.get("duration", "permanent"))
+                return ip, await self._unblock_one(ip)
+        
+        return dict(await asyncio.gather(*(send(ip) for ip in ip_addresses)))
+    
     async def bulk_block_ips(self, ip_list: List[str], reason: str) -> Dict:
         """Block multiple IPs in bulk"""
-        results = []
-        successful_blocks = 0
-        
-        for ip in ip_list:
-            success = await self.block_ip(ip, reason)
-            results.append({
-                "ip": ip,
-                "success": success,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            if success:
-                successful_blocks += 1
+        outcome = await self.block_ips_batch(ip_list, reason)
+        timestamp = datetime.utcnow().isoformat()
+        results = [
+            {"ip": ip, "success": outcome.get(ip, False), "timestamp": timestamp}
+            for ip in ip_list
+        ]
+        successful_blocks = sum(1 for r in results if r["success"])
         
         return {
             "total_ips": len(ip_list),
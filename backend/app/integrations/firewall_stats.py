@@ -0,0 +1,68 @@
+import asyncio
+import time
+from typing import Dict, Optional
+from datetime import datetime
+from app.core.config import settings
+from app.integrations.firewall import FirewallIntegration
+
+class FirewallStatsCache:
+    """Shared snapshot of the firewall's connection statistics.
+
+    A background task refreshes it every FIREWALL_STATS_REFRESH_SECONDS.
+    Readers get the snapshot in O(1); when it is older than
+    FIREWALL_STATS_MAX_AGE_SECONDS they still get it immediately while one
+    refresh runs behind them (stale-while-revalidate). Concurrent refreshes
+    share a single in-flight device call, and a failed refresh keeps the
+    previous snapshot.
+    """
+
+    def __init__(self, max_age: Optional[float] = None):
+        self.max_age = max_age if max_age is not None else settings.FIREWALL_STATS_MAX_AGE_SECONDS
+        self.snapshot: Dict = {}
+        self.updated_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._fetched_at: Optional[float] = None
+        self._inflight: Optional[asyncio.Task] = None
+
+    def age(self) -> Optional[float]:
+        return None if self._fetched_at is None else time.monotonic() - self._fetched_at
+
+    async def refresh(self) -> Dict:
+        """Fetch new stats, joining a refresh that is already running"""
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._fetch())
+        return await asyncio.shield(self._inflight)
+
+    async def _fetch(self) -> Dict:
+        stats = await FirewallIntegration().get_connection_stats()
+        if stats:
+            self.snapshot = stats
+            self._fetched_at = time.monotonic()
+            self.updated_at = datetime.utcnow()
+            self.last_error = None
+        else:
+            self.last_error = "Firewall stats unavailable"
+        return self.snapshot
+
+    async def get(self) -> Dict:
+        """Current snapshot; only the very first read waits for the device"""
+        age = self.age()
+        if age is None:
+            await self.refresh()
+        elif age > self.max_age and (self._inflight is None or self._inflight.done()):
+            self._inflight = asyncio.create_task(self._fetch())
+        return self.snapshot
+
+    def metadata(self) -> Dict:
+        age = self.age()
+        return {
+            "stats_updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "stats_age_seconds": round(age, 1) if age is not None else None,
+            "stats_stale": age is None or age > self.max_age,
+            "stats_error": self.last_error
+        }
+
+firewall_stats = FirewallStatsCache()
+
+async def refresh_firewall_stats():
+    await firewall_stats.refresh()
@@ -0,0 +1,461 @@
+import os
+import re
+import gzip
+import mmap
+import time
+import calendar
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import List, Dict, Optional, Iterable, Tuple
+
+# Line timestamp formats: ISO 8601 (app / JSON logs), Apache/Nginx access logs
+# and classic syslog (auth.log), which carries no year
+ISO_TIME = re.compile(rb'(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:[.,]\d+)?(Z|[+-]\d\d:?\d\d)?')
+CLF_TIME = re.compile(rb'\[(\d\d)/([A-Za-z]{3})/(\d{4}):(\d\d):(\d\d):(\d\d) ([+-]\d{4})\]')
+SYSLOG_TIME = re.compile(rb'([A-Z][a-z]{2}) +(\d{1,2}) (\d\d):(\d\d):(\d\d) (\S+)')
+SYSLOG_HOSTS = re.compile(rb'^[A-Z][a-z]{2} +\d{1,2} \d\d:\d\d:\d\d (\S+)', re.M)
+
+MONTHS = {m: i for i, m in enumerate(
+    [b"jan", b"feb", b"mar", b"apr", b"may", b"jun", b"jul", b"aug", b"sep", b"oct", b"nov", b"dec"], 1
+)}
+
+IPV4 = re.compile(rb'(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?![\d.])')
+
+# Attack signatures, matched against the lower-cased chunk (URL-encoded forms included)
+_SP = rb'(?:\s|\+|%20|/\*\*/)'
+ATTACK_PATTERNS = re.compile(
+    rb'(?P<sql_injection>union' + _SP + rb'+(?:all' + _SP + rb'+)?select'
+    rb"|(?:'|%27)" + _SP + rb'*or' + _SP + rb"+(?:'|%27)?\d+(?:'|%27)?" + _SP + rb'*(?:=|%3d)'
+    rb'|information_schema|sleep(?:\(|%28)\d|benchmark(?:\(|%28)|;' + _SP + rb'*drop' + _SP + rb'+table|xp_cmdshell)'
+    rb'|(?P<xss><script|%3cscript|javascript:|onerror' + _SP + rb'*(?:=|%3d)|onload' + _SP + rb'*(?:=|%3d)'
+    rb'|%3csvg|document\.cookie|alert(?:\(|%28))'
+    rb'|(?P<brute_force>failed password|authentication failure|invalid user|failed login|login failed'
+    rb'|"post [^"\n]*(?:login|signin|auth)[^"\n]*" 40[13] )'
+)
+
+# Literals of which every ATTACK_PATTERNS match contains at least one
+ATTACK_ANCHORS = (
+    b"union", b"'", b"%27", b"information_schema", b"sleep", b"benchmark", b"drop", b"xp_cmdshell",
+    b"script", b"onerror", b"onload", b"%3csvg", b"cookie", b"alert",
+    b"fail", b"invalid user", b'" 401 ', b'" 403 '
+)
+
+VECTOR_LABELS = {
+    "sql_injection": "SQL injection",
+    "xss": "Cross-site scripting",
+    "brute_force": "Brute force"
+}
+
+CHUNK_SIZE = 64 * 1024 * 1024
+BUCKET_SECONDS = 600
+
+def detect_format(sample: bytes) -> Optional[str]:
+    """Timestamp format of a log file, judged from its first complete line"""
+    for line in sample.splitlines()[:5]:
+        if SYSLOG_TIME.match(line):
+            return "syslog"
+        if CLF_TIME.search(line):
+            return "clf"
+        if ISO_TIME.search(line):
+            return "iso"
+    return None
+
+def line_time(line: bytes, fmt: str, end_year: int, end_month: int) -> Optional[float]:
+    """UTC epoch seconds of a log line (syslog time is taken as UTC)"""
+    if fmt == "clf":
+        m = CLF_TIME.search(line)
+        if not m:
+            return None
+        day, mon, year, hh, mi, ss, offset = m.groups()
+        month = MONTHS.get(mon.lower())
+        if not month:
+            return None
+        ts = calendar.timegm((int(year), month, int(day), int(hh), int(mi), int(ss)))
+        shift = int(offset[1:3]) * 3600 + int(offset[3:5]) * 60
+        return ts - shift if offset[:1] == b"+" else ts + shift
+    if fmt == "syslog":
+        m = SYSLOG_TIME.match(line)
+        if not m:
+            return None
+        month = MONTHS.get(m.group(1).lower())
+        if not month:
+            return None
+        # No year in syslog: anything later in the year than the window's end is last year's
+        year = end_year if month <= end_month else end_year - 1
+        return calendar.timegm((year, month, int(m.group(2)), int(m.group(3)), int(m.group(4)), int(m.group(5))))
+    m = ISO_TIME.search(line)
+    if not m:
+        return None
+    ts = calendar.timegm(tuple(int(g) for g in m.groups()[:6]))
+    offset = m.group(7)
+    if offset and offset != b"Z":
+        offset = offset.replace(b":", b"")
+        shift = int(offset[1:3]) * 3600 + int(offset[3:5]) * 60
+        ts = ts - shift if offset[:1] == b"+" else ts + shift
+    return ts
+
+def _next_line(buf, pos: int, end: int) -> int:
+    """Offset of the first line starting at or after pos"""
+    if pos <= 0:
+        return 0
+    nl = buf.find(b"\n", pos - 1, end)
+    return end if nl < 0 else nl + 1
+
+def seek_time(buf, start: int, end: int, target: float, fmt: str, window: tuple, after: bool = False) -> int:
+    """First line offset in buf[start:end] whose time is >= target (> target with after=True).
+
+    Logs are appended in time order, so a binary search over byte offsets
+    narrows the position to one block; the remainder is a short line scan.
+    """
+    end_year, end_month = window[2], window[3]
+
+    def reached(ts: float) -> bool:
+        return ts > target if after else ts >= target
+
+    lo, hi = start, end
+    while hi - lo > 65536:
+        mid = (lo + hi) // 2
+        pos = _next_line(buf, mid, end)
+        ts = None
+        for _ in range(32):
+            if pos >= end:
+                break
+            nl = buf.find(b"\n", pos, end)
+            line_end = end if nl < 0 else nl
+            ts = line_time(buf[pos:line_end], fmt, end_year, end_month)
+            if ts is not None:
+                break
+            pos = line_end + 1
+        if ts is None or reached(ts):
+            hi = mid
+        else:
+            lo = _next_line(buf, pos + 1, end)
+
+    pos = _next_line(buf, lo, end)
+    while pos < end:
+        nl = buf.find(b"\n", pos, end)
+        line_end = end if nl < 0 else nl
+        ts = line_time(buf[pos:line_end], fmt, end_year, end_month)
+        if ts is not None and reached(ts):
+            return pos
+        pos = line_end + 1
+    return end
+
+def candidate_lines(lowered: bytes) -> List[Tuple[int, int]]:
+    """(start, end) of lines containing an attack anchor, in file order.
+
+    Python's regex engine tries an alternation at every byte; bytes.find()
+    scans for each literal anchor at memchr speed, so the full ATTACK_PATTERNS
+    regex only runs on the few lines that can match.
+    """
+    lines = set()
+    size = len(lowered)
+    for anchor in ATTACK_ANCHORS:
+        pos = lowered.find(anchor)
+        while pos >= 0:
+            start = lowered.rfind(b"\n", 0, pos) + 1
+            end = lowered.find(b"\n", pos)
+            end = size if end < 0 else end
+            lines.add((start, end))
+            pos = lowered.find(anchor, end)
+    return sorted(lines)
+
+def analyze_chunk(data: bytes, system: str, fmt: str, window: tuple) -> Dict:
+    """Partial result for one newline-aligned block of a log already cut to the window"""
+    end_year, end_month = window[2], window[3]
+    total = data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+    if fmt == "syslog":
+        systems = Counter(host.decode("utf-8", "replace") for host in SYSLOG_HOSTS.findall(data))
+    else:
+        systems = Counter({system: total}) if total else Counter()
+
+    result = {
+        "total_events": total,
+        "systems": systems,
+        "vectors": Counter(),
+        "attack_lines": 0,
+        "attack_sources": Counter(),
+        "auth_failures": Counter(),
+        "user_agents": Counter(),
+        "buckets": Counter(),
+        "first_seen": {},
+        "last_seen": {}
+    }
+
+    lowered = data.lower()
+    for line_start, line_end in candidate_lines(lowered):
+        vectors = {m.lastgroup for m in ATTACK_PATTERNS.finditer(lowered, line_start, line_end)}
+        if not vectors:
+            continue
+        line = data[line_start:line_end]
+        ip_match = IPV4.search(line)
+        source = ip_match.group().decode() if ip_match else None
+        line_system = system
+        if fmt == "syslog":
+            host = SYSLOG_TIME.match(line)
+            if host:
+                line_system = host.group(6).decode("utf-8", "replace")
+        ts = line_time(line, fmt, end_year, end_month)
+
+        result["vectors"].update(vectors)
+        if "brute_force" in vectors and source:
+            # Failures only become an attack once a source crosses the threshold (see summarize)
+            result["auth_failures"][(source, line_system)] += 1
+        if vectors - {"brute_force"}:
+            result["attack_lines"] += 1
+            if source:
+                result["attack_sources"][source] += 1
+            if fmt == "clf" and line.endswith(b'"'):
+                result["user_agents"][line.rsplit(b'"', 2)[-2].decode("utf-8", "replace")] += 1
+            if ts is not None:
+                result["buckets"][int(ts) // BUCKET_SECONDS * BUCKET_SECONDS] += 1
+
+        if ts is not None:
+            for vector in vectors:
+                key = (vector, line_system)
+                first = result["first_seen"].get(key)
+                if first is None or ts < first[0]:
+                    result["first_seen"][key] = (ts, source)
+                if ts > result["last_seen"].get(key, 0):
+                    result["last_seen"][key] = ts
+    return result
+
+def merge(parts: Iterable[Dict]) -> Dict:
+    merged = analyze_chunk(b"", "", "iso", (0, 0, 1970, 1))
+    for part in parts:
+        merged["total_events"] += part["total_events"]
+        merged["attack_lines"] += part["attack_lines"]
+        for key in ("systems", "vectors", "attack_sources", "auth_failures", "user_agents", "buckets"):
+            merged[key].update(part[key])
+        for key, (ts, source) in part["first_seen"].items():
+            current = merged["first_seen"].get(key)
+            if current is None or ts < current[0]:
+                merged["first_seen"][key] = (ts, source)
+        for key, ts in part["last_seen"].items():
+            merged["last_seen"][key] = max(ts, merged["last_seen"].get(key, 0))
+    return merged
+
+def dump_state(merged: Dict) -> Dict:
+    """JSON-safe form of a merged partial result (tuple and int keys become lists)"""
+    return {
+        "total_events": merged["total_events"],
+        "attack_lines": merged["attack_lines"],
+        **{key: dict(merged[key]) for key in ("systems", "vectors", "attack_sources", "user_agents")},
+        "buckets": [[bucket, count] for bucket, count in merged["buckets"].items()],
+        "auth_failures": [[source, system, count] for (source, system), count in merged["auth_failures"].items()],
+        "first_seen": [[vector, system, ts, source] for (vector, system), (ts, source) in merged["first_seen"].items()],
+        "last_seen": [[vector, system, ts] for (vector, system), ts in merged["last_seen"].items()]
+    }
+
+def load_state(state: Dict) -> Dict:
+    """Inverse of dump_state"""
+    merged = analyze_chunk(b"", "", "iso", (0, 0, 1970, 1))
+    merged["total_events"] = state["total_events"]
+    merged["attack_lines"] = state["attack_lines"]
+    for key in ("systems", "vectors", "attack_sources", "user_agents"):
+        merged[key].update(state[key])
+    merged["buckets"].update({bucket: count for bucket, count in state["buckets"]})
+    merged["auth_failures"].update({(source, system): count for source, system, count in state["auth_failures"]})
+    merged["first_seen"] = {(vector, system): (ts, source) for vector, system, ts, source in state["first_seen"]}
+    merged["last_seen"] = {(vector, system): ts for vector, system, ts in state["last_seen"]}
+    return merged
+
+def merge_files(*notes: Dict) -> Dict:
+    """Per-file notes of consecutive windows: bytes add up, the latest note wins otherwise"""
+    merged = {}
+    for files in notes:
+        for path, note in files.items():
+            previous = merged.get(path, {})
+            merged[path] = dict(note)
+            if "bytes_in_window" in note and "bytes_in_window" in previous:
+                merged[path]["bytes_in_window"] += previous["bytes_in_window"]
+    return merged
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def summarize(merged: Dict, brute_force_threshold: int) -> Dict:
+    """Final report in the shape the eradication dashboard expects"""
+    failures_by_source = Counter()
+    for (source, _), count in merged["auth_failures"].items():
+        failures_by_source[source] += count
+    brute_sources = {ip: n for ip, n in failures_by_source.items() if n >= brute_force_threshold}
+    brute_systems = {system for (source, system) in merged["auth_failures"] if source in brute_sources}
+
+    vector_counts = {v: n for v, n in merged["vectors"].items() if v != "brute_force"}
+    if brute_sources:
+        vector_counts["brute_force"] = sum(brute_sources.values())
+
+    def counted(vector: str, system: str) -> bool:
+        return vector in vector_counts and (vector != "brute_force" or system in brute_systems)
+
+    timeline = sorted(
+        (
+            {
+                "timestamp": _iso(ts),
+                "event": f"{VECTOR_LABELS[vector]} activity first seen",
+                "system": system,
+                "source_ip": source,
+                "last_seen": _iso(merged["last_seen"].get((vector, system), ts))
+            }
+            for (vector, system), (ts, source) in merged["first_seen"].items()
+            if counted(vector, system)
+        ),
+        key=lambda entry: entry["timestamp"]
+    )
+
+    peak = merged["buckets"].most_common(1)
+    peak_activity = None
+    if peak:
+        start = peak[0][0]
+        peak_activity = f"{_iso(start)[11:16]}-{_iso(start + BUCKET_SECONDS)[11:16]} UTC"
+
+    sources = merged["attack_sources"] + Counter(brute_sources)
+    return {
+        "total_events": merged["total_events"],
+        "malicious_events": merged["attack_lines"] + sum(brute_sources.values()),
+        "attack_vectors": [v for v, _ in sorted(vector_counts.items(), key=lambda item: -item[1])],
+        "vector_counts": vector_counts,
+        "affected_systems": sorted({entry["system"] for entry in timeline}),
+        "events_per_system": dict(merged["systems"].most_common()),
+        "timeline": timeline,
+        "patterns": {
+            "peak_activity": peak_activity,
+            "source_ips": [ip for ip, _ in sources.most_common(10)],
+            "brute_force_sources": dict(Counter(brute_sources).most_common(20)),
+            "user_agents": [ua for ua, _ in merged["user_agents"].most_common(5)]
+        }
+    }
+
+def system_name(path: str) -> str:
+    """Host a log belongs to, from its file name (web-01.access.log.gz -> web-01)"""
+    return os.path.basename(path).split(".", 1)[0]
+
+def split_range(buf, start: int, end: int, chunk_size: int) -> List[tuple]:
+    """Newline-aligned (start, end) ranges of roughly chunk_size within buf[start:end]"""
+    ranges = []
+    while start < end:
+        stop = min(start + chunk_size, end)
+        if stop < end:
+            nl = buf.find(b"\n", stop, end)
+            stop = end if nl < 0 else nl + 1
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+def _analyze_range(path: str, start: int, end: int, system: str, fmt: str, window: tuple) -> Dict:
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return analyze_chunk(mm[start:end], system, fmt, window)
+
+def _analyze_gzip(path: str, system: str, fmt: str, window: tuple) -> Dict:
+    """Compressed logs cannot be seeked: stream blocks, skip ahead of the window, stop after it"""
+    start_ts, end_ts = window[0], window[1]
+    parts = []
+    carry = b""
+    with gzip.open(path, "rb") as f:
+        while True:
+            block = f.read(CHUNK_SIZE)
+            data = carry + block
+            if not block:
+                carry = b""
+            else:
+                cut = data.rfind(b"\n") + 1
+                data, carry = data[:cut], data[cut:]
+            if data:
+                lo = seek_time(data, 0, len(data), start_ts, fmt, window)
+                hi = seek_time(data, lo, len(data), end_ts, fmt, window, after=True)
+                if lo < hi:
+                    parts.append(analyze_chunk(data[lo:hi], system, fmt, window))
+                if hi < len(data):
+                    break
+            if not block:
+                break
+    return merge(parts)
+
+def _run(task: tuple) -> Dict:
+    kind, args = task
+    return _analyze_range(*args) if kind == "range" else _analyze_gzip(*args)
+
+class IncidentLogAnalyzer:
+    """Analyzes local web and auth logs for an incident's time window.
+
+    Plain files are memory-mapped and cut to the window by binary search on
+    line timestamps, then split into newline-aligned chunks; gzip files are
+    streamed whole by one worker each. Chunks run on a process pool, each
+    classifying attack lines with a single regex pass over the lower-cased
+    block, and the partial counters are merged in the parent.
+    """
+
+    def __init__(self, workers: Optional[int] = None, brute_force_threshold: int = 20,
+                 chunk_size: int = CHUNK_SIZE):
+        self.workers = workers
+        self.brute_force_threshold = brute_force_threshold
+        self.chunk_size = chunk_size
+
+    def plan(self, paths: List[str], start_time: datetime, end_time: datetime) -> Tuple[List[tuple], Dict]:
+        """Work items for the window plus per-file notes (bytes in window, skipped files)"""
+        window = (_epoch(start_time), _epoch(end_time), end_time.year, end_time.month)
+        tasks, files = [], {}
+        for path in paths:
+            system = system_name(path)
+            try:
+                if path.endswith(".gz"):
+                    with gzip.open(path, "rb") as f:
+                        fmt = detect_format(f.read(65536))
+                    if fmt:
+                        tasks.append(("gzip", (path, system, fmt, window)))
+                    files[path] = {"format": fmt, "compressed": True}
+                    continue
+
+                size = os.path.getsize(path)
+                if size == 0:
+                    files[path] = {"format": None, "bytes_in_window": 0}
+                    continue
+                with open(path, "rb") as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        fmt = detect_format(mm[:65536])
+                        if not fmt:
+                            files[path] = {"format": None, "bytes_in_window": 0}
+                            continue
+                        lo = seek_time(mm, 0, size, window[0], fmt, window)
+                        hi = seek_time(mm, lo, size, window[1], fmt, window, after=True)
+                        ranges = split_range(mm, lo, hi, self.chunk_size)
+                tasks.extend(("range", (path, start, end, system, fmt, window)) for start, end in ranges)
+                files[path] = {"format": fmt, "bytes_in_window": hi - lo}
+            except OSError as e:
+                files[path] = {"error": str(e)}
+        return tasks, files
+
+    def collect(self, paths: List[str], start_time: datetime, end_time: datetime) -> Tuple[Dict, Dict]:
+        """Merged partial result and per-file notes for the window, before summarizing.
+
+        Results of adjacent windows combine with merge() / merge_files(), which
+        is how a cached analysis is extended (see LogAnalysisIntegration).
+        """
+        tasks, files = self.plan(paths, start_time, end_time)
+        if len(tasks) <= 1 or self.workers == 1:
+            merged = merge(_run(task) for task in tasks)
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers or os.cpu_count(), len(tasks))) as pool:
+                merged = merge(pool.map(_run, tasks))
+        return merged, files
+
+    def report(self, merged: Dict, files: Dict, start_time: datetime, end_time: datetime, started: float) -> Dict:
+        report = summarize(merged, self.brute_force_threshold)
+        report["window"] = {"start": start_time.isoformat(), "end": end_time.isoformat()}
+        report["files"] = files
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return report
+
+    def analyze(self, paths: List[str], start_time: datetime, end_time: datetime) -> Dict:
+        started = time.perf_counter()
+        merged, files = self.collect(paths, start_time, end_time)
+        return self.report(merged, files, start_time, end_time, started)
+
+def _epoch(value: datetime) -> float:
+    # Naive datetimes in this codebase are UTC (datetime.utcnow())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
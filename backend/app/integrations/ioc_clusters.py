@@ -0,0 +1,196 @@
+import asyncio
+import threading
+from typing import List, Dict, Optional, Iterable, Set, Tuple, Union
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.database import ThreatIndicator
+
+# Indicator types that tie incidents to the same infrastructure or sample
+CLUSTER_TYPES = ("ip", "domain", "hash")
+LOAD_BATCH_SIZE = 10000
+
+def indicator_key(indicator_type: str, value: str) -> Optional[str]:
+    if indicator_type not in CLUSTER_TYPES or not value:
+        return None
+    return f"{indicator_type}:{value.strip().lower()}"
+
+class IncidentClusterIndex:
+    """Incidents linked by shared hashes, domains and IPs.
+
+    Two structures are kept in step as indicator rows arrive:
+    - an inverted index from indicator to incidents (a bare int for the
+      common single-incident case, a set once shared), answering which
+      incidents share IOCs with a given one directly;
+    - a union-find over incidents (path halving, union by size, with the
+      member list of each root), answering which incidents are connected
+      through any chain of shared indicators.
+
+    Both are updated per row, so reads never scan the indicator table.
+    Indicators seen in more than INCIDENT_CLUSTER_MAX_FANOUT incidents
+    (shared hosting, public resolvers) do not link incidents; otherwise one
+    of them would fold every incident into a single cluster. Union-find
+    cannot split, so the clusters are rebuilt without the hub at the moment
+    an indicator crosses the limit, which happens once per hub.
+    """
+
+    def __init__(self, max_fanout: Optional[int] = None):
+        self.max_fanout = max_fanout or settings.INCIDENT_CLUSTER_MAX_FANOUT
+        self.incidents_by_ioc: Dict[str, Union[int, Set[int]]] = {}
+        self.iocs_by_incident: Dict[int, Set[str]] = {}
+        self.parent: Dict[int, int] = {}
+        self.members: Dict[int, List[int]] = {}  # root -> incidents in its cluster
+        self.last_id = 0  # highest ThreatIndicator.id applied
+        self._stale = False  # an indicator became a hub; clusters are rebuilt before the lock is released
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.incidents_by_ioc)
+
+    def _find(self, incident_id: int) -> int:
+        parent = self.parent
+        while parent[incident_id] != incident_id:
+            parent[incident_id] = parent[parent[incident_id]]
+            incident_id = parent[incident_id]
+        return incident_id
+
+    def _union(self, a: int, b: int):
+        a, b = self._find(a), self._find(b)
+        if a == b:
+            return
+        if len(self.members[a]) < len(self.members[b]):
+            a, b = b, a
+        self.parent[b] = a
+        self.members[a].extend(self.members.pop(b))
+
+    def _add(self, incident_id: int, key: str):
+        if incident_id not in self.parent:
+            self.parent[incident_id] = incident_id
+            self.members[incident_id] = [incident_id]
+            self.iocs_by_incident[incident_id] = set()
+        seen = self.incidents_by_ioc.get(key)
+        if seen is None:
+            self.incidents_by_ioc[key] = incident_id
+        elif isinstance(seen, int):
+            if seen == incident_id:
+                return
+            self.incidents_by_ioc[key] = {seen, incident_id}
+            self._union(seen, incident_id)
+        else:
+            if incident_id in seen:
+                return
+            seen.add(incident_id)
+            if len(seen) <= self.max_fanout:
+                self._union(next(iter(seen)), incident_id)
+            elif len(seen) == self.max_fanout + 1:
+                # A new hub: its earlier links have to go
+                self._stale = True
+        self.iocs_by_incident[incident_id].add(key)
+
+    def _rebuild_clusters(self):
+        """Union-find over the shared indicators that are not hubs"""
+        self.parent = {incident_id: incident_id for incident_id in self.iocs_by_incident}
+        self.members = {incident_id: [incident_id] for incident_id in self.iocs_by_incident}
+        for seen in self.incidents_by_ioc.values():
+            if not isinstance(seen, int) and len(seen) <= self.max_fanout:
+                first, *rest = seen
+                for other in rest:
+                    self._union(first, other)
+        self._stale = False
+
+    def add(self, incident_id: int, indicator_type: str, value: str):
+        key = indicator_key(indicator_type, value)
+        if key is not None and incident_id is not None:
+            with self.lock:
+                self._add(incident_id, key)
+                if self._stale:
+                    self._rebuild_clusters()
+
+    def add_rows(self, rows: Iterable[Tuple[int, int, str, str]]):
+        """(id, incident_id, indicator_type, value) rows; repeated rows are no-ops"""
+        with self.lock:
+            for row_id, incident_id, indicator_type, value in rows:
+                key = indicator_key(indicator_type, value)
+                if key is not None and incident_id is not None:
+                    self._add(incident_id, key)
+                if row_id and row_id > self.last_id:
+                    self.last_id = row_id
+            if self._stale:
+                self._rebuild_clusters()
+
+    def sync(self, db: Session) -> int:
+        """Apply threat_indicators rows added since the last sync (all of them the first time)"""
+        applied = 0
+        while True:
+            rows = db.query(
+                ThreatIndicator.id, ThreatIndicator.incident_id, ThreatIndicator.indicator_type, ThreatIndicator.value
+            ).filter(
+                ThreatIndicator.id > self.last_id, ThreatIndicator.indicator_type.in_(CLUSTER_TYPES)
+            ).order_by(ThreatIndicator.id).limit(LOAD_BATCH_SIZE).all()
+            if not rows:
+                return applied
+            # The lock is held per batch so readers are never stalled by a full load
+            self.add_rows(rows)
+            applied += len(rows)
+
+    def _fanout(self, key: str) -> int:
+        seen = self.incidents_by_ioc.get(key)
+        return 1 if isinstance(seen, int) else len(seen or ())
+
+    def cluster(self, incident_id: int) -> List[int]:
+        """Incidents connected to this one through shared indicators, itself excluded"""
+        with self.lock:
+            if incident_id not in self.parent:
+                return []
+            return sorted(i for i in self.members[self._find(incident_id)] if i != incident_id)
+
+    def related(self, incident_id: int, limit: int = 20) -> List[Dict]:
+        """Incidents sharing indicators directly with this one, most shared first"""
+        shared: Dict[int, List[str]] = {}
+        with self.lock:
+            for key in self.iocs_by_incident.get(incident_id, ()):
+                seen = self.incidents_by_ioc[key]
+                if isinstance(seen, int) or len(seen) > self.max_fanout:
+                    continue
+                for other in seen:
+                    if other != incident_id:
+                        shared.setdefault(other, []).append(key)
+        ranked = sorted(shared.items(), key=lambda item: (-len(item[1]), item[0]))[:limit]
+        return [
+            {
+                "incident_id": other,
+                "shared_count": len(keys),
+                "shared_indicators": [
+                    {"type": key.split(":", 1)[0], "value": key.split(":", 1)[1]} for key in sorted(keys)[:50]
+                ]
+            }
+            for other, keys in ranked
+        ]
+
+    def hub_indicators(self, incident_id: int) -> List[str]:
+        """Indicators of this incident too widespread to link incidents"""
+        with self.lock:
+            return sorted(key for key in self.iocs_by_incident.get(incident_id, ()) if self._fanout(key) > self.max_fanout)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "indicators": len(self.incidents_by_ioc),
+                "incidents": len(self.parent),
+                "clusters": len(self.members),
+                "multi_incident_clusters": sum(1 for m in self.members.values() if len(m) > 1),
+                "last_indicator_id": self.last_id
+            }
+
+incident_clusters = IncidentClusterIndex()
+
+def sync_incident_clusters() -> int:
+    db = SessionLocal()
+    try:
+        return incident_clusters.sync(db)
+    finally:
+        db.close()
+
+async def refresh_incident_clusters():
+    # Picks up indicators written by other processes; in-process inserts are added as they happen
+    await asyncio.to_thread(sync_incident_clusters)
@@ -0,0 +1,274 @@
+import os
+import re
+import mmap
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional, Iterable
+from app.core.indicators import classify_indicator, is_ip
+from app.integrations.threat_feed import ThreatFeedStore, feed_store
+
+# Candidate patterns for values ThreatIntelIntegration would classify as ip/hash
+IPV4_TOKEN = re.compile(r'(?:\d{1,3}\.){3}\d{1,3}')
+HASH_TOKEN = re.compile(r'[0-9a-f]{32}|[0-9a-f]{40}|[0-9a-f]{64}|[0-9a-f]{128}')
+HOST_TOKEN = re.compile(r'[a-z0-9_-]+(?:\.[a-z0-9_-]+)+')
+IPV6_CHARS = frozenset("0123456789abcdef:.")
+
+# Characters that continue a hostname/hash token; a match must not be embedded in one
+TOKEN_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789-_")
+
+# Byte translation that turns everything outside URL/host/hash/IP characters
+# into whitespace, so bytes.split() tokenizes a whole chunk at C speed. Query
+# string characters are kept so feed URLs with a query still match whole.
+_KEEP = b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._-:/?=&%+~"
+QUERY_CHARS = frozenset("?=&%+~")
+QUERY_SPLIT = re.compile(r'[?=&%+~]+')
+TOKENIZE_TABLE = bytes(b if b in _KEEP else 0x20 for b in range(256)).lower()
+
+CHUNK_SIZE = 64 * 1024 * 1024
+
+class AhoCorasick:
+    """Multi-pattern automaton matching every pattern in a single pass over the text"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[tuple] = [()]
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+            state = nxt
+        self.output[state] = self.output[state] + (pattern,)
+
+    def _build(self):
+        # Breadth-first failure links; outputs are merged along them so the
+        # scan loop never has to walk the failure chain to report matches
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                if self.output[self.fail[nxt]]:
+                    self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self.goto)
+
+    def iter_matches(self, text: str):
+        """Yield (end_index, pattern) for every occurrence in text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                for pattern in output[state]:
+                    yield i, pattern
+
+class IOCExtractor:
+    """Single-pass extraction of known and candidate IOCs from raw log text.
+
+    Text is tokenized once in C (translate + split) and counted, so every
+    distinct token is classified only once no matter how often it repeats.
+    Feed hostnames and hashes always sit on token boundaries and are matched
+    by set lookups; the Aho-Corasick automaton holds URL/path patterns and
+    runs over the distinct URL-like tokens.
+    """
+
+    def __init__(self, patterns: Iterable[str] = (), known_ips: Iterable[str] = ()):
+        hosts, hashes, others = set(), set(), []
+        for pattern in patterns:
+            if HASH_TOKEN.fullmatch(pattern):
+                hashes.add(pattern)
+            elif HOST_TOKEN.fullmatch(pattern):
+                hosts.add(pattern)
+            elif pattern:
+                others.append(pattern)
+        self.hosts = frozenset(hosts)
+        self.hashes = frozenset(hashes)
+        self.automaton = AhoCorasick(others)
+        self.known_ips = frozenset(known_ips)
+
+    @classmethod
+    def from_feed(cls, store: Optional[ThreatFeedStore] = None) -> "IOCExtractor":
+        """Build the matcher from the feed's domains, URLs and hashes"""
+        patterns, known_ips = feed_patterns(store or feed_store)
+        return cls(patterns, known_ips)
+
+    def scan_text(self, text: str) -> Dict:
+        """Scan text and return match and candidate counters"""
+        return self.scan_bytes(text.encode("utf-8", errors="replace"))
+
+    def scan_bytes(self, data: bytes) -> Dict:
+        """Scan raw bytes and return match and candidate counters"""
+        tokens = Counter(data.translate(TOKENIZE_TABLE).split())
+        matches, ips, hashes = Counter(), Counter(), Counter()
+        use_automaton = len(self.automaton) > 1
+
+        for raw, count in tokens.items():
+            token = raw.decode("ascii").strip(".:-_")
+            if not token:
+                continue
+            if use_automaton and ("/" in token or ":" in token):
+                self._match_automaton(token, count, matches)
+            if QUERY_CHARS.isdisjoint(token):
+                self._classify(token, count, matches, ips, hashes)
+            else:
+                # Values inside a query string (or key=value fields) are classified on their own
+                for piece in QUERY_SPLIT.split(token):
+                    piece = piece.strip(".:-_")
+                    if piece:
+                        self._classify(piece, count, matches, ips, hashes)
+
+        for ip, count in ips.items():
+            if ip in self.known_ips:
+                matches[ip] += count
+
+        return {"matches": matches, "ips": ips, "hashes": hashes}
+
+    def _classify(self, token: str, count: int, matches: Counter, ips: Counter, hashes: Counter):
+        if "/" in token or ":" in token:
+            if ":" in token and IPV6_CHARS.issuperset(token) and token.count(":") >= 2 and is_ip(token):
+                ips[classify_indicator(token).canonical] += count
+                return
+            parts = token.replace(":", "/").split("/")
+        else:
+            parts = (token,)
+
+        for part in parts:
+            if not part:
+                continue
+            if IPV4_TOKEN.fullmatch(part):
+                if is_ip(part):
+                    ips[part] += count
+            elif HASH_TOKEN.fullmatch(part):
+                hashes[part] += count
+                if part in self.hashes:
+                    matches[part] += count
+            elif "." in part:
+                self._match_host(part, count, matches)
+
+    def _match_host(self, host: str, count: int, matches: Counter):
+        # A feed domain also matches any of its subdomains
+        hosts = self.hosts
+        while True:
+            if host in hosts:
+                matches[host] += count
+                return
+            dot = host.find(".")
+            if dot < 0:
+                return
+            host = host[dot + 1:]
+
+    def _match_automaton(self, token: str, count: int, matches: Counter):
+        for end, pattern in self.automaton.iter_matches(token):
+            start = end - len(pattern) + 1
+            if start > 0 and token[start - 1] in TOKEN_CHARS:
+                continue
+            if end + 1 < len(token) and token[end + 1] in TOKEN_CHARS:
+                continue
+            matches[pattern] += count
+
+    def scan_payload(self, payload) -> Dict:
+        """Scan an alert payload (any JSON-like value)"""
+        return summarize(self.scan_text(_flatten(payload)))
+
+    def scan_file(self, path: str, workers: Optional[int] = None) -> Dict:
+        """Scan a log file, splitting it into newline-aligned ranges across a process pool"""
+        return summarize(self._scan_file(path, workers))
+
+    def scan_files(self, paths: List[str], workers: Optional[int] = None) -> Dict:
+        """Scan several log files and merge the results"""
+        return summarize(_merge(self._scan_file(path, workers) for path in paths))
+
+    def _scan_file(self, path: str, workers: Optional[int]) -> Dict:
+        ranges = split_file(path, CHUNK_SIZE)
+        if len(ranges) <= 1 or workers == 1:
+            return _merge(self.scan_bytes(_read_range(path, start, end)) for start, end in ranges)
+
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(self.patterns(), self.known_ips)
+        ) as pool:
+            starts, ends = zip(*ranges)
+            return _merge(pool.map(_scan_range, [path] * len(ranges), starts, ends))
+
+    def patterns(self) -> List[str]:
+        """All non-IP patterns (used to rebuild the matcher in workers)"""
+        automaton_patterns = {p for out in self.automaton.output for p in out}
+        return sorted(self.hosts | self.hashes | automaton_patterns)
+
+def feed_patterns(store: ThreatFeedStore):
+    """Split feed indicators into automaton patterns and exact-match IPs"""
+    patterns, known_ips = [], []
+    for key in store.indicators:
+        (known_ips if is_ip(key) else patterns).append(key)
+    return patterns, known_ips
+
+def split_file(path: str, chunk_size: int) -> List[tuple]:
+    """Byte ranges of roughly chunk_size, each ending on a line boundary"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    ranges = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def summarize(result: Dict) -> Dict:
+    """Convert scan counters into JSON-friendly dicts, most frequent first"""
+    return {key: dict(counter.most_common()) for key, counter in result.items()}
+
+_worker_extractor: Optional[IOCExtractor] = None
+
+def _init_worker(patterns: List[str], known_ips: Iterable[str]):
+    global _worker_extractor
+    _worker_extractor = IOCExtractor(patterns, known_ips)
+
+def _read_range(path: str, start: int, end: int) -> bytes:
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[start:end]
+
+def _scan_range(path: str, start: int, end: int) -> Dict:
+    return _worker_extractor.scan_bytes(_read_range(path, start, end))
+
+def _merge(parts: Iterable[Dict]) -> Dict:
+    merged = {"matches": Counter(), "ips": Counter(), "hashes": Counter()}
+    for part in parts:
+        for key in merged:
+            merged[key].update(part[key])
+    return merged
+
+def _flatten(payload) -> str:
+    if isinstance(payload, dict):
+        return " ".join(_flatten(v) for v in payload.values())
+    if isinstance(payload, (list, tuple)):
+        return " ".join(_flatten(v) for v in payload)
+    return str(payload)
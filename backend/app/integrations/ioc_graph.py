@@ -0,0 +1,293 @@
+import asyncio
+import threading
+from array import array
+from bisect import bisect_left
+from collections import deque
+from itertools import chain, islice, repeat
+from operator import add
+from typing import List, Dict, Optional, Iterable, Iterator, Set, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.indicators import classify_indicator
+from app.integrations.alert_enrichment import IP_FIELDS, DOMAIN_FIELDS, HASH_FIELDS
+from app.models.database import Alert, ThreatIndicator
+
+INDICATOR_TYPES = ("ip", "domain", "hash")
+NODE_KINDS = INDICATOR_TYPES + ("family", "alert", "incident")
+LOAD_BATCH_SIZE = 5000
+
+def node_key(kind: str, value) -> str:
+    return f"{kind}:{str(value).strip().lower()}"
+
+def indicator_node(value: str) -> Optional[str]:
+    """Node key of a raw indicator value, or None when it is not an IP, domain or hash"""
+    classified = classify_indicator(value)
+    return f"{classified.type}:{classified.canonical}" if classified.valid else None
+
+def start_node(value: str) -> Optional[str]:
+    """Node key for a pivot: an indicator value, or an explicit "kind:value" key"""
+    key = indicator_node(value)
+    if key is None and ":" in value:
+        kind, _, rest = value.partition(":")
+        if kind.lower() in NODE_KINDS and rest.strip():
+            key = node_key(kind.lower(), rest)
+    return key
+
+def _values(field_value) -> Iterator[str]:
+    if isinstance(field_value, str):
+        yield field_value
+    elif isinstance(field_value, list):
+        yield from (v for v in field_value if isinstance(v, str))
+
+def alert_edges(alert_id: int, incident_id: Optional[int], raw: Dict) -> Iterator[Tuple[str, str]]:
+    """Alert <-> incident, alert <-> every IP/domain/hash it carries, feed family <-> matched value"""
+    alert = node_key("alert", alert_id)
+    if incident_id:
+        yield alert, node_key("incident", incident_id)
+    for field in IP_FIELDS + DOMAIN_FIELDS + HASH_FIELDS:
+        for value in _values(raw.get(field)):
+            key = indicator_node(value)
+            if key:
+                yield alert, key
+    for match in raw.get("ioc_matches") or ():
+        key = indicator_node(match.get("value") or "")
+        if key and match.get("name"):
+            yield node_key("family", match["name"]), key
+
+class PivotGraph:
+    """Undirected graph of IPs, domains, hashes, malware families, alerts and incidents.
+
+    Node keys ("ip:198.51.100.7", "incident:12", ...) are interned to ints.
+    Adjacency lives in CSR form: one offsets array and one targets array with
+    each node's neighbours sorted, so a node's edges are a single slice and a
+    duplicate check is a bisect. New edges go to a small per-node delta set
+    and are merged into the arrays once the delta reaches IOC_GRAPH_COMPACT_RATIO
+    of the base; the merge copies the untouched stretches between changed
+    nodes as whole slices. Pivots are a breadth-first walk with a depth limit,
+    a per-node fan-out cap and a node budget.
+    """
+
+    def __init__(self, compact_ratio: Optional[float] = None, min_compact: int = 50000):
+        self.compact_ratio = settings.IOC_GRAPH_COMPACT_RATIO if compact_ratio is None else compact_ratio
+        self.min_compact = min_compact
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.offsets = array("Q", [0])  # base CSR covers nodes [0, len(offsets) - 1)
+        self.targets = array("I")
+        self.delta: Dict[int, Set[int]] = {}
+        self.delta_arcs = 0
+        self.edges = 0
+        self.watermarks = {"alerts": 0, "indicators": 0}
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _node(self, key: str) -> int:
+        node = self.ids.get(key)
+        if node is None:
+            node = self.ids[key] = len(self.names)
+            self.names.append(key)
+        return node
+
+    def _base(self, node: int) -> Tuple[int, int]:
+        if node >= len(self.offsets) - 1:
+            end = self.offsets[-1]
+            return end, end
+        return self.offsets[node], self.offsets[node + 1]
+
+    def _has_arc(self, u: int, v: int) -> bool:
+        lo, hi = self._base(u)
+        if lo < hi:
+            i = bisect_left(self.targets, v, lo, hi)
+            if i < hi and self.targets[i] == v:
+                return True
+        return v in self.delta.get(u, ())
+
+    def _link(self, a: str, b: str):
+        u, v = self._node(a), self._node(b)
+        if u == v or self._has_arc(u, v):
+            return
+        self.delta.setdefault(u, set()).add(v)
+        self.delta.setdefault(v, set()).add(u)
+        self.delta_arcs += 2
+        self.edges += 1
+
+    def link_many(self, pairs: Iterable[Tuple[str, str]]):
+        with self.lock:
+            for a, b in pairs:
+                self._link(a, b)
+            if self.delta_arcs >= max(self.min_compact, self.compact_ratio * len(self.targets)):
+                self._compact()
+
+    def link(self, a: str, b: str):
+        self.link_many(((a, b),))
+
+    def _compact(self):
+        """Merge the delta sets into a new CSR"""
+        offsets, targets = self.offsets, self.targets
+        base_n = len(offsets) - 1
+        n = len(self.names)
+
+        def ends(lo: int, hi: int):
+            # Base end offset of nodes lo..hi-1 (nodes added since the last merge are empty)
+            head = offsets[lo + 1:min(hi, base_n) + 1] if lo < base_n else ()
+            tail = hi - max(lo, base_n)
+            return chain(head, repeat(offsets[base_n], tail)) if tail > 0 else head
+
+        new_offsets, new_targets = array("Q", [0]), array("I")
+        shift = prev = 0
+        for u in sorted(self.delta):
+            # Unchanged nodes prev..u-1 move as one slice
+            start, _ = self._base(prev)
+            lo, hi = self._base(u)
+            new_targets.extend(targets[start:lo])
+            new_offsets.extend(map(add, ends(prev, u), repeat(shift)))
+            added = self.delta[u]
+            new_targets.extend(sorted(chain(targets[lo:hi], added)))
+            shift += len(added)
+            new_offsets.append(hi + shift)
+            prev = u + 1
+        start, _ = self._base(prev)
+        new_targets.extend(targets[start:offsets[base_n]])
+        new_offsets.extend(map(add, ends(prev, n), repeat(shift)))
+
+        self.offsets, self.targets = new_offsets, new_targets
+        self.delta, self.delta_arcs = {}, 0
+
+    def _neighbors(self, node: int, limit: int) -> Tuple[int, Iterator[int]]:
+        """Degree and up to `limit` neighbours; a hub costs no more than a leaf"""
+        lo, hi = self._base(node)
+        added = self.delta.get(node, ())
+        head = self.targets[lo:min(hi, lo + limit)]
+        return hi - lo + len(added), chain(head, islice(added, limit - len(head)))
+
+    def neighbors(self, key: str, kind: str) -> List[str]:
+        """Values of every neighbour of a node that has the given kind, with no fan-out cap"""
+        prefix = f"{kind}:"
+        with self.lock:
+            node = self.ids.get(key)
+            if node is None:
+                return []
+            lo, hi = self._base(node)
+            names = self.names
+            return [names[n][len(prefix):] for n in chain(self.targets[lo:hi], self.delta.get(node, ()))
+                    if names[n].startswith(prefix)]
+
+    def pivot(self, start: str, depth: int = 2, fanout: int = 50, max_nodes: int = 1000) -> Optional[Dict]:
+        """Nodes and edges within `depth` hops of a node key, or None if the node is unknown.
+
+        Nodes with more than `fanout` neighbours contribute only the first
+        `fanout` of them and are marked truncated; the walk stops once
+        `max_nodes` nodes have been collected.
+        """
+        with self.lock:
+            root = self.ids.get(start)
+            if root is None:
+                return None
+            level = {root: 0}
+            order = [root]
+            info: Dict[int, Dict] = {}
+            edges: List[Tuple[int, int]] = []
+            queue = deque([root])
+            complete = True
+            while queue:
+                node = queue.popleft()
+                degree, neighbors = self._neighbors(node, fanout)
+                info[node] = {"degree": degree, "truncated": degree > fanout and level[node] < depth}
+                if level[node] >= depth:
+                    continue
+                for other in neighbors:
+                    if other not in level:
+                        if len(order) >= max_nodes:
+                            complete = False
+                            break
+                        level[other] = level[node] + 1
+                        order.append(other)
+                        queue.append(other)
+                    edges.append((node, other))
+            names = self.names
+            nodes = []
+            for node in order:
+                kind, _, value = names[node].partition(":")
+                nodes.append({"id": names[node], "type": kind, "value": value, "depth": level[node], **info[node]})
+            seen_edges = {(min(a, b), max(a, b)) for a, b in edges if b in level}
+            return {
+                "root": start,
+                "nodes": nodes,
+                "edges": [{"source": names[a], "target": names[b]} for a, b in sorted(seen_edges)],
+                "complete": complete
+            }
+
+    def sync(self, db: Session) -> Dict:
+        """Add alerts and threat indicators stored since the last sync (everything the first time)"""
+        added = {"alerts": 0, "indicators": 0}
+        while True:
+            rows = db.query(Alert.id, Alert.incident_id, Alert.source_ip, Alert.destination_ip, Alert.raw_data).filter(
+                Alert.id > self.watermarks["alerts"]
+            ).order_by(Alert.id).limit(LOAD_BATCH_SIZE).all()
+            if not rows:
+                break
+            self.link_many(chain.from_iterable(
+                alert_edges(row.id, row.incident_id, {"source_ip": row.source_ip, "destination_ip": row.destination_ip,
+                                                       **(row.raw_data or {})})
+                for row in rows
+            ))
+            self.watermarks["alerts"] = rows[-1].id
+            added["alerts"] += len(rows)
+        while True:
+            rows = db.query(
+                ThreatIndicator.id, ThreatIndicator.incident_id, ThreatIndicator.indicator_type, ThreatIndicator.value
+            ).filter(ThreatIndicator.id > self.watermarks["indicators"]).order_by(ThreatIndicator.id).limit(LOAD_BATCH_SIZE).all()
+            if not rows:
+                break
+            self.link_many(
+                (node_key(row.indicator_type, row.value), node_key("incident", row.incident_id))
+                for row in rows if row.incident_id and row.value and row.indicator_type
+            )
+            self.watermarks["indicators"] = rows[-1].id
+            added["indicators"] += len(rows)
+        return added
+
+    def link_malware_analysis(self, incident_id: int, analysis: Dict):
+        """Incident <-> hashes and C2 hosts of a malware analysis, family <-> incident and sample"""
+        incident = node_key("incident", incident_id)
+        pairs = []
+        for value in analysis.get("hashes", []):
+            key = indicator_node(value)
+            if key:
+                pairs.append((incident, key))
+        for entry in analysis.get("network", []):
+            key = indicator_node(entry.get("c2_server") or "")
+            if key:
+                pairs.append((incident, key))
+        for family in analysis.get("families", []):
+            pairs.append((node_key("family", family), incident))
+        for match in analysis.get("files", []):
+            if match.get("name") and match.get("sha256"):
+                pairs.append((node_key("family", match["name"]), node_key("hash", match["sha256"])))
+        self.link_many(pairs)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "nodes": len(self.names),
+                "edges": self.edges,
+                "pending_edges": self.delta_arcs // 2,
+                **{f"last_{name}_id": value for name, value in self.watermarks.items()}
+            }
+
+pivot_graph = PivotGraph()
+
+def sync_pivot_graph() -> Dict:
+    db = SessionLocal()
+    try:
+        added = pivot_graph.sync(db)
+    finally:
+        db.close()
+    return added
+
+async def refresh_pivot_graph():
+    # Alerts and indicators are picked up by id; edges made in-process are added directly
+    await asyncio.to_thread(sync_pivot_graph)
@@ -1,11 +1,99 @@
+import asyncio
+import time
 from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.integrations.analysis_cache import AnalysisCache, analysis_lock, appended_only, file_state, fingerprint, incident_inputs
+from app.integrations.artifact_scanner import ArtifactScanner, scan_path_state
+from app.integrations.incident_logs import IncidentLogAnalyzer, dump_state, load_state, merge, merge_files
+from app.integrations.ioc_extractor import IOCExtractor, feed_patterns
+from app.integrations.threat_feed import feed_store
 
 class LogAnalysisIntegration:
     """Integration with log analysis systems"""
     
+    def __init__(self):
+        self.log_paths = [p.strip() for p in (settings.LOG_PATHS or "").split(",") if p.strip()]
+        self.scan_paths = [p.strip() for p in (settings.MALWARE_SCAN_PATHS or "").split(",") if p.strip()]
+        self.workers = settings.LOG_ANALYSIS_WORKERS
+    
+    async def extract_iocs(self, paths: Optional[List[str]] = None, payloads: Optional[List[Dict]] = None) -> Dict:
+        """Extract known and candidate IOCs from log files and alert payloads in one pass each"""
+        extractor = IOCExtractor(*feed_patterns(feed_store))
+        results = []
+        if paths or self.log_paths:
+            results.append(await asyncio.to_thread(extractor.scan_files, paths or self.log_paths, self.workers))
+        for payload in payloads or []:
+            results.append(extractor.scan_payload(payload))
+        
+        merged = {"matches": {}, "ips": {}, "hashes": {}}
+        for result in results:
+            for key, counts in result.items():
+                for value, count in counts.items():
+                    merged[key][value] = merged[key].get(value, 0) + count
+        return merged
+    
+    async def scan_artifacts(self, paths: Optional[List[str]] = None) -> Dict:
+        """Hash files under the scan paths (cached by device/inode/size/mtime) and match them against the feed"""
+        scanner = ArtifactScanner(self.workers)
+        return await asyncio.to_thread(scanner.scan, paths or self.scan_paths)
+    
+    def _analyze_logs_cached(self, incident_id: int, start_time: datetime, end_time: datetime) -> Dict:
+        """Log analysis of the window that only reads what the cached counters do not cover yet.
+
+        The stored state covers [start_time, window_end] as long as the log files
+        have only been appended to; a longer window reads (window_end, settled]
+        and stores the extended state. Lines newer than the settle period may
+        still be joined by late writes, so they are analyzed on every view but
+        never stored. Log timestamps have whole-second resolution, which is what
+        makes the one-second step between consecutive windows exact.
+        """
+        started = time.perf_counter()
+        # Stored windows are naive UTC, like datetime.utcnow()
+        start_time, end_time = (t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t for t in (start_time, end_time))
+        analyzer = IncidentLogAnalyzer(self.workers, settings.LOG_BRUTE_FORCE_THRESHOLD)
+        key = fingerprint("logs", self.log_paths, start_time.isoformat())
+        files = file_state(self.log_paths)
+        settled = min(end_time, datetime.utcnow() - timedelta(seconds=settings.ANALYSIS_CACHE_SETTLE_SECONDS))
+        settled = settled.replace(microsecond=0)
+        merged, notes, covered, status = None, {}, None, "miss"
+        
+        db = SessionLocal()
+        try:
+            cache = AnalysisCache(db)
+            entry = cache.get(incident_id, "logs")
+            if entry and entry.fingerprint == key and entry.window_end and entry.window_end <= end_time \
+                    and appended_only(entry.state["files"], files):
+                merged, notes, covered, status = load_state(entry.state["merged"]), entry.state["notes"], entry.window_end, "hit"
+            if settled > (covered or start_time):
+                if covered is None:
+                    merged, notes = analyzer.collect(self.log_paths, start_time, settled)
+                else:
+                    extension, extension_notes = analyzer.collect(self.log_paths, covered + timedelta(seconds=1), settled)
+                    merged, notes, status = merge((merged, extension)), merge_files(notes, extension_notes), "extended"
+                covered = settled
+                cache.store(incident_id, "logs", key, state={"merged": dump_state(merged), "notes": notes, "files": files},
+                            window_start=start_time, window_end=covered)
+        finally:
+            db.close()
+        
+        if covered is None:
+            tail, tail_notes = analyzer.collect(self.log_paths, start_time, end_time)
+        else:
+            tail, tail_notes = analyzer.collect(self.log_paths, covered + timedelta(seconds=1), end_time)
+        report = analyzer.report(
+            merge(part for part in (merged, tail) if part), merge_files(notes, tail_notes), start_time, end_time, started
+        )
+        report["cache"] = {"status": status, "stored_until": covered.isoformat() if covered else None}
+        return report
+    
     async def analyze_incident_logs(self, incident_id: int, start_time: datetime, end_time: datetime) -> Dict:
         """Analyze logs for incident patterns"""
+        if self.log_paths:
+            async with analysis_lock(incident_id, "logs"):
+                return await asyncio.to_thread(self._analyze_logs_cached, incident_id, start_time, end_time)
+        
         return {
             "total_events": 15420,
             "malicious_events": 87,
@@ -25,8 +113,40 @@ class LogAnalysisIntegration:
             }
         }
     
+    def _malware_fingerprint(self, db, incident_id: int) -> str:
+        # Stat-only: the logs, the scan paths' background digest, the feed and the incident's alerts / indicators
+        return fingerprint(
+            "malware", incident_inputs(db, incident_id), file_state(self.log_paths),
+            scan_path_state.current(self.scan_paths) if self.scan_paths else None,
+            file_state([settings.THREAT_FEED_PATH] if settings.THREAT_FEED_PATH else []), feed_store.version, len(feed_store)
+        )
+    
+    def _cached_malware(self, incident_id: int):
+        db = SessionLocal()
+        try:
+            key = self._malware_fingerprint(db, incident_id)
+            return key, AnalysisCache(db).lookup(incident_id, "malware", key)
+        finally:
+            db.close()
+    
+    def _store_malware(self, incident_id: int, key: str, analysis: Dict):
+        db = SessionLocal()
+        try:
+            AnalysisCache(db).store(incident_id, "malware", key, analysis)
+        finally:
+            db.close()
+    
     async def analyze_malware(self, incident_id: int) -> Dict:
-        """Analyze malware artifacts"""
+        """Analyze malware artifacts (cached until the logs, artifacts, feed or incident change)"""
+        if self.log_paths or self.scan_paths:
+            async with analysis_lock(incident_id, "malware"):
+                key, cached = await asyncio.to_thread(self._cached_malware, incident_id)
+                if cached is not None:
+                    return cached
+                analysis = await self._analyze_malware()
+                await asyncio.to_thread(self._store_malware, incident_id, key, analysis)
+                return analysis
+        
         return {
             "detected": True,
             "families": ["Emotet", "TrickBot"],
@@ -45,6 +165,40 @@ class LogAnalysisIntegration:
                 "Scan for additional compromised systems"
             ]
         }
+    
+    async def _analyze_malware(self) -> Dict:
+        """Feed matches in the logs plus matched files under the scan paths"""
+        iocs = await self.extract_iocs() if self.log_paths else {"matches": {}, "ips": {}, "hashes": {}}
+        scan = await self.scan_artifacts() if self.scan_paths else None
+        files = scan["matches"] if scan else []
+
+        known_hashes = list(dict.fromkeys(
+            [f["sha256"] for f in files] + [h for h in iocs["hashes"] if h in iocs["matches"]]
+        ))
+        network = [
+            {"c2_server": value, "hits": count}
+            for value, count in iocs["matches"].items()
+            if value not in iocs["hashes"] and value not in iocs["ips"]
+        ]
+        families = sorted({
+            entry.name for entry in (feed_store.indicators.get(v) for v in iocs["matches"]) if entry and entry.name
+        } | {f["name"] for f in files if f["name"]})
+        recommendations = []
+        if files:
+            recommendations.append("Quarantine or remove the matched files")
+        if iocs["matches"]:
+            recommendations.extend(["Block C2 communication", "Quarantine hosts referencing matched hashes"])
+        return {
+            "detected": bool(iocs["matches"] or files),
+            "families": families,
+            "hashes": known_hashes + [h for h in iocs["hashes"] if h not in iocs["matches"]][:50],
+            "persistence": [],
+            "network": network,
+            "feed_matches": iocs["matches"],
+            "files": files,
+            "scan": {k: v for k, v in scan.items() if k != "matches"} if scan else None,
+            "recommendations": recommendations
+        }
 
 class VulnerabilityIntegration:
     """Integration with vulnerability management systems"""
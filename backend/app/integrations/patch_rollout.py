@@ -0,0 +1,295 @@
+import asyncio
+import os
+import socket
+import uuid
+from typing import List, Dict, Optional, Callable, Awaitable
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.integrations.vulnerability import VulnerabilityIntegration
+from app.integrations.compliance import ComplianceTracker
+from app.integrations.service_monitor import ServiceMonitorIntegration
+from app.models.database import Incident, PatchRolloutRecord
+
+FINISHED = ("completed", "halted", "failed")
+ACTIVE = ("queued", "running")
+# Owner recorded on the rollouts this process runs
+PROCESS_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+# apply(vuln_id, host) -> {"success": bool, "message": str, ...}
+ApplyPatch = Callable[[str, Optional[str]], Awaitable[Dict]]
+# health(hosts of the wave) -> {"healthy": bool, "issues": [...]}
+HealthGate = Callable[[List[str]], Awaitable[Dict]]
+
+def plan_waves(hosts: List[str], canary_size: int, wave_size: int) -> List[List[str]]:
+    """Canary wave first, then fixed-size waves over the remaining hosts"""
+    waves = []
+    if canary_size > 0 and len(hosts) > canary_size:
+        waves.append(hosts[:canary_size])
+        hosts = hosts[canary_size:]
+    wave_size = wave_size if wave_size > 0 else len(hosts) or 1
+    waves.extend(hosts[i:i + wave_size] for i in range(0, len(hosts), wave_size))
+    return waves
+
+async def system_health_gate(hosts: List[str]) -> Dict:
+    return await ServiceMonitorIntegration().verify_system_health()
+
+class PatchRollout:
+    """Patches an incident's hosts in waves and records progress on the incident.
+
+    Every host gets all of its patches in sequence; hosts within a wave are
+    patched concurrently, at most PATCH_PARALLELISM at a time. The first wave
+    is a canary that must succeed completely. After each wave the health gate
+    runs, and the rollout halts if the gate fails or the share of failed hosts
+    so far exceeds PATCH_MAX_FAILURE_RATIO. The patch_rollouts row and
+    eradication_data are rewritten as each host finishes, so progress is
+    visible while the rollout runs, from any process. The row names this
+    process as its owner; RolloutRegistry.heartbeat keeps it checked in.
+    """
+
+    def __init__(self, incident_id: int, targets: Dict[str, List[str]], apply: Optional[ApplyPatch] = None,
+                 health_gate: Optional[HealthGate] = None, parallelism: Optional[int] = None,
+                 canary_size: Optional[int] = None, wave_size: Optional[int] = None,
+                 max_failure_ratio: Optional[float] = None, persist: bool = True):
+        self.id = uuid.uuid4().hex
+        self.incident_id = incident_id
+        self.targets = targets  # host -> vulnerability ids to patch on it
+        self.apply = apply or VulnerabilityIntegration().apply_patch
+        self.health_gate = health_gate or system_health_gate
+        self.parallelism = max(1, parallelism or settings.PATCH_PARALLELISM)
+        self.max_failure_ratio = settings.PATCH_MAX_FAILURE_RATIO if max_failure_ratio is None else max_failure_ratio
+        self.persist = persist
+        canary_size = settings.PATCH_CANARY_SIZE if canary_size is None else canary_size
+        self.waves = plan_waves(list(targets), canary_size, settings.PATCH_WAVE_SIZE if wave_size is None else wave_size)
+        self.canary = 0 < canary_size < len(targets)
+        self.status = "queued"
+        self.current_wave = 0
+        self.results: List[Dict] = []
+        self.hosts: Dict[str, str] = {host: "pending" for host in targets}
+        self.wave_reports: List[Dict] = []
+        self.halt_reason: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+
+    def summary(self) -> Dict:
+        hosts_done = [state for state in self.hosts.values() if state in ("patched", "failed")]
+        succeeded = [r for r in self.results if r["success"]]
+        return {
+            "rollout_id": self.id,
+            "incident_id": self.incident_id,
+            "status": self.status,
+            "current_wave": self.current_wave,
+            "total_waves": len(self.waves),
+            "waves": self.wave_reports,
+            "hosts_total": len(self.hosts),
+            "hosts_patched": hosts_done.count("patched"),
+            "hosts_failed": hosts_done.count("failed"),
+            "success_count": len(succeeded),
+            "failure_count": len(self.results) - len(succeeded),
+            "halt_reason": self.halt_reason,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def _write_progress(self, results: List[Dict], summary: Dict, hosts: Dict[str, str], finished: List[Dict]):
+        db = SessionLocal()
+        try:
+            ComplianceTracker(db).record_patches(finished)
+            db.merge(PatchRolloutRecord(
+                id=self.id, incident_id=self.incident_id, status=summary["status"],
+                summary=summary, hosts=hosts, results=results,
+                owner=PROCESS_ID, heartbeat_at=datetime.utcnow()
+            ))
+            incident = db.query(Incident).filter(Incident.id == self.incident_id).first()
+            if incident:
+                # A fresh dict so the JSON column is flagged as changed
+                eradication_data = dict(incident.eradication_data or {})
+                eradication_data.update({
+                    "patches_applied": results,
+                    "patch_timestamp": datetime.utcnow().isoformat(),
+                    "patch_rollout": summary
+                })
+                incident.eradication_data = eradication_data
+            db.commit()
+        finally:
+            db.close()
+
+    async def _save(self, finished: List[Dict] = ()):
+        """finished: results of a host that just completed, for the compliance counters"""
+        if not self.persist:
+            return
+        # One writer at a time, each with a snapshot of the state it saves
+        async with self._lock:
+            await asyncio.to_thread(self._write_progress, list(self.results), self.summary(), dict(self.hosts), list(finished))
+
+    async def _patch_host(self, host: str, semaphore: asyncio.Semaphore) -> bool:
+        async with semaphore:
+            self.hosts[host] = "patching"
+            ok = True
+            first = len(self.results)
+            for vuln_id in self.targets[host]:
+                try:
+                    result = await asyncio.wait_for(self.apply(vuln_id, host), settings.PATCH_HOST_TIMEOUT_SECONDS or None)
+                except asyncio.TimeoutError:
+                    result = {"success": False, "message": f"Timed out patching {vuln_id} on {host}"}
+                except Exception as e:
+                    result = {"success": False, "message": f"Failed to patch {vuln_id} on {host}: {str(e)}"}
+                self.results.append({
+                    "vulnerability_id": vuln_id,
+                    "host": host,
+                    "success": bool(result.get("success")),
+                    "message": result.get("message", "")
+                })
+                if not result.get("success"):
+                    ok = False
+                    break
+            self.hosts[host] = "patched" if ok else "failed"
+            finished = [r for r in self.results[first:] if r["host"] == host]
+        await self._save(finished)
+        return ok
+
+    async def run(self) -> Dict:
+        self.status = "running"
+        self.started_at = datetime.utcnow()
+        await self._save()
+        semaphore = asyncio.Semaphore(self.parallelism)
+        try:
+            for number, wave in enumerate(self.waves, start=1):
+                self.current_wave = number
+                outcomes = await asyncio.gather(*(self._patch_host(host, semaphore) for host in wave))
+                failed = outcomes.count(False)
+                health = await self.health_gate(wave)
+                self.wave_reports.append({
+                    "wave": number,
+                    "canary": self.canary and number == 1,
+                    "hosts": wave,
+                    "failed": failed,
+                    "healthy": bool(health.get("healthy")),
+                    "issues": health.get("issues", [])
+                })
+
+                done = [state for state in self.hosts.values() if state in ("patched", "failed")]
+                ratio = done.count("failed") / len(done) if done else 0.0
+                if self.wave_reports[-1]["canary"] and failed:
+                    self.halt_reason = f"Canary wave failed on {failed} of {len(wave)} hosts"
+                elif not health.get("healthy"):
+                    self.halt_reason = f"Health gate failed after wave {number}: {health.get('issues', [])}"
+                elif ratio > self.max_failure_ratio:
+                    self.halt_reason = f"Failure ratio {ratio:.0%} exceeds {self.max_failure_ratio:.0%} after wave {number}"
+                if self.halt_reason:
+                    self.status = "halted"
+                    for host, state in self.hosts.items():
+                        if state == "pending":
+                            self.hosts[host] = "skipped"
+                    break
+            else:
+                self.status = "completed"
+        except asyncio.CancelledError:
+            self.status = "failed"
+            self.halt_reason = "Interrupted before completion"
+        except Exception as e:
+            self.status = "failed"
+            self.halt_reason = str(e)
+        self.finished_at = datetime.utcnow()
+        await self._save()
+        return self.summary()
+
+async def patch_targets(incident_id: int, vulnerability_ids: List[str]) -> Dict[str, List[str]]:
+    """host -> requested vulnerabilities affecting it, from the incident's vulnerability data.
+
+    Vulnerabilities without known affected systems are patched once with no host.
+    """
+    wanted = list(dict.fromkeys(vulnerability_ids))
+    affected = {
+        v["cve_id"]: v.get("affected_systems", [])
+        for v in await VulnerabilityIntegration().get_incident_vulnerabilities(incident_id)
+    }
+    targets: Dict[str, List[str]] = {}
+    for vuln_id in wanted:
+        for host in affected.get(vuln_id) or [None]:
+            targets.setdefault(host, []).append(vuln_id)
+    return targets
+
+def load_rollout(db, rollout_id: str) -> Optional[Dict]:
+    """Last saved progress of a rollout, with per-host results"""
+    record = db.get(PatchRolloutRecord, rollout_id)
+    if record is None:
+        return None
+    return {**record.summary, "hosts": record.hosts, "results": record.results}
+
+def active_rollout(db, incident_id: int) -> Optional[PatchRolloutRecord]:
+    """Queued or running rollout of the incident, started by any process"""
+    return db.query(PatchRolloutRecord).filter(
+        PatchRolloutRecord.incident_id == incident_id, PatchRolloutRecord.status.in_(ACTIVE)
+    ).first()
+
+def _interrupted(summary: Dict, finished_at: str) -> Dict:
+    return {**summary, "status": "failed", "halt_reason": "Interrupted before completion",
+            "finished_at": summary.get("finished_at") or finished_at}
+
+def fail_interrupted_rollouts():
+    """Mark active rollouts whose owner stopped checking in (a crashed or restarted process) as failed"""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.PATCH_ROLLOUT_LEASE_SECONDS)
+    db = SessionLocal()
+    try:
+        records = db.query(PatchRolloutRecord).filter(
+            PatchRolloutRecord.status.in_(ACTIVE),
+            or_(PatchRolloutRecord.heartbeat_at.is_(None), PatchRolloutRecord.heartbeat_at < cutoff)
+        ).all()
+        for record in records:
+            record.status = "failed"
+            record.summary = _interrupted(record.summary or {"rollout_id": record.id}, now.isoformat())
+            # The incident's copy, while it still shows this rollout
+            incident = db.get(Incident, record.incident_id)
+            rollout = (incident.eradication_data or {}).get("patch_rollout") if incident else None
+            if isinstance(rollout, dict) and rollout.get("rollout_id") == record.id and rollout.get("status") in ACTIVE:
+                incident.eradication_data = {**incident.eradication_data, "patch_rollout": record.summary}
+        db.commit()
+    finally:
+        db.close()
+
+class RolloutRegistry:
+    """Tasks of the rollouts running in this process; their state lives in patch_rollouts"""
+
+    def __init__(self):
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, rollout: PatchRollout) -> PatchRollout:
+        for rid in [rid for rid, task in self.tasks.items() if task.done()]:
+            self.tasks.pop(rid)
+        if rollout.persist:
+            # Saved before the task runs, so the active-rollout check sees it at once
+            rollout._write_progress([], rollout.summary(), dict(rollout.hosts), [])
+        self.tasks[rollout.id] = asyncio.create_task(rollout.run(), name=f"patch-rollout-{rollout.id}")
+        return rollout
+
+    def heartbeat(self):
+        """Check in the rollouts still running in this process"""
+        running = [rid for rid, task in self.tasks.items() if not task.done()]
+        if not running:
+            return
+        db = SessionLocal()
+        try:
+            db.query(PatchRolloutRecord).filter(
+                PatchRolloutRecord.id.in_(running), PatchRolloutRecord.owner == PROCESS_ID,
+                PatchRolloutRecord.status.in_(ACTIVE)
+            ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def stop(self):
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks.clear()
+
+rollouts = RolloutRegistry()
+
+async def check_rollouts():
+    """Heartbeat of this process's rollouts, then fail the ones other processes left behind"""
+    await asyncio.to_thread(rollouts.heartbeat)
+    await asyncio.to_thread(fail_interrupted_rollouts)
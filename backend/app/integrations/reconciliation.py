@@ -0,0 +1,124 @@
+import time
+from typing import List, Dict, Optional, Iterable, Set, Tuple
+from datetime import datetime
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.integrations.blocklist import BlocklistManager, canonical_network
+from app.integrations.firewall import FirewallIntegration
+from app.models.database import BlockedIP, AggregatedBlock
+
+# Outcome of the most recent runs, served by the containment status endpoint
+reconciliation_metrics: Dict = {
+    "runs": 0,
+    "last_run": None,
+    "last_duration_ms": None,
+    "last_drift": None,
+    "last_error": None,
+    "history": []
+}
+
+def diff_state(expected: Set[str], device: Iterable[str]) -> Tuple[Set[str], Set[str]]:
+    """Return (missing on device, unexpected on device) for canonical rule sets"""
+    device = {canonical_network(value) for value in device}
+    return expected - device, device - expected
+
+def _chunks(values: List[str], size: int):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+class FirewallReconciler:
+    """Brings the firewall blocklist back in line with the platform's records.
+
+    The expected state is what BlocklistManager believes it has pushed: the
+    active aggregated prefixes plus individual blocks made since the last
+    compile. Missing entries are re-blocked. Unexpected entries are unblocked
+    only when the platform once owned them (an unblock that failed or a block
+    that was since lifted) unless FIREWALL_RECONCILE_REMOVE_UNMANAGED is set,
+    so manual device rules are reported rather than silently deleted.
+    """
+
+    def __init__(self, db: Session, firewall: Optional[FirewallIntegration] = None):
+        self.db = db
+        self.firewall = firewall or FirewallIntegration(actor="reconciler")
+
+    def expected_rules(self) -> Set[str]:
+        aggregated, individual = BlocklistManager(self.db, self.firewall).current_device_rules()
+        return aggregated | individual
+
+    async def device_rules(self) -> Set[str]:
+        device = set()
+        async for page in self.firewall.iter_blocked_ips():
+            device.update(canonical_network(entry.get("ip") or entry.get("ip_address", "")) for entry in page)
+        device.discard("")
+        return device
+
+    def previously_managed(self, networks: List[str]) -> Set[str]:
+        """Subset of networks the platform blocked at some point"""
+        managed = set()
+        for chunk in _chunks(networks, 500):
+            managed.update(row.network for row in self.db.query(AggregatedBlock.network).filter(AggregatedBlock.network.in_(chunk)))
+            managed.update(row.ip_address for row in self.db.query(BlockedIP.ip_address).filter(BlockedIP.ip_address.in_(chunk)))
+        return managed
+
+    async def run(self, dry_run: bool = False) -> Dict:
+        started = time.perf_counter()
+        expected = self.expected_rules()
+        device = await self.device_rules()
+        missing, unexpected = diff_state(expected, device)
+
+        if settings.FIREWALL_RECONCILE_REMOVE_UNMANAGED:
+            to_unblock = sorted(unexpected)
+        else:
+            to_unblock = sorted(self.previously_managed(sorted(unexpected)))
+        to_block = sorted(missing)
+
+        result = {
+            "expected_entries": len(expected),
+            "device_entries": len(device),
+            "missing": len(missing),
+            "unexpected": len(unexpected),
+            "unmanaged": len(unexpected) - len(to_unblock),
+            "dry_run": dry_run
+        }
+        if dry_run:
+            result["preview"] = {"block": to_block[:100], "unblock": to_unblock[:100]}
+        else:
+            blocked = await self.firewall.block_ips_batch(to_block, "Reconciliation") if to_block else {}
+            unblocked = await self.firewall.unblock_ips_batch(to_unblock) if to_unblock else {}
+            result.update({
+                "blocked": sum(blocked.values()),
+                "unblocked": sum(unblocked.values()),
+                "failed": [ip for ip, ok in list(blocked.items()) + list(unblocked.items()) if not ok][:100]
+            })
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+def _record(result: Optional[Dict], error: Optional[str] = None):
+    reconciliation_metrics["runs"] += 1
+    reconciliation_metrics["last_run"] = datetime.utcnow().isoformat()
+    reconciliation_metrics["last_error"] = error
+    if result is not None:
+        reconciliation_metrics["last_duration_ms"] = result["duration_ms"]
+        reconciliation_metrics["last_drift"] = result["missing"] + result["unexpected"]
+        reconciliation_metrics["history"] = (reconciliation_metrics["history"] + [{
+            "at": reconciliation_metrics["last_run"],
+            "drift": reconciliation_metrics["last_drift"],
+            "duration_ms": result["duration_ms"],
+            "dry_run": result["dry_run"]
+        }])[-20:]
+
+async def reconcile_firewall(db: Optional[Session] = None, dry_run: bool = False) -> Dict:
+    """Run one reconciliation pass and record its metrics"""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        result = await FirewallReconciler(db).run(dry_run)
+        _record(result)
+        return result
+    except Exception as e:
+        _record(None, str(e))
+        raise
+    finally:
+        if own_session:
+            db.close()
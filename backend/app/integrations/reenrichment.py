@@ -0,0 +1,203 @@
+import asyncio
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import update, insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.indicators import is_ip
+from app.core.ip_index import IPRangeIndex, text_ranges
+from app.integrations.alert_enrichment import AlertEnrichment
+from app.integrations.threat_feed import FeedIndicator, ThreatFeedStore, feed_store, load_feed_store
+from app.integrations.feed_summary import refresh_feed_summary
+from app.integrations.ioc_graph import pivot_graph, indicator_node
+from app.models.database import Alert, ThreatIndicator, Notification
+
+def _chunks(values: List[str], size: int):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _severity(score: int) -> str:
+    if score >= 9:
+        return "critical"
+    if score >= 7:
+        return "high"
+    return "medium"
+
+class ReEnrichmentJob:
+    """Re-score stored indicators and recent alerts against a feed delta.
+
+    Rows are found per delta entry through indexed columns, so the cost scales
+    with the delta rather than with the size of the tables: exact values by
+    IN lookups on ThreatIndicator.value and Alert.source_ip / destination_ip,
+    CIDR blocks by text ranges on the same columns (see text_ranges), and
+    alerts carrying a domain or hash through the pivot graph's alert edges.
+    Added and removed entries select rows alike; each row is then scored once
+    against the current feed, so removals clear stale matches.
+    """
+
+    def __init__(self, db: Session, store: Optional[ThreatFeedStore] = None, chunk_size: int = 500):
+        self.db = db
+        self.store = store or feed_store
+        self.chunk_size = chunk_size
+        self.threshold = settings.REENRICH_MALICIOUS_SCORE
+        self.cutoff = datetime.utcnow() - timedelta(hours=settings.REENRICH_ALERT_WINDOW_HOURS)
+
+    def run(self, delta: Dict[str, Optional[FeedIndicator]]) -> Dict:
+        """Apply a delta and return counts of what changed"""
+        exact, blocks = [], IPRangeIndex()
+        for key in delta:
+            # Removed entries are None, so blocks are told apart by their key
+            if "/" not in key or not blocks.add(key):
+                exact.append(key)
+
+        notifications = []
+        indicators_updated = self._update_indicators(exact, blocks, notifications)
+        alerts_updated = self._update_alerts(exact, blocks, notifications)
+
+        if notifications:
+            self.db.execute(insert(Notification), notifications)
+        self.db.commit()
+
+        return {
+            "delta_size": len(delta),
+            "indicators_updated": indicators_updated,
+            "alerts_updated": alerts_updated,
+            "notifications": len(notifications)
+        }
+
+    def _ranges(self, blocks: IPRangeIndex) -> List[Tuple[str, str]]:
+        return sorted({r for network, _ in blocks.networks() for r in text_ranges(network)})
+
+    def _entry(self, value: str) -> Optional[FeedIndicator]:
+        """Current feed entry for a stored value: the exact one, else the most specific covering block"""
+        key = self.store.normalize(value)
+        entry = self.store.lookup(key)
+        if entry is None and len(self.store.networks):
+            covering = self.store.networks.longest_match(key)
+            entry = covering[1] if covering else None
+        return entry
+
+    def _update_indicators(self, exact: List[str], blocks: IPRangeIndex, notifications: List[Dict]) -> int:
+        columns = (ThreatIndicator.id, ThreatIndicator.incident_id, ThreatIndicator.value,
+                   ThreatIndicator.threat_score, ThreatIndicator.indicator_metadata)
+        rows = {}
+        for chunk in _chunks(exact, self.chunk_size):
+            for row in self.db.query(*columns).filter(ThreatIndicator.value.in_(chunk)):
+                rows[row.id] = row
+        for low, high in self._ranges(blocks):
+            for row in self.db.query(*columns).filter(ThreatIndicator.value >= low, ThreatIndicator.value < high):
+                if row.id not in rows and blocks.contains(row.value):
+                    rows[row.id] = row
+
+        updates = []
+        now = datetime.utcnow().isoformat()
+        for row in rows.values():
+            entry = self._entry(row.value)
+            metadata = dict(row.indicator_metadata or {})
+            old_score = row.threat_score or 0
+
+            if entry is None:
+                metadata["feed_removed_at"] = now
+                updates.append({"id": row.id, "indicator_metadata": metadata})
+                continue
+
+            metadata.update({"feed_source": entry.source, "feed_score": entry.score, "feed_updated_at": now})
+            if entry.name:
+                metadata["feed_name"] = entry.name
+            updates.append({"id": row.id, "threat_score": entry.score, "indicator_metadata": metadata})
+
+            if old_score < self.threshold <= entry.score:
+                notifications.append({
+                    "incident_id": row.incident_id,
+                    "category": "feed_match",
+                    "severity": _severity(entry.score),
+                    "message": f"Indicator {row.value} is now flagged malicious by {entry.source}",
+                    "details": {"value": row.value, "old_score": old_score, "new_score": entry.score, "name": entry.name},
+                    "read": False
+                })
+
+        for batch in _chunks(updates, self.chunk_size):
+            self.db.execute(update(ThreatIndicator), batch)
+        return len(updates)
+
+    def _alert_ids(self, values: List[str]) -> List[int]:
+        """Alerts carrying a domain or hash, which live in raw_data, from the pivot graph"""
+        pivot_graph.sync(self.db)
+        ids = set()
+        for value in values:
+            key = indicator_node(value)
+            if key:
+                ids.update(int(alert_id) for alert_id in pivot_graph.neighbors(key, "alert"))
+        return sorted(ids)
+
+    def _update_alerts(self, exact: List[str], blocks: IPRangeIndex, notifications: List[Dict]) -> int:
+        ips = [value for value in exact if is_ip(value)]
+        others = [value for value in exact if not is_ip(value)]
+        columns = (Alert.id, Alert.incident_id, Alert.source, Alert.alert_type, Alert.severity,
+                   Alert.source_ip, Alert.destination_ip, Alert.raw_data, Alert.triage_score)
+        rows = {}
+        for column in (Alert.source_ip, Alert.destination_ip):
+            for chunk in _chunks(ips, self.chunk_size):
+                for row in self.db.query(*columns).filter(Alert.created_at >= self.cutoff, column.in_(chunk)):
+                    rows[row.id] = row
+            for low, high in self._ranges(blocks):
+                for row in self.db.query(*columns).filter(Alert.created_at >= self.cutoff, column >= low, column < high):
+                    if row.id not in rows and (blocks.contains(row.source_ip or "") or blocks.contains(row.destination_ip or "")):
+                        rows[row.id] = row
+        if others:
+            for chunk in _chunks(self._alert_ids(others), self.chunk_size):
+                for row in self.db.query(*columns).filter(Alert.created_at >= self.cutoff, Alert.id.in_(chunk)):
+                    rows[row.id] = row
+
+        enrichment = AlertEnrichment(self.store)
+        updates = []
+        newly_matching: Dict[tuple, List[int]] = {}
+        for row in rows.values():
+            payload = dict(row.raw_data or {})
+            payload.update({"source_ip": row.source_ip, "destination_ip": row.destination_ip, "severity": row.severity})
+            result = enrichment.enrich(payload)
+
+            previous = {m["value"] for m in (row.raw_data or {}).get("ioc_matches", [])}
+            raw_data = dict(row.raw_data or {})
+            if result["matches"]:
+                raw_data["ioc_matches"] = result["matches"]
+            else:
+                raw_data.pop("ioc_matches", None)
+            raw_data["triage_score"] = result["triage_score"]
+            updates.append({"id": row.id, "raw_data": raw_data, "triage_score": result["triage_score"]})
+
+            for match in result["matches"]:
+                if match["value"] not in previous and match["score"] >= self.threshold:
+                    newly_matching.setdefault((row.incident_id, match["value"]), []).append(row.id)
+
+        for (incident_id, value), alert_ids in newly_matching.items():
+            notifications.append({
+                "incident_id": incident_id,
+                "category": "feed_match",
+                "severity": "high",
+                "message": f"{len(alert_ids)} recent alert(s) involve {value}, newly flagged by the threat feed",
+                "details": {"value": value, "alert_ids": alert_ids[:100]},
+                "read": False
+            })
+
+        for batch in _chunks(updates, self.chunk_size):
+            self.db.execute(update(Alert), batch)
+        return len(updates)
+
+def run_reenrichment(delta: Dict[str, Optional[FeedIndicator]]) -> Dict:
+    """Run a re-enrichment pass in its own session (safe to call from a worker thread)"""
+    db = SessionLocal()
+    try:
+        return ReEnrichmentJob(db).run(delta)
+    finally:
+        db.close()
+
+async def refresh_threat_feed():
+    """Reload the feed, rebuild its summary and re-enrich stored data against whatever changed"""
+    feed_data = await load_feed_store()
+    delta = feed_store.drain_delta()
+    await refresh_feed_summary(feed_data, sum(1 for indicator in delta.values() if indicator is not None))
+    if delta:
+        stats = await asyncio.to_thread(run_reenrichment, delta)
+        print(f"Threat feed re-enrichment: {stats}")
@@ -0,0 +1,236 @@
+import json
+import math
+from array import array
+from typing import List, Dict, Optional, Iterable, NamedTuple
+from datetime import datetime
+from app.core.config import settings
+from app.core.ip_index import IPRangeIndex, parse_network, format_network
+from app.core.indicators import classify_indicator
+
+class BloomFilter:
+    """Compact probabilistic set used as a cheap pre-check before exact lookups.
+
+    Blocked layout: every value maps to a single 64-bit word and sets four bits
+    in it, so a membership test is one hash, one array read and one mask compare.
+    """
+
+    hash_count = 4
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        # Classic sizing plus ~25% headroom for the loss of accuracy from blocking
+        bits_per_item = -math.log(error_rate) / (math.log(2) ** 2) * 1.25
+        self.block_count = max(int(math.ceil(capacity * bits_per_item / 64)), 1)
+        self.size = self.block_count * 64
+        self.words = array("Q", bytes(8 * self.block_count))
+
+    def add(self, value: str):
+        h = hash(value)
+        self.words[(h & 0xFFFFFFFF) % self.block_count] |= (
+            (1 << ((h >> 32) & 63)) | (1 << ((h >> 38) & 63))
+            | (1 << ((h >> 44) & 63)) | (1 << ((h >> 50) & 63))
+        )
+
+    def __contains__(self, value: str) -> bool:
+        h = hash(value)
+        mask = (
+            (1 << ((h >> 32) & 63)) | (1 << ((h >> 38) & 63))
+            | (1 << ((h >> 44) & 63)) | (1 << ((h >> 50) & 63))
+        )
+        return self.words[(h & 0xFFFFFFFF) % self.block_count] & mask == mask
+
+class FeedIndicator(NamedTuple):
+    """A single feed entry; immutable so the garbage collector can skip it"""
+    value: str
+    type: str
+    score: int
+    source: str
+    name: Optional[str]
+    tags: tuple
+
+class ThreatFeedStore:
+    """In-memory store of locally loaded threat feed indicators"""
+
+    def __init__(self, error_rate: float = 0.01):
+        self.error_rate = error_rate
+        self.indicators: Dict[str, FeedIndicator] = {}
+        self.bloom = BloomFilter(1, error_rate)
+        self.networks = IPRangeIndex()
+        self.blocks: Dict[str, FeedIndicator] = {}
+        self.last_loaded: Optional[str] = None
+        self.version = 0
+        # Indicators added, re-scored or removed (None) since the last drain
+        self.pending_delta: Dict[str, Optional[FeedIndicator]] = {}
+
+    def __len__(self) -> int:
+        return len(self.indicators)
+
+    @staticmethod
+    def normalize(value: str) -> str:
+        """Canonical key for an indicator value"""
+        key = value.strip().lower()
+        if ":" in key:
+            # IPv6 has many spellings; key on the compressed form
+            key = classify_indicator(key).canonical
+        return key
+
+    def _parse(self, records: Iterable[Dict]):
+        """Split records into exact-match entries and CIDR blocks, keyed canonically"""
+        entries, blocks = {}, {}
+        for record in records:
+            value = record.get("value")
+            if not value:
+                continue
+            indicator = FeedIndicator(
+                value=value,
+                type=record.get("type", "unknown"),
+                score=record.get("score", 0),
+                source=record.get("source", "local_feed"),
+                name=record.get("name"),
+                tags=tuple(record.get("tags") or ())
+            )
+            network = parse_network(value) if "/" in value else None
+            if network:
+                blocks[format_network(*network)] = indicator._replace(type="cidr")
+            else:
+                entries[self.normalize(value)] = indicator
+        return entries, blocks
+
+    def load(self, indicators: Iterable[Dict], track_delta: Optional[bool] = None):
+        """Replace the store contents with the given indicator records.
+
+        Differences from the previous contents are added to pending_delta;
+        by default the very first load is treated as a baseline, not a delta.
+        """
+        entries, blocks = self._parse(indicators)
+
+        bloom = BloomFilter(len(entries), self.error_rate)
+        for key in entries:
+            bloom.add(key)
+        networks = IPRangeIndex()
+        networks.bulk_load(blocks.items())
+
+        if track_delta is None:
+            track_delta = self.version > 0
+        if track_delta:
+            for old, new in ((self.indicators, entries), (self.blocks, blocks)):
+                for key, indicator in new.items():
+                    if old.get(key) != indicator:
+                        self.pending_delta[key] = indicator
+                for key in old.keys() - new.keys():
+                    self.pending_delta[key] = None
+
+        # Swap all structures at once so readers never see a half-built filter
+        self.indicators, self.blocks, self.bloom, self.networks = entries, blocks, bloom, networks
+        self.last_loaded = datetime.utcnow().isoformat()
+        self.version += 1
+
+    def apply_delta(self, records: Iterable[Dict], removed: Iterable[str] = ()):
+        """Incrementally add/update records and remove values without a full reload"""
+        entries, blocks = self._parse(records)
+        for key, indicator in entries.items():
+            self.bloom.add(key)
+            self.indicators[key] = indicator
+            self.pending_delta[key] = indicator
+        for key, indicator in blocks.items():
+            if key in self.blocks:
+                self.networks.remove(key, self.blocks[key])
+            self.networks.add(key, indicator)
+            self.blocks[key] = indicator
+            self.pending_delta[key] = indicator
+        for value in removed:
+            network = parse_network(value) if "/" in value else None
+            key = format_network(*network) if network else self.normalize(value)
+            # Bloom filters cannot delete; the exact lookup already filters stale bits
+            if key in self.indicators:
+                del self.indicators[key]
+            elif key in self.blocks:
+                self.networks.remove(key, self.blocks.pop(key))
+            else:
+                continue
+            self.pending_delta[key] = None
+        if len(self.indicators) > self.bloom_capacity():
+            self.bloom = BloomFilter(len(self.indicators) * 2, self.error_rate)
+            for key in self.indicators:
+                self.bloom.add(key)
+        self.version += 1
+
+    def bloom_capacity(self) -> int:
+        """Number of entries the current Bloom filter was sized for"""
+        bits_per_item = -math.log(self.error_rate) / (math.log(2) ** 2) * 1.25
+        return int(self.bloom.size / bits_per_item)
+
+    def drain_delta(self) -> Dict[str, Optional[FeedIndicator]]:
+        """Take the pending delta, leaving an empty one behind"""
+        delta, self.pending_delta = self.pending_delta, {}
+        return delta
+
+    def load_file(self, path: str):
+        """Load indicators from a JSON list or JSON-lines file"""
+        with open(path, "r", encoding="utf-8") as f:
+            head = f.read(1)
+            f.seek(0)
+            if head == "[":
+                records = json.load(f)
+            else:
+                records = [json.loads(line) for line in f if line.strip()]
+        self.load(records)
+
+    def load_from_feed(self, feed_data: Dict):
+        """Seed the store from the IOCs listed in a threat feed summary"""
+        records = []
+        for threat in feed_data.get("top_threats", []):
+            score = {"critical": 10, "high": 8, "medium": 5, "low": 2}.get(threat.get("severity"), 5)
+            for ioc in threat.get("iocs", []):
+                records.append({
+                    "value": ioc,
+                    "score": score,
+                    "source": "threat_feed",
+                    "tags": [threat.get("type")],
+                    "name": threat.get("name")
+                })
+        self.load(records)
+
+    def lookup(self, value: str) -> Optional[FeedIndicator]:
+        """Bloom pre-check followed by an exact lookup; value must be normalized"""
+        if value not in self.bloom:
+            return None
+        return self.indicators.get(value)
+
+    def lookup_ip(self, ip: str) -> List[FeedIndicator]:
+        """Exact feed entry for an address plus every feed CIDR block covering it"""
+        matches = []
+        exact = self.lookup(ip)
+        if exact:
+            matches.append(exact)
+        if len(self.networks):
+            matches.extend(entry for _, entry in self.networks.covering(ip))
+        return matches
+
+    def stats(self) -> Dict:
+        """Summary of the loaded feed"""
+        return {
+            "indicators": len(self.indicators),
+            "networks": len(self.networks),
+            "version": self.version,
+            "pending_delta": len(self.pending_delta),
+            "bloom_bits": self.bloom.size,
+            "bloom_hashes": self.bloom.hash_count,
+            "last_loaded": self.last_loaded
+        }
+
+feed_store = ThreatFeedStore()
+
+async def load_feed_store() -> Optional[Dict]:
+    """Populate the shared feed store from the configured file or the live feed (returned, for the feed summary)"""
+    feed_data = None
+    try:
+        if settings.THREAT_FEED_PATH:
+            feed_store.load_file(settings.THREAT_FEED_PATH)
+        else:
+            from app.integrations.threat_intel import ThreatIntelIntegration
+            feed_data = await ThreatIntelIntegration().get_latest_feed()
+            feed_store.load_from_feed(feed_data)
+    except Exception as e:
+        print(f"Error loading threat feed store: {e}")
+    return feed_data
@@ -1,8 +1,12 @@
+import asyncio
 import requests
 import json
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, AsyncIterator, Tuple
 from datetime import datetime, timedelta
 from app.core.config import settings
+from app.core.indicators import ClassifiedIndicator, classify_indicator, classify_indicators, is_ip, is_domain, is_hash
+from app.integrations.threat_feed import feed_store
+from app.integrations.ioc_graph import pivot_graph, indicator_node, INDICATOR_TYPES
 
 class ThreatIntelIntegration:
     """Integration with Threat Intelligence feeds"""
@@ -14,27 +18,62 @@ class ThreatIntelIntegration:
     
     async def search_indicator(self, indicator: str) -> Optional[Dict]:
         """Search for an indicator in threat intelligence feeds"""
+        return await self._search_classified(classify_indicator(indicator))
+    
+    async def _search_classified(self, classified: ClassifiedIndicator) -> Optional[Dict]:
+        """Search all sources for an already classified and normalized indicator"""
+        indicator = classified.canonical
         try:
+            # Locally loaded feed (exact values and covering CIDR blocks) first
+            local_result = self._search_local_feed(indicator, classified.type)
+            if local_result:
+                return local_result
+            
             # Try different sources
-            vt_result = await self._search_virustotal(indicator)
+            vt_result = await self._search_virustotal(indicator, classified.type)
             if vt_result:
                 return vt_result
                 
-            av_result = await self._search_alienvault(indicator)
+            av_result = await self._search_alienvault(indicator, classified.type)
             if av_result:
                 return av_result
                 
             # Mock result if no API keys configured
             if not self.virustotal_api_key and not self.alienvault_api_key:
-                return self._mock_threat_intel_result(indicator)
+                return self._mock_threat_intel_result(indicator, classified.type)
                 
             return None
             
         except Exception as e:
-            print(f"Error searching indicator {indicator}: {e}")
+            print(f"Error searching indicator {classified.value}: {e}")
+            return None
+    
+    def _search_local_feed(self, indicator: str, indicator_type: Optional[str] = None) -> Optional[Dict]:
+        """Search the locally loaded threat feed for indicator"""
+        indicator_type = indicator_type or self._get_indicator_type(indicator)
+        if indicator_type == "ip":
+            entries = feed_store.lookup_ip(indicator)
+        else:
+            entry = feed_store.lookup(feed_store.normalize(indicator))
+            entries = [entry] if entry else []
+        
+        if not entries:
             return None
+        
+        best = max(entries, key=lambda e: e.score)
+        return {
+            "type": indicator_type,
+            "source": best.source,
+            "malicious": True,
+            "score": best.score,
+            "first_seen": None,
+            "last_seen": None,
+            "sources": sorted({e.source for e in entries}),
+            "matched_entries": [e.value for e in entries],
+            "tags": sorted({tag for e in entries for tag in e.tags if tag})
+        }
     
-    async def _search_virustotal(self, indicator: str) -> Optional[Dict]:
+    async def _search_virustotal(self, indicator: str, indicator_type: Optional[str] = None) -> Optional[Dict]:
         """Search VirusTotal for indicator"""
         if not self.virustotal_api_key:
             return None
@@ -43,23 +82,25 @@ class ThreatIntelIntegration:
             headers = {"x-apikey": self.virustotal_api_key}
             
             # Determine indicator type
-            if self._is_ip(indicator):
+            indicator_type = indicator_type or self._get_indicator_type(indicator)
+            if indicator_type == "ip":
                 url = f"https://www.virustotal.com/api/v3/ip_addresses/{indicator}"
-            elif self._is_domain(indicator):
+            elif indicator_type == "domain":
                 url = f"https://www.virustotal.com/api/v3/domains/{indicator}"
-            elif self._is_hash(indicator):
+            elif indicator_type == "hash":
                 url = f"https://www.virustotal.com/api/v3/files/{indicator}"
             else:
                 return None
             
-            response = requests.get(url, headers=headers, timeout=30)
+            # Off the event loop so concurrent lookups actually overlap
+            response = await asyncio.to_thread(requests.get, url, headers=headers, timeout=30)
             
             if response.status_code == 200:
                 data = response.json()
                 stats = data.get("data", {}).get("attributes", {}).get("last_analysis_stats", {})
                 
                 return {
-                    "type": self._get_indicator_type(indicator),
+                    "type": indicator_type,
                     "source": "virustotal",
                     "malicious": stats.get("malicious", 0) > 0,
                     "score": min(stats.get("malicious", 0) * 2, 10),  # Scale to 0-10
@@ -76,7 +117,7 @@ class ThreatIntelIntegration:
             print(f"Error searching VirusTotal: {e}")
             return None
     
-    async def _search_alienvault(self, indicator: str) -> Optional[Dict]:
+    async def _search_alienvault(self, indicator: str, indicator_type: Optional[str] = None) -> Optional[Dict]:
         """Search AlienVault OTX for indicator"""
         if not self.alienvault_api_key:
             return None
@@ -85,23 +126,25 @@ class ThreatIntelIntegration:
             headers = {"X-OTX-API-KEY": self.alienvault_api_key}
             
             # Determine API endpoint based on indicator type
-            if self._is_ip(indicator):
+            indicator_type = indicator_type or self._get_indicator_type(indicator)
+            if indicator_type == "ip":
                 url = f"https://otx.alienvault.com/api/v1/indicators/IPv4/{indicator}/general"
-            elif self._is_domain(indicator):
+            elif indicator_type == "domain":
                 url = f"https://otx.alienvault.com/api/v1/indicators/domain/{indicator}/general"
-            elif self._is_hash(indicator):
+            elif indicator_type == "hash":
                 url = f"https://otx.alienvault.com/api/v1/indicators/file/{indicator}/general"
             else:
                 return None
             
-            response = requests.get(url, headers=headers, timeout=30)
+            # Off the event loop so concurrent lookups actually overlap
+            response = await asyncio.to_thread(requests.get, url, headers=headers, timeout=30)
             
             if response.status_code == 200:
                 data = response.json()
                 pulse_count = data.get("pulse_info", {}).get("count", 0)
                 
                 return {
-                    "type": self._get_indicator_type(indicator),
+                    "type": indicator_type,
                     "source": "alienvault",
                     "malicious": pulse_count > 0,
                     "score": min(pulse_count, 10),  # Scale to 0-10
@@ -117,7 +160,7 @@ class ThreatIntelIntegration:
             print(f"Error searching AlienVault: {e}")
             return None
     
-    def _mock_threat_intel_result(self, indicator: str) -> Dict:
+    def _mock_threat_intel_result(self, indicator: str, indicator_type: Optional[str] = None) -> Dict:
         """Generate mock threat intelligence result for demo"""
         import random
         
@@ -125,7 +168,7 @@ class ThreatIntelIntegration:
         is_malicious = random.random() < malicious_probability
         
         return {
-            "type": self._get_indicator_type(indicator),
+            "type": indicator_type or self._get_indicator_type(indicator),
             "source": "mock_threat_feed",
             "malicious": is_malicious,
             "score": random.randint(7, 10) if is_malicious else random.randint(0, 3),
@@ -178,8 +221,13 @@ class ThreatIntelIntegration:
         """Search multiple indicators in batch"""
         results = []
         
-        for indicator in indicators:
-            result = await self.search_indicator(indicator)
+        # Classify once up front and search each canonical value only once
+        searched = {}
+        for classified in classify_indicators(indicators):
+            indicator = classified.value
+            if classified.canonical not in searched:
+                searched[classified.canonical] = await self._search_classified(classified)
+            result = searched[classified.canonical]
             if result:
                 results.append({
                     "indicator": indicator,
@@ -188,9 +236,53 @@ class ThreatIntelIntegration:
         
         return results
     
+    async def search_concurrently(self, indicators: List[str], concurrency: Optional[int] = None
+                                  ) -> AsyncIterator[Tuple[List[str], ClassifiedIndicator, Optional[Dict]]]:
+        """Search indicators concurrently, yielding (submitted values, classified, result) as each resolves.
+        
+        Each canonical value is searched once; every submitted spelling of it
+        comes back with its result.
+        """
+        spellings: Dict[str, List[str]] = {}
+        unique: Dict[str, ClassifiedIndicator] = {}
+        for classified in classify_indicators(indicators):
+            spellings.setdefault(classified.canonical, []).append(classified.value)
+            unique.setdefault(classified.canonical, classified)
+        
+        semaphore = asyncio.Semaphore(concurrency or settings.THREAT_INTEL_CONCURRENCY)
+        
+        async def search(classified: ClassifiedIndicator):
+            async with semaphore:
+                return classified, await self._search_classified(classified)
+        
+        tasks = [asyncio.ensure_future(search(classified)) for classified in unique.values()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                classified, result = await next_done
+                yield spellings[classified.canonical], classified, result
+        finally:
+            # Consumer went away (e.g. client disconnected): stop outstanding lookups
+            for task in tasks:
+                task.cancel()
+    
     async def get_ioc_context(self, indicator: str) -> Dict:
         """Get additional context for an IOC"""
         try:
+            # Pivot graph built from alerts, stored indicators and malware analysis
+            start = indicator_node(indicator)
+            graph = pivot_graph.pivot(start, depth=2, fanout=50, max_nodes=500) if start else None
+            if graph:
+                nodes = graph["nodes"][1:]
+                return {
+                    "indicator": indicator,
+                    "type": self._get_indicator_type(indicator),
+                    "associated_campaigns": [{"name": n["value"], "distance": n["depth"]} for n in nodes if n["type"] == "family"],
+                    "related_indicators": [n["value"] for n in nodes if n["type"] in INDICATOR_TYPES][:50],
+                    "incidents": [int(n["value"]) for n in nodes if n["type"] == "incident"],
+                    "alerts": sum(1 for n in nodes if n["type"] == "alert"),
+                    "graph_complete": graph["complete"]
+                }
+            
             # Mock IOC context
             return {
                 "indicator": indicator,
@@ -226,31 +318,16 @@ class ThreatIntelIntegration:
     
     def _is_ip(self, indicator: str) -> bool:
         """Check if indicator is an IP address"""
-        import ipaddress
-        try:
-            ipaddress.ip_address(indicator)
-            return True
-        except ValueError:
-            return False
+        return is_ip(indicator)
     
     def _is_domain(self, indicator: str) -> bool:
         """Check if indicator is a domain"""
-        import re
-        domain_pattern = r'^([a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}$'
-        return re.match(domain_pattern, indicator) is not None
+        return is_domain(indicator)
     
     def _is_hash(self, indicator: str) -> bool:
         """Check if indicator is a file hash"""
-        hash_lengths = [32, 40, 64, 128]  # MD5, SHA1, SHA256, SHA512
-        return len(indicator) in hash_lengths and all(c in '0123456789abcdefABCDEF' for c in indicator)
+        return is_hash(indicator)
     
     def _get_indicator_type(self, indicator: str) -> str:
         """Determine the type of indicator"""
-        if self._is_ip(indicator):
-            return "ip"
-        elif self._is_domain(indicator):
-            return "domain"
-        elif self._is_hash(indicator):
-            return "hash"
-        else:
-            return "unknown"
+        return classify_indicator(indicator).type
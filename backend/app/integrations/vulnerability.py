@@ -1,11 +1,74 @@
+import asyncio
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.integrations.analysis_cache import AnalysisCache, analysis_lock, fingerprint, incident_inputs
+from app.integrations.cve_store import CVEStore
+from app.integrations.compliance import ComplianceTracker
+from app.models.database import Alert, Asset, ComplianceCounter, Incident, Vulnerability
+
+SEVERITIES = ("critical", "high", "medium", "low")
 
 class VulnerabilityIntegration:
     """Integration with vulnerability management systems"""
     
+    def _incident_assets(self, db: Session, incident_id: int) -> List[Asset]:
+        """Inventory hosts targeted in the incident's alerts or named as affected systems"""
+        ips = {row.destination_ip for row in db.query(Alert.destination_ip).filter(
+            Alert.incident_id == incident_id, Alert.destination_ip.isnot(None)
+        ).distinct() if row.destination_ip}
+        names = set()
+        incident = db.query(Incident).filter(Incident.id == incident_id).first()
+        if incident:
+            for data in (incident.detection_data, incident.eradication_data):
+                names.update((data or {}).get("affected_systems", []))
+        if not ips and not names:
+            return []
+        return db.query(Asset).filter(or_(Asset.ip_address.in_(ips), Asset.hostname.in_(names))).all()
+    
+    def _fingerprint(self, db: Session, incident_id: int) -> str:
+        """Incident alerts, indicators and affected systems, the inventory, CVE data and finding totals"""
+        incident = db.query(Incident.detection_data, Incident.eradication_data).filter(Incident.id == incident_id).first()
+        systems = sorted({name for data in (incident or ()) for name in (data or {}).get("affected_systems", [])})
+        return fingerprint(
+            "vulnerabilities", incident_inputs(db, incident_id), systems,
+            list(db.query(func.count(Asset.id), func.max(Asset.id), func.max(Asset.updated_at)).one()),
+            list(db.query(func.count(Vulnerability.cve_id), func.max(Vulnerability.last_modified)).one()),
+            # Patches and re-imports move these (sums alone would miss a severity changing hands)
+            list(db.query(func.sum(ComplianceCounter.total), func.sum(ComplianceCounter.patched),
+                          func.max(ComplianceCounter.updated_at)).one())
+        )
+    
+    def _match_incident(self, incident_id: int) -> Optional[List[Dict]]:
+        db = SessionLocal()
+        try:
+            store = CVEStore(db)
+            if not store.has_data():
+                return None
+            cache = AnalysisCache(db)
+            cached = cache.lookup(incident_id, "vulnerabilities", self._fingerprint(db, incident_id))
+            if cached is not None:
+                return cached
+            vulnerabilities = store.match_assets(self._incident_assets(db, incident_id))
+            # Patched once every affected host's finding is
+            patched = ComplianceTracker(db).attribute(incident_id, vulnerabilities)
+            for v in vulnerabilities:
+                v["patched"] = all(patched.get((system, v["cve_id"]), False) for system in v["affected_systems"])
+            # Taken after attribute(), whose first run for an incident adds its counters
+            cache.store(incident_id, "vulnerabilities", self._fingerprint(db, incident_id), vulnerabilities)
+            return vulnerabilities
+        finally:
+            db.close()
+    
     async def get_incident_vulnerabilities(self, incident_id: int) -> List[Dict]:
-        """Get vulnerabilities related to incident"""
+        """Get vulnerabilities related to incident (cached until the incident, inventory or CVE data change)"""
+        async with analysis_lock(incident_id, "vulnerabilities"):
+            vulnerabilities = await asyncio.to_thread(self._match_incident, incident_id)
+        if vulnerabilities is not None:
+            return vulnerabilities
+        
         return [
             {
                 "cve_id": "CVE-2024-1234",
@@ -27,8 +90,37 @@ class VulnerabilityIntegration:
             }
         ]
     
+    async def get_incident_compliance(self, incident_id: int) -> Optional[Dict]:
+        """Finding counts for the incident's hosts (None until its vulnerabilities have been matched)"""
+        db = SessionLocal()
+        try:
+            return ComplianceTracker(db).counters("incident", incident_id).get("incident", {}).get(str(incident_id))
+        finally:
+            db.close()
+    
     async def get_patch_status(self) -> Dict:
         """Get overall patch status"""
+        db = SessionLocal()
+        try:
+            store = CVEStore(db)
+            if store.has_data():
+                # Precomputed per host and CVE; see ComplianceTracker
+                counters = ComplianceTracker(db).counters()
+                by_severity = counters.get("severity", {})
+                total = sum(c["total"] for c in by_severity.values())
+                patched = sum(c["patched"] for c in by_severity.values())
+                return {
+                    "total_vulnerabilities": total,
+                    **{f"{severity}_unpatched": by_severity.get(severity, {}).get("unpatched", 0) for severity in SEVERITIES},
+                    "patched": patched,
+                    "patch_compliance": round(100.0 * patched / total, 1) if total else 100.0,
+                    "by_severity": by_severity,
+                    "by_group": counters.get("group", {}),
+                    "last_scan": datetime.utcnow().isoformat()
+                }
+        finally:
+            db.close()
+        
         return {
             "total_vulnerabilities": 15,
             "critical_unpatched": 1,
@@ -40,13 +132,14 @@ class VulnerabilityIntegration:
             "last_scan": datetime.utcnow().isoformat()
         }
     
-    async def apply_patch(self, vuln_id: str) -> Dict:
-        """Apply patch for vulnerability"""
+    async def apply_patch(self, vuln_id: str, host: Optional[str] = None) -> Dict:
+        """Apply patch for vulnerability (on one host, or wherever it applies when no host is given)"""
         return {
             "success": True,
             "vulnerability_id": vuln_id,
+            "host": host,
             "patch_applied": True,
             "patch_date": datetime.utcnow().isoformat(),
             "reboot_required": False,
-            "message": f"Patch applied successfully for {vuln_id}"
+            "message": f"Patch applied successfully for {vuln_id}" + (f" on {host}" if host else "")
         }
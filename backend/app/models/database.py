@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, JSON
+from sqlalchemy import Column, Integer, BigInteger, Float, String, DateTime, Text, Boolean, JSON, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -32,11 +32,17 @@ class Alert(Base):
     alert_type = Column(String)
     message = Column(Text)
     severity = Column(String)
-    source_ip = Column(String)
-    destination_ip = Column(String)
+    source_ip = Column(String, index=True)
+    destination_ip = Column(String, index=True)
     raw_data = Column(JSON)
+    triage_score = Column(Integer, default=0, index=True)
     acknowledged = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # Covers the per-incident attacker aggregation without touching the table
+        Index("ix_alerts_incident_source_ip", "incident_id", "source_ip", "severity", "created_at"),
+    )
 
 class BlockedIP(Base):
     __tablename__ = "blocked_ips"
@@ -47,6 +53,27 @@ class BlockedIP(Base):
     reason = Column(String)
     blocked_at = Column(DateTime(timezone=True), server_default=func.now())
     unblocked_at = Column(DateTime(timezone=True))
+    expires_at = Column(DateTime(timezone=True), index=True)  # None = permanent
+    offense_count = Column(Integer, default=1)
+    is_active = Column(Boolean, default=True)
+
+class AggregatedBlock(Base):
+    __tablename__ = "aggregated_blocks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    network = Column(String, index=True)  # address or CIDR as pushed to the firewall
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
+    removed_at = Column(DateTime(timezone=True))
+    is_active = Column(Boolean, default=True, index=True)
+
+class ProtectedRange(Base):
+    __tablename__ = "protected_ranges"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    network = Column(String, index=True)  # address or CIDR
+    label = Column(String)
+    category = Column(String)  # load_balancer, partner, monitoring, allowlist, ...
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_active = Column(Boolean, default=True)
 
 class ThreatIndicator(Base):
@@ -60,6 +87,176 @@ class ThreatIndicator(Base):
     threat_score = Column(Integer)
     indicator_metadata = Column(JSON)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    incident_id = Column(Integer, index=True)
+    category = Column(String)  # feed_match, ...
+    severity = Column(String)
+    message = Column(Text)
+    details = Column(JSON)
+    read = Column(Boolean, default=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ContainmentJob(Base):
+    __tablename__ = "containment_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    idempotency_key = Column(String, unique=True, index=True)
+    incident_id = Column(Integer, index=True)
+    action = Column(String)  # block, unblock, rate_limit, rule
+    target = Column(String)  # firewall the job runs against
+    payload = Column(JSON)
+    status = Column(String, default="queued", index=True)  # queued, running, succeeded, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    next_run_at = Column(DateTime(timezone=True), index=True)
+    locked_by = Column(String)
+    locked_at = Column(DateTime(timezone=True))
+    result = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True))
+
+class ContainmentAction(Base):
+    """Append-only audit log of firewall operations"""
+    __tablename__ = "containment_actions"
+    
+    id = Column(Integer, primary_key=True)
+    incident_id = Column(Integer)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    action = Column(String)  # block_ip, unblock_ip, rate_limit, create_rule
+    target = Column(String, index=True)
+    result = Column(String)  # success, failure
+    details = Column(Text)
+    actor = Column(String)  # system, job-<id>, expiry, reconciler, ...
+    
+    __table_args__ = (
+        Index("ix_containment_actions_incident_time", "incident_id", "timestamp", "id"),
+    )
+
+class FileHash(Base):
+    """Hash cache for artifact scans; a file is re-hashed only when its key changes"""
+    __tablename__ = "file_hashes"
+    
+    id = Column(Integer, primary_key=True)
+    device = Column(BigInteger, nullable=False)
+    inode = Column(BigInteger, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    path = Column(String)
+    md5 = Column(String)
+    sha1 = Column(String)
+    sha256 = Column(String, index=True)
+    scanned_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index("ix_file_hashes_key", "device", "inode", "size", "mtime_ns", unique=True),
+    )
+
+class Asset(Base):
+    """Inventory host and the software (vendor, product, version) installed on it"""
+    __tablename__ = "assets"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    hostname = Column(String, index=True)
+    ip_address = Column(String, index=True)
+    asset_group = Column(String, index=True)
+    software = Column(JSON)  # [{"vendor", "product", "version"}]
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Vulnerability(Base):
+    """CVE imported from a local NVD feed"""
+    __tablename__ = "vulnerabilities"
+    
+    cve_id = Column(String, primary_key=True)
+    description = Column(Text)
+    score = Column(Float)
+    severity = Column(String, index=True)
+    published = Column(String)
+    last_modified = Column(String)  # NVD timestamp, used for incremental re-imports
+
+class VulnerableRange(Base):
+    """Vulnerable CPE configuration of a CVE: a product and the affected version range"""
+    __tablename__ = "vulnerable_ranges"
+    
+    id = Column(Integer, primary_key=True)
+    cve_id = Column(String, nullable=False, index=True)
+    vendor = Column(String, nullable=False)
+    product = Column(String, nullable=False)
+    version = Column(String)  # exact version, or * when bounded by the range below
+    start_including = Column(String)
+    start_excluding = Column(String)
+    end_including = Column(String)
+    end_excluding = Column(String)
+    
+    __table_args__ = (
+        Index("ix_vulnerable_ranges_product", "vendor", "product"),
+    )
+
+class VulnerabilityFinding(Base):
+    """A CVE affecting one inventory host, open until patched there"""
+    __tablename__ = "vulnerability_findings"
+    
+    id = Column(Integer, primary_key=True)
+    system = Column(String, nullable=False)  # asset hostname (or IP when unnamed)
+    cve_id = Column(String, nullable=False, index=True)
+    severity = Column(String)
+    asset_group = Column(String)
+    patched = Column(Boolean, default=False)
+    detected_at = Column(DateTime(timezone=True), server_default=func.now())
+    patched_at = Column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        Index("ix_vulnerability_findings_key", "system", "cve_id", unique=True),
+    )
+
+class IncidentFinding(Base):
+    """Finding on a host involved in an incident"""
+    __tablename__ = "incident_findings"
+    
+    incident_id = Column(Integer, primary_key=True)
+    finding_id = Column(Integer, primary_key=True, index=True)
+
+class ComplianceCounter(Base):
+    """Running finding totals for one severity, asset group or incident"""
+    __tablename__ = "compliance_counters"
+    
+    scope = Column(String, primary_key=True)  # severity, group, incident
+    key = Column(String, primary_key=True)
+    total = Column(Integer, default=0, nullable=False)
+    patched = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class PatchRolloutRecord(Base):
+    """Progress of a patch rollout, rewritten as each host finishes"""
+    __tablename__ = "patch_rollouts"
+    
+    id = Column(String, primary_key=True)  # rollout id
+    incident_id = Column(Integer, index=True)
+    status = Column(String, index=True)  # queued, running, completed, halted, failed
+    summary = Column(JSON)
+    hosts = Column(JSON)  # host -> pending, patching, patched, failed, skipped
+    results = Column(JSON)
+    owner = Column(String)  # process running the rollout
+    heartbeat_at = Column(DateTime, index=True)  # last check-in of the owner while the rollout is active
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class AnalysisResult(Base):
+    """Cached eradication analysis of an incident and the fingerprint of the inputs it was computed from"""
+    __tablename__ = "analysis_results"
+    
+    incident_id = Column(Integer, primary_key=True)
+    kind = Column(String, primary_key=True)  # logs, malware, vulnerabilities
+    fingerprint = Column(String(64), nullable=False)
+    window_start = Column(DateTime)
+    window_end = Column(DateTime)  # log analysis: end of the window the stored state covers
+    result = Column(JSON)
+    state = Column(JSON)  # log analysis: merged counters, per-file notes and file identities
+    computed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 class SystemStatus(Base):
     __tablename__ = "system_status"
@@ -0,0 +1,66 @@
+"""Benchmark the eradication analysis cache against re-running log analysis per view.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_analysis_cache [--mb 512] [--views 12]
+
+Writes a day of web and auth logs (see bench_log_analysis) and replays the
+eradication dashboard being opened `views` times over that day for an
+incident that started at 00:00: each view's window ends later. Every view is
+analyzed twice, once from scratch and once through the cache, which only
+reads the logs written since the previous view; the reports must agree.
+A repeated view of an unchanged window is timed as well.
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import timedelta
+from benchmarks.bench_log_analysis import write_logs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=int, default=512)
+    parser.add_argument("--views", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{work}/analysis.db"
+    paths, day = write_logs(work, args.mb * 1024 * 1024, False)
+    os.environ["LOG_PATHS"] = ",".join(paths)
+    from app.core.database import Base, engine
+    from app.integrations.incident_logs import IncidentLogAnalyzer
+    from app.integrations.log_analysis import LogAnalysisIntegration
+
+    Base.metadata.create_all(bind=engine)
+    integration = LogAnalysisIntegration()
+    integration.workers = args.workers
+    analyzer = IncidentLogAnalyzer(args.workers)
+
+    def comparable(report):
+        return {k: v for k, v in report.items() if k not in ("duration_ms", "cache")}
+
+    full_total = cached_total = 0.0
+    for view in range(1, args.views + 1):
+        end_time = day + timedelta(seconds=86400 * view // args.views - 1)
+        started = time.perf_counter()
+        full = analyzer.analyze(paths, day, end_time)
+        full_elapsed = time.perf_counter() - started
+        started = time.perf_counter()
+        cached = integration._analyze_logs_cached(1, day, end_time)
+        cached_elapsed = time.perf_counter() - started
+        assert comparable(full) == comparable(cached), f"view {view}: cached report differs"
+        full_total += full_elapsed
+        cached_total += cached_elapsed
+        print(f"view {view:2d} until {end_time:%H:%M}: full {full_elapsed * 1000:6.0f} ms, "
+              f"cached {cached_elapsed * 1000:6.0f} ms ({cached['cache']['status']})")
+    print(f"total: full {full_total:.1f}s, cached {cached_total:.1f}s")
+
+    started = time.perf_counter()
+    for _ in range(20):
+        integration._analyze_logs_cached(1, day, end_time)
+    print(f"repeated view: {(time.perf_counter() - started) / 20 * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
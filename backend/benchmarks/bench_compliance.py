@@ -0,0 +1,88 @@
+"""Benchmark patch-compliance counters against recomputing from the CVE match.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_compliance [--cves 50000] [--hosts 500]
+
+Imports a generated feed and an inventory spread over five asset groups,
+which opens the findings, then compares reading the dashboard numbers from
+compliance_counters with matching the whole inventory per request (what
+get_patch_status did before). Finally records patch results for a slice of
+the findings plus a delta feed, and checks the incrementally maintained
+counters against a full rebuild.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from benchmarks.bench_cve_store import nvd_item, write_feed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cves", type=int, default=50000)
+    parser.add_argument("--hosts", type=int, default=500)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{work}/compliance.db"
+    full, delta, inventory = (os.path.join(work, name) for name in ("nvdcve.json.gz", "modified.json.gz", "assets.jsonl"))
+    os.environ["NVD_FEED_PATHS"] = full
+    os.environ["ASSET_INVENTORY_PATH"] = inventory
+    from app.core.database import Base, engine, SessionLocal
+    from app.models.database import Asset, Incident, VulnerabilityFinding
+    from app.integrations.cve_store import CVEStore, import_vulnerability_data
+    from app.integrations.compliance import ComplianceTracker
+
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(11)
+    write_feed(full, (nvd_item(i, rnd, "2023-06-01T00:00Z") for i in range(args.cves)))
+    write_feed(delta, [nvd_item(i, rnd, "2024-02-01T00:00Z") for i in rnd.sample(range(args.cves), args.cves // 100)])
+    groups = ["web", "database", "workstation", "dmz", "infra"]
+    with open(inventory, "w") as f:
+        for h in range(args.hosts):
+            software = [f"cpe:2.3:a:vendor{p % 400}:product{p}:{rnd.randrange(1, 5)}.{rnd.randrange(0, 9)}.{rnd.randrange(0, 20)}"
+                        for p in rnd.sample(range(2000), 20)]
+            f.write(json.dumps({"hostname": f"host-{h:04d}", "ip_address": f"10.1.{h >> 8}.{h & 255}",
+                                "group": groups[h % len(groups)], "software": software}) + "\n")
+
+    started = time.perf_counter()
+    result = import_vulnerability_data()
+    print(f"import + findings sync: {time.perf_counter() - started:.2f}s {result['findings']}")
+
+    db = SessionLocal()
+    store, tracker = CVEStore(db), ComplianceTracker(db)
+    started = time.perf_counter()
+    for _ in range(5):
+        store.match_assets(db.query(Asset).all())
+    print(f"recompute per request: {(time.perf_counter() - started) / 5 * 1000:.0f} ms")
+    started = time.perf_counter()
+    for _ in range(100):
+        tracker.counters()
+    print(f"read counters: {(time.perf_counter() - started) / 100 * 1000:.2f} ms")
+
+    incident = Incident(title="Compliance benchmark", description="", severity="high", status="contained")
+    db.add(incident)
+    db.commit()
+    tracker.attribute(incident.id, store.match_assets(db.query(Asset).limit(20).all()))
+    findings = db.query(VulnerabilityFinding.system, VulnerabilityFinding.cve_id).all()
+    results = [{"vulnerability_id": cve_id, "host": system, "success": True} for system, cve_id in rnd.sample(findings, len(findings) // 10)]
+    started = time.perf_counter()
+    for i in range(0, len(results), 2):
+        tracker.record_patches(results[i:i + 2])
+    elapsed = time.perf_counter() - started
+    print(f"record {len(results)} patch results, 2 per call: {elapsed / (len(results) / 2) * 1000:.1f} ms per call")
+    store.import_feed(delta)
+    print(f"delta re-sync: {tracker.sync_findings(store.match_assets(db.query(Asset).all()))}")
+
+    incremental = tracker.counters()
+    tracker.rebuild()
+    rebuilt = tracker.counters()
+    print(f"counters match rebuild: {incremental == rebuilt}; fleet "
+          f"{sum(c['patched'] for c in rebuilt['severity'].values())}/{sum(c['total'] for c in rebuilt['severity'].values())} patched, "
+          f"incident {rebuilt.get('incident')}")
+    db.close()
+
+if __name__ == "__main__":
+    main()
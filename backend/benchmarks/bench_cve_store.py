@@ -0,0 +1,91 @@
+"""Benchmark the local CVE store: streaming import, delta re-import and asset matching.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_cve_store [--cves 100000] [--hosts 500]
+
+Generates a gzip NVD 1.1 feed with `cves` entries over 2000 products, a
+"modified" feed re-issuing 1% of them plus new entries, and an inventory of
+`hosts` hosts with 20 packages each. Times the full import, the delta import
+and a per-incident query for a handful of hosts.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+
+def nvd_item(i: int, rnd: random.Random, modified: str) -> dict:
+    vendor, product = f"vendor{i % 400}", f"product{i % 2000}"
+    major = rnd.randrange(1, 5)
+    return {
+        "cve": {
+            "CVE_data_meta": {"ID": f"CVE-2023-{i:06d}"},
+            "description": {"description_data": [{"lang": "en", "value": f"Synthetic issue {i} in {product}"}]}
+        },
+        "configurations": {"nodes": [{"operator": "OR", "cpe_match": [{
+            "vulnerable": True,
+            "cpe23Uri": f"cpe:2.3:a:{vendor}:{product}:*:*:*:*:*:*:*:*",
+            "versionStartIncluding": f"{major}.0",
+            "versionEndExcluding": f"{major}.{rnd.randrange(1, 9)}.{rnd.randrange(0, 20)}"
+        }]}]},
+        "impact": {"baseMetricV3": {"cvssV3": {"baseScore": round(rnd.uniform(2, 10), 1),
+                                               "baseSeverity": rnd.choice(["LOW", "MEDIUM", "HIGH", "CRITICAL"])}}},
+        "publishedDate": "2023-01-01T00:00Z",
+        "lastModifiedDate": modified
+    }
+
+def write_feed(path: str, items):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write('{"CVE_data_type": "CVE", "CVE_data_format": "MITRE", "CVE_Items": [')
+        for n, item in enumerate(items):
+            f.write(("," if n else "") + json.dumps(item))
+        f.write("]}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cves", type=int, default=100000)
+    parser.add_argument("--hosts", type=int, default=500)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{work}/cve.db"
+    from app.core.database import Base, engine, SessionLocal
+    from app.models.database import Asset
+    from app.integrations.cve_store import CVEStore, load_inventory
+
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(11)
+    full, delta, inventory = (os.path.join(work, name) for name in ("nvdcve-1.1-2023.json.gz", "nvdcve-1.1-modified.json.gz", "assets.jsonl"))
+    write_feed(full, (nvd_item(i, rnd, "2023-06-01T00:00Z") for i in range(args.cves)))
+    changed = rnd.sample(range(args.cves), args.cves // 100)
+    write_feed(delta, [nvd_item(i, rnd, "2024-02-01T00:00Z") for i in changed] +
+               [nvd_item(args.cves + i, rnd, "2024-02-01T00:00Z") for i in range(args.cves // 1000)])
+    with open(inventory, "w") as f:
+        for h in range(args.hosts):
+            software = [f"cpe:2.3:a:vendor{p % 400}:product{p}:{rnd.randrange(1, 5)}.{rnd.randrange(0, 9)}.{rnd.randrange(0, 20)}"
+                        for p in rnd.sample(range(2000), 20)]
+            f.write(json.dumps({"hostname": f"host-{h:04d}", "ip_address": f"10.1.{h >> 8}.{h & 255}", "software": software}) + "\n")
+    print(f"feed: {os.path.getsize(full) / 1e6:.1f} MB gzip, delta: {os.path.getsize(delta) / 1e6:.1f} MB")
+
+    db = SessionLocal()
+    store = CVEStore(db)
+    for label, path in (("full import", full), ("delta import", delta), ("repeat delta", delta)):
+        started = time.perf_counter()
+        stats = store.import_feed(path)
+        print(f"{label}: {time.perf_counter() - started:.2f}s {stats}")
+    load_inventory(db, inventory)
+
+    hosts = db.query(Asset).limit(5).all()
+    started = time.perf_counter()
+    for _ in range(20):
+        found = store.match_assets(hosts)
+    print(f"incident query (5 hosts): {(time.perf_counter() - started) / 20 * 1000:.1f} ms, {len(found)} CVEs")
+    started = time.perf_counter()
+    found = store.match_assets(db.query(Asset).all())
+    print(f"whole inventory ({args.hosts} hosts): {(time.perf_counter() - started) * 1000:.0f} ms, {len(found)} CVEs")
+
+if __name__ == "__main__":
+    main()
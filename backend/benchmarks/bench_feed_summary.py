@@ -0,0 +1,58 @@
+"""Benchmark the precomputed threat feed summary against summarizing per request.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_feed_summary [--indicators 1000000] [--requests 200]
+
+Loads a generated local feed (THREAT_FEED_PATH mode) with a few hundred
+threat names, times building the summary snapshot, which is the work a
+request would otherwise do, then times GET /api/eradication/threat-feed
+served from the snapshot, with and without a matching If-None-Match.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--indicators", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    feed = os.path.join(work, "feed.jsonl")
+    rnd = random.Random(5)
+    with open(feed, "w") as f:
+        for i in range(args.indicators):
+            kind = rnd.choice(("ip", "domain", "hash"))
+            value = {"ip": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", "domain": f"d{i}.example.net", "hash": f"{i:064x}"}[kind]
+            f.write(json.dumps({"value": value, "type": kind, "score": rnd.randrange(11),
+                                "name": f"family{int(400 * rnd.random() ** 2)}", "tags": ["malware"]}) + "\n")
+    os.environ["DATABASE_URL"] = f"sqlite:///{work}/feed.db"
+    os.environ["THREAT_FEED_PATH"] = feed
+    os.environ["THREAT_FEED_REFRESH_SECONDS"] = "0"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    from fastapi.testclient import TestClient
+    from app.integrations.feed_summary import feed_summary
+    from app.integrations.threat_feed import feed_store
+    import main as app_main
+
+    with TestClient(app_main.app) as client:
+        print(f"feed store: {len(feed_store)} indicators")
+        started = time.perf_counter()
+        snapshot = feed_summary.build()
+        print(f"summary build (moved off the request path): {(time.perf_counter() - started) * 1000:.0f} ms, "
+              f"{len(snapshot.body)} byte body")
+
+        for label, headers in (("full body", {}), ("If-None-Match", {"If-None-Match": snapshot.etag})):
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                response = client.get("/api/eradication/threat-feed", headers=headers)
+            elapsed = (time.perf_counter() - started) / args.requests
+            print(f"{label}: {elapsed * 1000:.2f} ms per request (status {response.status_code}, {len(response.content)} bytes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark blocking thousands of IPs against the local stub firewall.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_firewall_block [--count 2000] [--latency-ms 20]
+
+Starts benchmarks.stub_firewall in a subprocess and compares the serial
+per-IP loop, the batch API and the bounded-concurrency per-IP fallback.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _start_stub(port: int, latency_ms: float, batch: bool) -> subprocess.Popen:
+    env = dict(os.environ, STUB_FIREWALL_LATENCY_MS=str(latency_ms), STUB_FIREWALL_BATCH="1" if batch else "0")
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.stub_firewall", "--port", str(port)], env=env)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("stub firewall did not start")
+
+def _firewall(port: int):
+    from app.core.config import settings
+    from app.integrations.firewall import FirewallIntegration
+    settings.FIREWALL_API_URL = f"http://127.0.0.1:{port}"
+    FirewallIntegration._batch_supported = None
+    return FirewallIntegration()
+
+async def _serial(firewall, ips):
+    return [await firewall.block_ip(ip, "benchmark") for ip in ips]
+
+def run(label: str, count: int, latency_ms: float, batch: bool, mode: str):
+    port = _free_port()
+    proc = _start_stub(port, latency_ms, batch)
+    try:
+        firewall = _firewall(port)
+        ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(count)]
+        start = time.perf_counter()
+        if mode == "serial":
+            results = asyncio.run(_serial(firewall, ips))
+            ok = sum(results)
+        else:
+            ok = sum(asyncio.run(firewall.block_ips_batch(ips, "benchmark")).values())
+        elapsed = time.perf_counter() - start
+        print(f"{label:<28} {count:>7} IPs  {elapsed:>8.2f}s  {count / elapsed:>9.0f} IPs/s  ok={ok}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    run("serial block_ip loop", min(args.count, 200), args.latency_ms, True, "serial")
+    run("batch API", args.count, args.latency_ms, True, "batch")
+    run("concurrent per-IP fallback", args.count, args.latency_ms, False, "batch")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Micro-benchmarks for indicator classification and normalization.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_indicators [--count 200000]
+
+Reports the per-indicator cost of the legacy per-call ThreatIntelIntegration
+path (one _is_* chain per provider) against the batch classify-and-normalize
+API, for each indicator type and for a mixed bulk import.
+"""
+import argparse
+import random
+import string
+import time
+from typing import Callable, List
+
+from app.core.indicators import classify_indicator, classify_indicators
+from app.integrations.threat_intel import ThreatIntelIntegration
+
+def _legacy_type(indicator: str) -> str:
+    """The pre-batch implementation: re-imports and recompiles on every call"""
+    import ipaddress
+    import re
+    try:
+        ipaddress.ip_address(indicator)
+        return "ip"
+    except ValueError:
+        pass
+    domain_pattern = r'^([a-zA-Z0-9]([a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}$'
+    if re.match(domain_pattern, indicator) is not None:
+        return "domain"
+    if len(indicator) in [32, 40, 64, 128] and all(c in '0123456789abcdefABCDEF' for c in indicator):
+        return "hash"
+    return "unknown"
+
+def make_indicators(kind: str, count: int) -> List[str]:
+    rng = random.Random(42)
+    if kind == "ipv4":
+        return [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}" for _ in range(count)]
+    if kind == "ipv6":
+        return [f"2001:DB8:{rng.randint(0, 0xffff):x}:0:0:0:0:{rng.randint(0, 0xffff):X}" for _ in range(count)]
+    if kind == "domain":
+        return ["".join(rng.choices(string.ascii_lowercase, k=10)) + rng.choice([".com", ".NET", ".org."]) for _ in range(count)]
+    if kind == "hash":
+        return ["%064X" % rng.getrandbits(256) for _ in range(count)]
+    if kind == "unknown":
+        return ["".join(rng.choices(string.ascii_letters, k=12)) for _ in range(count)]
+    mixed = []
+    for name in ("ipv4", "ipv6", "domain", "hash", "unknown"):
+        mixed.extend(make_indicators(name, count // 5))
+    rng.shuffle(mixed)
+    return mixed
+
+def measure(fn: Callable[[List[str]], object], values: List[str], repeat: int = 3) -> float:
+    """Best-of-N nanoseconds per indicator"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(values)
+        best = min(best, time.perf_counter() - start)
+    return best / len(values) * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=200000)
+    args = parser.parse_args()
+
+    threat_intel = ThreatIntelIntegration()
+    # Legacy flow classified once per provider lookup (VirusTotal, AlienVault, result type)
+    legacy = lambda values: [(_legacy_type(v), _legacy_type(v), _legacy_type(v)) for v in values]
+    current_single = lambda values: [threat_intel._get_indicator_type(v) for v in values]
+    single = lambda values: [classify_indicator(v) for v in values]
+    batch = lambda values: classify_indicators(values)
+
+    print(f"{'kind':<8} {'legacy x3':>12} {'_get_type':>12} {'classify':>12} {'batch':>12}   (ns/indicator)")
+    for kind in ("ipv4", "ipv6", "domain", "hash", "unknown", "mixed"):
+        values = make_indicators(kind, args.count)
+        print(f"{kind:<8} {measure(legacy, values):>12.0f} {measure(current_single, values):>12.0f} "
+              f"{measure(single, values):>12.0f} {measure(batch, values):>12.0f}")
+
+    duplicated = make_indicators("mixed", args.count // 10) * 10
+    print(f"{'dup x10':<8} {measure(legacy, duplicated):>12.0f} {measure(current_single, duplicated):>12.0f} "
+          f"{measure(single, duplicated):>12.0f} {measure(batch, duplicated):>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark the incident cluster index over stored threat indicators.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_ioc_clusters [--indicators 1000000] [--incidents 20000]
+
+Fills threat_indicators with mostly unique hashes, domains and IPs per
+incident, a pool of shared campaign infrastructure and a few hub IPs seen
+everywhere. Times the initial load, compares "which incidents share IOCs
+with this one" against the equivalent SQL self-join, and measures
+incremental inserts.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--indicators", type=int, default=1000000)
+    parser.add_argument("--incidents", type=int, default=20000)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{work}/clusters.db"
+    from sqlalchemy import insert
+    from sqlalchemy.orm import aliased
+    from app.core.database import Base, engine, SessionLocal
+    from app.models.database import ThreatIndicator
+    from app.integrations.ioc_clusters import IncidentClusterIndex
+
+    Base.metadata.create_all(bind=engine)
+    rnd = random.Random(13)
+    campaigns = [[f"c2-{c}-{k}.example.net" for k in range(5)] for c in range(args.incidents // 50)]
+    hubs = ["8.8.8.8", "1.1.1.1"]
+
+    def row(n: int) -> dict:
+        incident_id = rnd.randrange(1, args.incidents + 1)
+        roll = rnd.random()
+        if roll < 0.05:
+            kind, value = "domain", rnd.choice(campaigns[incident_id % len(campaigns)])
+        elif roll < 0.06:
+            kind, value = "ip", rnd.choice(hubs)
+        elif roll < 0.5:
+            kind, value = "hash", f"{rnd.getrandbits(256):064x}"
+        elif roll < 0.8:
+            kind, value = "domain", f"host{n}.example.org"
+        else:
+            kind, value = "ip", f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}"
+        return {"incident_id": incident_id, "indicator_type": kind, "value": value, "source": "bench", "threat_score": 80}
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    for i in range(0, args.indicators, 50000):
+        db.execute(insert(ThreatIndicator), [row(n) for n in range(i, min(i + 50000, args.indicators))])
+        db.commit()
+    print(f"stored {args.indicators} indicators in {time.perf_counter() - started:.1f}s")
+
+    index = IncidentClusterIndex()
+    tracemalloc.start()
+    started = time.perf_counter()
+    index.sync(db)
+    elapsed = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"initial load: {elapsed:.1f}s, {memory / 1e6:.0f} MB, {index.stats()}")
+
+    sample = rnd.sample(range(1, args.incidents + 1), 200)
+    started = time.perf_counter()
+    for incident_id in sample:
+        index.related(incident_id)
+        index.cluster(incident_id)
+    print(f"index lookup (related + cluster): {(time.perf_counter() - started) / len(sample) * 1e6:.0f} us, "
+          f"largest cluster {max(len(m) for m in index.members.values())} incidents")
+
+    mine, other = aliased(ThreatIndicator), aliased(ThreatIndicator)
+    started = time.perf_counter()
+    for incident_id in sample[:20]:
+        db.query(other.incident_id).join(mine, mine.value == other.value).filter(
+            mine.incident_id == incident_id, other.incident_id != incident_id
+        ).distinct().all()
+    print(f"SQL self-join: {(time.perf_counter() - started) / 20 * 1000:.1f} ms")
+
+    rows = [(args.indicators + n, rnd.randrange(1, args.incidents + 1), "hash", f"{rnd.getrandbits(256):064x}")
+            for n in range(100000)]
+    started = time.perf_counter()
+    for r in rows:
+        index.add_rows((r,))
+    print(f"incremental insert: {(time.perf_counter() - started) / len(rows) * 1e6:.1f} us per indicator")
+    db.close()
+
+if __name__ == "__main__":
+    main()
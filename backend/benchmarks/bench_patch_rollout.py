@@ -0,0 +1,78 @@
+"""Benchmark wave-based patch rollout against patching hosts one by one.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_patch_rollout [--hosts 200] [--patch-ms 50] [--parallelism 20]
+
+Each simulated patch sleeps `patch-ms` (minutes on a real fleet). Times the
+sequential loop the endpoint used to run, a rollout of the same hosts with
+progress written to the incident after every host, and a rollout where 30%
+of hosts fail, which should halt after the first wave over the threshold.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=200)
+    parser.add_argument("--patch-ms", type=int, default=50)
+    parser.add_argument("--parallelism", type=int, default=20)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{work}/rollout.db"
+    from app.core.database import Base, engine, SessionLocal
+    from app.models.database import Incident
+    from app.integrations.patch_rollout import PatchRollout
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    incident = Incident(title="Patch benchmark", description="", severity="high", status="contained")
+    db.add(incident)
+    db.commit()
+    incident_id = incident.id
+    db.close()
+
+    targets = {f"host-{h:04d}": ["CVE-2024-1234", "CVE-2024-5678"] for h in range(args.hosts)}
+    delay = args.patch_ms / 1000
+
+    def patcher(failure_rate: float):
+        rnd = random.Random(5)
+        async def apply(vuln_id, host):
+            await asyncio.sleep(delay)
+            return {"success": rnd.random() >= failure_rate, "message": f"{vuln_id} on {host}"}
+        return apply
+
+    async def healthy(hosts):
+        return {"healthy": True, "issues": []}
+
+    async def sequential():
+        apply = patcher(0.0)
+        for host, vulns in targets.items():
+            for vuln_id in vulns:
+                await apply(vuln_id, host)
+
+    started = time.perf_counter()
+    asyncio.run(sequential())
+    print(f"sequential: {len(targets)} hosts in {time.perf_counter() - started:.2f}s")
+
+    for label, failure_rate in (("rollout", 0.0), ("rollout, 30% failing", 0.3)):
+        rollout = PatchRollout(incident_id, targets, apply=patcher(failure_rate), health_gate=healthy,
+                               parallelism=args.parallelism, canary_size=2, wave_size=50, max_failure_ratio=0.1)
+        started = time.perf_counter()
+        summary = asyncio.run(rollout.run())
+        print(f"{label}: {summary['status']} after wave {summary['current_wave']}/{summary['total_waves']}, "
+              f"{summary['hosts_patched']} patched, {summary['hosts_failed']} failed, "
+              f"{time.perf_counter() - started:.2f}s {summary['halt_reason'] or ''}")
+
+    db = SessionLocal()
+    stored = db.query(Incident).filter(Incident.id == incident_id).first().eradication_data
+    print(f"eradication_data: {len(stored['patches_applied'])} results, rollout {stored['patch_rollout']['status']}")
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Load-test the API rate limiter in front of the SIEM/IDS integrations.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_rate_limit [--clients 5] [--seconds 5] [--concurrency 10]
+
+Drives GET /api/detection/alerts in-process through httpx's ASGI transport
+from `clients` distinct client addresses, once with RATE_LIMIT_ENABLED off and
+once on. The upstream SIEM and IDS lookups are replaced by counters that sleep
+for --upstream-ms, so the report shows how many calls reach the integrations
+and how many requests are turned away with 429. Keep --concurrency below the
+database pool size: the endpoint holds a blocking session per request.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--upstream-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/rate_limit.db"
+    os.environ["RATE_LIMIT_TRUST_FORWARDED"] = "true"
+    import httpx
+    from app.core.config import settings
+    from app.core.database import Base, engine
+    from app.core.rate_limit import rate_limit_metrics
+    from app.integrations.siem import SIEMIntegration
+    from app.integrations.ids import IDSIntegration
+    from main import app
+
+    Base.metadata.create_all(bind=engine)
+    upstream = {"calls": 0}
+
+    async def fake_upstream(self):
+        upstream["calls"] += 1
+        await asyncio.sleep(args.upstream_ms / 1000)
+        return []
+
+    SIEMIntegration.get_live_alerts = fake_upstream
+    IDSIntegration.get_live_alerts = fake_upstream
+
+    async def run(enabled: bool):
+        settings.RATE_LIMIT_ENABLED = enabled
+        upstream["calls"] = 0
+        statuses = {}
+        deadline = time.perf_counter() + args.seconds
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def worker(n: int):
+                headers = {"X-Forwarded-For": f"198.51.100.{n % args.clients}"}
+                while time.perf_counter() < deadline:
+                    response = await client.get("/api/detection/alerts", headers=headers)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+
+        total = sum(statuses.values())
+        print(f"rate limiting {'on ' if enabled else 'off'}: {total} requests in {elapsed:.1f}s "
+              f"({total / elapsed:.0f} req/s), statuses {dict(sorted(statuses.items()))}, "
+              f"upstream calls {upstream['calls']} ({upstream['calls'] / elapsed:.1f}/s)")
+
+    asyncio.run(run(False))
+    asyncio.run(run(True))
+    print("metrics:", rate_limit_metrics.snapshot())
+
+if __name__ == "__main__":
+    main()
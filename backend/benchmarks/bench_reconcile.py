@@ -0,0 +1,58 @@
+"""Benchmark firewall reconciliation against the local stub firewall.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_reconcile [--count 100000] [--drift 1000]
+
+Seeds a throwaway SQLite database with `count` active BlockedIP rows and the
+stub device with the same set minus `drift` entries plus `drift` stale
+platform blocks, then times a dry run and a corrective run.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--drift", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/reconcile.db"
+    from sqlalchemy import insert
+    from app.core.database import Base, engine, SessionLocal
+    from app.models.database import BlockedIP
+    from app.integrations.reconciliation import FirewallReconciler
+    from benchmarks.bench_firewall_block import _free_port, _start_stub, _firewall
+
+    Base.metadata.create_all(bind=engine)
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.count)]
+    stale = [f"172.16.{i >> 8 & 255}.{i & 255}" for i in range(args.drift)]
+    db = SessionLocal()
+    db.execute(insert(BlockedIP), [{"incident_id": 1, "ip_address": ip, "reason": "bench", "is_active": True} for ip in ips])
+    db.execute(insert(BlockedIP), [{"incident_id": 1, "ip_address": ip, "reason": "bench", "is_active": False} for ip in stale])
+    db.commit()
+
+    port = _free_port()
+    proc = _start_stub(port, args.latency_ms, True)
+    try:
+        firewall = _firewall(port)
+        asyncio.run(firewall.block_ips_batch(ips[args.drift:] + stale, "seed"))
+        reconciler = FirewallReconciler(db, firewall)
+
+        for dry_run in (True, False, True):
+            start = time.perf_counter()
+            result = asyncio.run(reconciler.run(dry_run))
+            elapsed = time.perf_counter() - start
+            print(f"{'dry run' if dry_run else 'reconcile':<10} {elapsed:>7.2f}s  expected={result['expected_entries']} "
+                  f"device={result['device_entries']} missing={result['missing']} unexpected={result['unexpected']}")
+    finally:
+        proc.terminate()
+        proc.wait()
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Local stub of the firewall REST API for benchmarking containment calls.
+
+Run from the backend directory:
+
+    STUB_FIREWALL_LATENCY_MS=50 python -m benchmarks.stub_firewall --port 9100
+
+then point the platform at it with FIREWALL_API_URL=http://127.0.0.1:9100.
+STUB_FIREWALL_BATCH=0 hides the batch endpoints (they answer 404) to exercise
+the concurrent per-IP fallback. Latency is simulated per request, so a batch
+of 500 costs one round trip while per-IP calls cost one each.
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+LATENCY = float(os.environ.get("STUB_FIREWALL_LATENCY_MS", "20")) / 1000
+BATCH_ENABLED = os.environ.get("STUB_FIREWALL_BATCH", "1") != "0"
+
+app = FastAPI(title="Stub Firewall")
+blocked: Dict[str, Dict] = {}
+counters = {"requests": 0, "batch_requests": 0}
+
+class BlockPayload(BaseModel):
+    ip_address: str
+    action: str
+    reason: Optional[str] = None
+    duration: Optional[str] = None
+    timestamp: Optional[str] = None
+
+class BatchPayload(BaseModel):
+    ip_addresses: List[str]
+    action: str
+    reason: Optional[str] = None
+    duration: Optional[str] = None
+    timestamp: Optional[str] = None
+
+async def _simulate_latency(batch: bool = False):
+    counters["batch_requests" if batch else "requests"] += 1
+    await asyncio.sleep(LATENCY)
+
+@app.post("/api/firewall/block")
+async def block(payload: BlockPayload):
+    await _simulate_latency()
+    blocked[payload.ip_address] = {
+        "ip": payload.ip_address,
+        "reason": payload.reason,
+        "duration": payload.duration,
+        "blocked_at": datetime.utcnow().isoformat(),
+        "rule_id": f"stub-{len(blocked) + 1}"
+    }
+    return {"success": True}
+
+@app.post("/api/firewall/unblock")
+async def unblock(payload: BlockPayload):
+    await _simulate_latency()
+    blocked.pop(payload.ip_address, None)
+    return {"success": True}
+
+@app.post("/api/firewall/block/batch")
+async def block_batch(payload: BatchPayload):
+    if not BATCH_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    await _simulate_latency(batch=True)
+    now = datetime.utcnow().isoformat()
+    for ip in payload.ip_addresses:
+        blocked[ip] = {"ip": ip, "reason": payload.reason, "duration": payload.duration,
+                       "blocked_at": now, "rule_id": f"stub-{len(blocked) + 1}"}
+    return {"success": True, "failed_ips": []}
+
+@app.post("/api/firewall/unblock/batch")
+async def unblock_batch(payload: BatchPayload):
+    if not BATCH_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    await _simulate_latency(batch=True)
+    for ip in payload.ip_addresses:
+        blocked.pop(ip, None)
+    return {"success": True, "failed_ips": []}
+
+@app.get("/api/firewall/blocked-ips")
+async def blocked_ips(offset: int = 0, limit: Optional[int] = None):
+    await _simulate_latency()
+    entries = list(blocked.values())
+    return {"blocked_ips": entries[offset:offset + limit] if limit else entries}
+
+@app.get("/api/firewall/stats")
+async def stats():
+    await _simulate_latency()
+    return {
+        "active": 1000,
+        "blocked": len(blocked),
+        "rate_limiting": False,
+        "total_rules": len(blocked),
+        "last_updated": datetime.utcnow().isoformat(),
+        **counters
+    }
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
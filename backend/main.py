@@ -1,13 +1,31 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from app.core.rate_limit import RateLimitMiddleware, rate_limit_metrics
 from app.api.routes import detection, containment, eradication, recovery, post_incident
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, upgrade_schema
+from app.core.tasks import register_periodic, start_background_tasks, stop_background_tasks
+from app.integrations.threat_feed import load_feed_store
+from app.integrations.feed_summary import refresh_feed_summary
+from app.integrations.reenrichment import refresh_threat_feed
+from app.integrations.reconciliation import reconcile_firewall
+from app.integrations.block_expiry import restore_block_expiry, expire_blocks
+from app.integrations.containment_jobs import worker_pool
+from app.integrations.action_log import action_log, flush_action_log
+from app.integrations.firewall_stats import refresh_firewall_stats
+from app.integrations.allowlist import load_protected_ranges
+from app.integrations.cve_store import refresh_vulnerability_data
+from app.integrations.patch_rollout import rollouts, check_rollouts, fail_interrupted_rollouts
+from app.integrations.ioc_clusters import refresh_incident_clusters
+from app.integrations.ioc_graph import refresh_pivot_graph
+from app.integrations.artifact_scanner import refresh_scan_path_state
+import gc
 import uvicorn
 
-# Create database tables
+# Create database tables, and add columns and indexes introduced since an existing database was created
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
 app = FastAPI(
     title="Incident Response Platform API",
@@ -15,6 +33,10 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Per-client / per-route rate limiting in front of the upstream integrations
+# (added first so CORS stays outermost and 429 responses carry CORS headers)
+app.add_middleware(RateLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +46,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup():
+    # Load threat feed indicators for ingest-time alert enrichment, and
+    # precompute the feed summary so the first dashboard views are served warm
+    await refresh_feed_summary(await load_feed_store())
+    
+    # Move everything loaded so far out of the cyclic GC's generations, once.
+    # Refreshes replace the store's dicts; freezing again on each one would pin
+    # the replaced objects in the permanent generation.
+    gc.freeze()
+    
+    # Allowlist / critical assets checked before every block
+    load_protected_ranges()
+    
+    # Rebuild the expiry schedule of temporary blocks
+    restore_block_expiry()
+    
+    # Rollouts do not survive a restart; report the ones whose process stopped checking in as failed
+    fail_interrupted_rollouts()
+    
+    # Background jobs
+    register_periodic("threat_feed_refresh", settings.THREAT_FEED_REFRESH_SECONDS, refresh_threat_feed)
+    register_periodic("firewall_reconcile", settings.FIREWALL_RECONCILE_SECONDS, reconcile_firewall)
+    register_periodic("block_expiry", settings.BLOCK_EXPIRY_TICK_SECONDS, expire_blocks)
+    register_periodic("action_log_flush", settings.ACTION_LOG_FLUSH_SECONDS, flush_action_log)
+    register_periodic("firewall_stats", settings.FIREWALL_STATS_REFRESH_SECONDS, refresh_firewall_stats, run_immediately=True)
+    register_periodic("vulnerability_data", settings.VULN_FEED_REFRESH_SECONDS, refresh_vulnerability_data, run_immediately=True)
+    register_periodic("incident_clusters", settings.INCIDENT_CLUSTER_REFRESH_SECONDS, refresh_incident_clusters, run_immediately=True)
+    register_periodic("ioc_graph", settings.IOC_GRAPH_REFRESH_SECONDS, refresh_pivot_graph, run_immediately=True)
+    register_periodic("patch_rollouts", settings.PATCH_ROLLOUT_LEASE_SECONDS / 3, check_rollouts)
+    register_periodic("scan_path_state", settings.MALWARE_SCAN_STATE_REFRESH_SECONDS, refresh_scan_path_state, run_immediately=True)
+    start_background_tasks()
+    
+    # Containment job workers (more can run as separate processes)
+    worker_pool.start(settings.CONTAINMENT_WORKERS)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await worker_pool.stop()
+    await rollouts.stop()
+    await stop_background_tasks()
+    action_log.flush()
+
 # Include API routes
 app.include_router(detection.router, prefix="/api/detection", tags=["Detection"])
 app.include_router(containment.router, prefix="/api/containment", tags=["Containment"])
@@ -39,6 +104,10 @@ async def root():
 async def health_check():
     return {"status": "healthy", "version": "1.0.0"}
 
+@app.get("/rate-limits")
+async def rate_limit_status():
+    return rate_limit_metrics.snapshot()
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
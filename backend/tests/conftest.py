@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+# Settings and the engine are created on import; point them at a scratch database first
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+import pytest
+from app.core.database import Base, SessionLocal, engine
+import app.models.database  # noqa: F401  (registers the tables)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
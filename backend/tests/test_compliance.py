@@ -0,0 +1,75 @@
+import random
+from app.integrations.compliance import ComplianceTracker, UNGROUPED
+from app.models.database import Asset, VulnerabilityFinding
+
+HOSTS = [f"host-{i}" for i in range(12)]
+CVES = [f"CVE-2024-{i:04d}" for i in range(20)]
+GROUPS = ["web", "db", "office", None]
+SEVERITIES = ["critical", "high", "medium", "low"]
+
+def nonzero(counters):
+    # Incremental counters keep rows that dropped to zero; a rebuild does not write them
+    return {
+        scope: {key: c for key, c in keys.items() if c["total"] or c["patched"]}
+        for scope, keys in counters.items()
+    }
+
+def assert_matches_rebuild(tracker):
+    incremental = nonzero(tracker.counters())
+    tracker.rebuild()
+    assert incremental == nonzero(tracker.counters())
+
+def test_incremental_counters_match_rebuild(db):
+    rnd = random.Random(7)
+    tracker = ComplianceTracker(db)
+    inventory = {host: rnd.choice(GROUPS) for host in HOSTS}
+    severity = {cve: rnd.choice(SEVERITIES) for cve in CVES}
+    affected = {cve: set(rnd.sample(HOSTS, rnd.randint(1, 5))) for cve in CVES}
+
+    for step in range(25):
+        # Inventory churn: hosts change group, leave and come back
+        for host in rnd.sample(HOSTS, 3):
+            inventory[host] = rnd.choice(GROUPS)
+        gone = set(rnd.sample(HOSTS, rnd.randint(0, 2)))
+        db.query(Asset).delete()
+        db.add_all(Asset(hostname=host, asset_group=group) for host, group in inventory.items() if host not in gone)
+        db.commit()
+
+        # Re-scored CVEs and hosts upgrading or gaining vulnerable software
+        for cve in rnd.sample(CVES, 3):
+            severity[cve] = rnd.choice(SEVERITIES)
+        for cve in rnd.sample(CVES, 4):
+            affected[cve] ^= {rnd.choice(HOSTS)}
+        vulnerabilities = [
+            {"cve_id": cve, "severity": severity[cve], "affected_systems": sorted(affected[cve] - gone)}
+            for cve in CVES if affected[cve] - gone
+        ]
+        tracker.sync_findings(vulnerabilities)
+
+        stored = {f.system: f.asset_group for f in db.query(VulnerabilityFinding)}
+        assert all(group == (inventory[host] or UNGROUPED) for host, group in stored.items())
+        assert_matches_rebuild(tracker)
+
+        tracker.attribute(step % 4 + 1, rnd.sample(vulnerabilities, min(3, len(vulnerabilities))))
+        tracker.record_patches(
+            {"vulnerability_id": v["cve_id"], "host": host, "success": rnd.random() < 0.7}
+            for v in rnd.sample(vulnerabilities, min(4, len(vulnerabilities))) for host in v["affected_systems"]
+        )
+        assert_matches_rebuild(tracker)
+
+def test_group_change_moves_counts(db):
+    db.add_all([Asset(hostname="a", asset_group="web"), Asset(hostname="b", asset_group="db")])
+    db.commit()
+    tracker = ComplianceTracker(db)
+    vulnerabilities = [{"cve_id": "CVE-1", "severity": "high", "affected_systems": ["a", "b"]}]
+    tracker.sync_findings(vulnerabilities)
+    tracker.record_patches([{"vulnerability_id": "CVE-1", "host": "a", "success": True}])
+
+    db.query(Asset).filter(Asset.hostname == "a").update({"asset_group": "db"})
+    db.commit()
+    result = tracker.sync_findings(vulnerabilities)
+
+    groups = tracker.counters("group")["group"]
+    assert result["regrouped"] == 1
+    assert groups["web"]["total"] == 0
+    assert (groups["db"]["total"], groups["db"]["patched"]) == (2, 1)
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.integrations import containment_jobs
+from app.integrations.containment_jobs import claim_job, enqueue_job, run_job
+from app.models.database import ContainmentJob
+
+def queue(db, count):
+    return [enqueue_job(db, "block", {"ip_addresses": [f"203.0.113.{i}"], "reason": "test"})[0].id for i in range(count)]
+
+def test_each_job_is_claimed_once(db):
+    ids = queue(db, 15)
+    workers = [SessionLocal() for _ in range(3)]
+    try:
+        claimed = []
+        while True:
+            rounds = [claim_job(session, f"worker-{n}") for n, session in enumerate(workers)]
+            claimed.extend(job_id for job_id in rounds if job_id is not None)
+            if not any(rounds):
+                break
+    finally:
+        for session in workers:
+            session.close()
+
+    assert sorted(claimed) == sorted(ids)
+    for job in db.query(ContainmentJob):
+        assert job.status == "running"
+        assert job.attempts == 1
+        assert job.locked_by.startswith("worker-")
+
+def test_claim_respects_lease_and_schedule(db):
+    job_id, = queue(db, 1)
+    assert claim_job(db, "worker-a") == job_id
+    # Held under a live lease
+    assert claim_job(db, "worker-b") is None
+
+    # The holder died: once the lease lapses another worker takes over
+    db.query(ContainmentJob).filter(ContainmentJob.id == job_id).update(
+        {"locked_at": datetime.utcnow() - timedelta(seconds=settings.JOB_LEASE_SECONDS + 1)}
+    )
+    db.commit()
+    assert claim_job(db, "worker-b") == job_id
+    job = db.get(ContainmentJob, job_id)
+    db.refresh(job)
+    assert (job.locked_by, job.attempts) == ("worker-b", 2)
+
+def test_retry_waits_for_next_run_at(db):
+    job_id, = queue(db, 1)
+    db.query(ContainmentJob).filter(ContainmentJob.id == job_id).update(
+        {"next_run_at": datetime.utcnow() + timedelta(minutes=5)}
+    )
+    db.commit()
+    assert claim_job(db, "worker-a") is None
+
+def test_idempotency_key_queues_once(db):
+    first, created = enqueue_job(db, "unblock", {"ip_addresses": ["198.51.100.1"]}, idempotency_key="k1")
+    again, created_again = enqueue_job(db, "unblock", {"ip_addresses": ["198.51.100.1"]}, idempotency_key="k1")
+    assert created and not created_again
+    assert first.id == again.id
+    assert db.query(ContainmentJob).count() == 1
+
+def test_reclaimed_job_discards_stale_outcome(db, monkeypatch):
+    job_id, = queue(db, 1)
+    claim_job(db, "worker-a")
+
+    async def slow_block(session, firewall, job):
+        # The lease lapsed mid-run and worker-b took the job over
+        other = SessionLocal()
+        other.query(ContainmentJob).filter(ContainmentJob.id == job_id).update({"locked_by": "worker-b"})
+        other.commit()
+        other.close()
+        return {"blocked": ["203.0.113.0"]}, None
+
+    monkeypatch.setitem(containment_jobs.handlers, "block", slow_block)
+    asyncio.run(run_job(db, job_id))
+
+    job = db.get(ContainmentJob, job_id)
+    db.refresh(job)
+    assert (job.status, job.locked_by, job.result) == ("running", "worker-b", None)
+
+def test_heartbeat_keeps_long_jobs_leased(db, monkeypatch):
+    job_id, = queue(db, 1)
+    claim_job(db, "worker-a")
+    monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 0.3)
+    claimed_by_other = []
+
+    async def long_block(session, firewall, job):
+        for _ in range(5):
+            await asyncio.sleep(0.15)
+            other = SessionLocal()
+            claimed_by_other.append(claim_job(other, "worker-b"))
+            other.close()
+        return {"blocked": ["203.0.113.0"]}, None
+
+    monkeypatch.setitem(containment_jobs.handlers, "block", long_block)
+    asyncio.run(run_job(db, job_id))
+
+    job = db.get(ContainmentJob, job_id)
+    db.refresh(job)
+    assert claimed_by_other == [None] * 5
+    assert (job.status, job.locked_by) == ("succeeded", None)
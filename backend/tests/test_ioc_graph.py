@@ -0,0 +1,56 @@
+import random
+from app.integrations.ioc_graph import PivotGraph
+
+def adjacency(graph):
+    """node -> (sorted base neighbours, delta neighbours)"""
+    result = {}
+    for node in range(len(graph)):
+        lo, hi = graph._base(node)
+        result[node] = (list(graph.targets[lo:hi]), set(graph.delta.get(node, ())))
+    return result
+
+def assert_consistent(graph, reference):
+    offsets = graph.offsets
+    assert offsets[0] == 0 and offsets[-1] == len(graph.targets)
+    assert all(a <= b for a, b in zip(offsets, offsets[1:]))
+    assert len(offsets) - 1 <= len(graph)
+
+    arcs = 0
+    for node, (base, added) in adjacency(graph).items():
+        # Sorted, duplicate-free base slice that never repeats a delta arc
+        assert all(a < b for a, b in zip(base, base[1:]))
+        assert not added & set(base)
+        assert node not in base and node not in added
+        names = {graph.names[n] for n in base} | {graph.names[n] for n in added}
+        assert names == reference.get(graph.names[node], set())
+        arcs += len(base) + len(added)
+    assert arcs == 2 * graph.edges
+    assert graph.delta_arcs == sum(len(added) for added in graph.delta.values())
+
+def test_compaction_preserves_edges():
+    rnd = random.Random(11)
+    graph = PivotGraph(compact_ratio=0.3, min_compact=20)
+    reference = {}
+    keys = [f"ip:10.0.0.{i}" for i in range(40)] + [f"alert:{i}" for i in range(80)] + [f"incident:{i}" for i in range(5)]
+
+    for batch in range(60):
+        pairs = [(rnd.choice(keys), rnd.choice(keys)) for _ in range(rnd.randint(1, 30))]
+        # Repeats and self-links must not add edges
+        pairs += pairs[:3] + [(keys[0], keys[0])]
+        graph.link_many(pairs)
+        for a, b in pairs:
+            if a != b:
+                reference.setdefault(a, set()).add(b)
+                reference.setdefault(b, set()).add(a)
+        assert_consistent(graph, reference)
+
+    graph._compact()
+    assert not graph.delta and graph.delta_arcs == 0
+    assert_consistent(graph, reference)
+
+def test_pivot_walks_merged_and_pending_edges():
+    graph = PivotGraph(min_compact=2)
+    graph.link_many([("incident:1", "alert:1"), ("alert:1", "ip:203.0.113.9")])
+    graph.link("ip:203.0.113.9", "alert:2")  # still in the delta
+    result = graph.pivot("incident:1", depth=3)
+    assert {node["id"] for node in result["nodes"]} >= {"incident:1", "alert:1", "ip:203.0.113.9", "alert:2"}
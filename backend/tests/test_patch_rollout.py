@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+from app.core.config import settings
+from app.integrations.patch_rollout import PROCESS_ID, fail_interrupted_rollouts
+from app.models.database import Incident, PatchRolloutRecord
+
+def rollout(db, rollout_id, incident_id, owner, heartbeat_at):
+    summary = {"rollout_id": rollout_id, "incident_id": incident_id, "status": "running"}
+    db.add(Incident(id=incident_id, title=f"incident {incident_id}", eradication_data={"patch_rollout": summary}))
+    db.add(PatchRolloutRecord(id=rollout_id, incident_id=incident_id, status="running", summary=summary,
+                              hosts={}, results=[], owner=owner, heartbeat_at=heartbeat_at))
+    db.commit()
+
+def test_only_rollouts_of_stale_owners_fail(db):
+    stale = datetime.utcnow() - timedelta(seconds=settings.PATCH_ROLLOUT_LEASE_SECONDS + 1)
+    rollout(db, "live", 1, "other-process", datetime.utcnow())
+    rollout(db, "stale", 2, "crashed-process", stale)
+    rollout(db, "legacy", 3, None, None)
+    rollout(db, "ours", 4, PROCESS_ID, datetime.utcnow())
+
+    fail_interrupted_rollouts()
+    db.expire_all()
+
+    statuses = {record.id: record.status for record in db.query(PatchRolloutRecord)}
+    assert statuses == {"live": "running", "stale": "failed", "legacy": "failed", "ours": "running"}
+    incidents = {incident.id: incident.eradication_data["patch_rollout"] for incident in db.query(Incident)}
+    assert incidents[1]["status"] == "running"
+    assert incidents[2]["status"] == "failed"
+    assert incidents[2]["halt_reason"] == "Interrupted before completion"
+    assert incidents[3]["status"] == "failed"
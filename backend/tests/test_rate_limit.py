@@ -0,0 +1,37 @@
+import asyncio
+from app.core.config import settings
+from app.core.rate_limit import RateLimitMiddleware
+
+def request(middleware, method, path):
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    scope = {"type": "http", "method": method, "path": path, "headers": [], "client": ("198.51.100.7", 4000)}
+    asyncio.run(middleware(scope, None, send))
+    return statuses[0]
+
+async def ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+def limited(monkeypatch, default, routes):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "RATE_LIMIT_BACKEND", "memory")
+    monkeypatch.setattr(settings, "RATE_LIMIT_DEFAULT", default)
+    return RateLimitMiddleware(ok, route_limits=routes)
+
+def test_route_rejections_leave_the_default_budget(monkeypatch):
+    middleware = limited(monkeypatch, "3/hour:3", {"POST /api/scan": "1/hour:1"})
+    assert request(middleware, "POST", "/api/scan") == 200
+    assert [request(middleware, "POST", "/api/scan") for _ in range(5)] == [429] * 5
+    # Only the allowed scan counted against the default limit
+    assert [request(middleware, "GET", "/api/other") for _ in range(3)] == [200, 200, 429]
+
+def test_preflights_are_not_limited(monkeypatch):
+    middleware = limited(monkeypatch, "1/hour:1", {})
+    assert [request(middleware, "OPTIONS", "/api/other") for _ in range(3)] == [200] * 3
+    assert request(middleware, "GET", "/api/other") == 200
+    assert request(middleware, "GET", "/api/other") == 429
@@ -0,0 +1,77 @@
+from app.integrations import reenrichment
+from app.integrations.ioc_graph import PivotGraph
+from app.integrations.reenrichment import ReEnrichmentJob
+from app.integrations.threat_feed import ThreatFeedStore
+from app.models.database import Alert, ThreatIndicator
+
+def feed(*records):
+    store = ThreatFeedStore()
+    store.load([{"value": "192.0.2.1", "type": "ip", "score": 2}, *records])
+    store.drain_delta()
+    return store
+
+def alert(db, **fields):
+    row = Alert(incident_id=1, severity="low", source_ip=fields.pop("source_ip", "198.51.100.50"), raw_data=fields)
+    db.add(row)
+    db.commit()
+    return row.id
+
+def reenrich(db, store):
+    return ReEnrichmentJob(db, store).run(store.drain_delta())
+
+def matches(db, alert_id):
+    return [m["value"] for m in db.get(Alert, alert_id).raw_data.get("ioc_matches", [])]
+
+def test_block_changes_rescore_only_covered_rows(db, monkeypatch):
+    monkeypatch.setattr(reenrichment, "pivot_graph", PivotGraph())
+    store = feed()
+    inside = alert(db, source_ip="203.0.113.77")
+    outside = alert(db, source_ip="203.0.114.77")
+    db.add(ThreatIndicator(incident_id=1, indicator_type="ip", value="203.0.113.77", threat_score=1))
+    db.commit()
+
+    store.apply_delta([{"value": "203.0.113.0/24", "type": "ip", "score": 9, "name": "botnet"}])
+    stats = reenrich(db, store)
+    assert (stats["alerts_updated"], stats["indicators_updated"]) == (1, 1)
+    assert matches(db, inside) == ["203.0.113.77"] and matches(db, outside) == []
+    assert db.query(ThreatIndicator).one().threat_score == 9
+
+    # Removing the block clears the matches it produced
+    store.apply_delta([], removed=["203.0.113.0/24"])
+    stats = reenrich(db, store)
+    db.expire_all()
+    assert stats["alerts_updated"] == 1
+    assert matches(db, inside) == []
+    assert db.get(Alert, inside).triage_score == 1
+    assert "feed_removed_at" in db.query(ThreatIndicator).one().indicator_metadata
+
+def test_exact_and_block_match_updates_row_once(db, monkeypatch):
+    monkeypatch.setattr(reenrichment, "pivot_graph", PivotGraph())
+    store = feed()
+    db.add(ThreatIndicator(incident_id=1, indicator_type="ip", value="203.0.113.5", threat_score=1))
+    db.commit()
+    store.apply_delta([
+        {"value": "203.0.113.5", "type": "ip", "score": 8},
+        {"value": "203.0.113.0/24", "type": "ip", "score": 6}
+    ])
+    stats = reenrich(db, store)
+    assert stats["indicators_updated"] == 1
+    assert db.query(ThreatIndicator).one().threat_score == 8
+
+def test_domain_and_hash_deltas_reach_alerts(db, monkeypatch):
+    monkeypatch.setattr(reenrichment, "pivot_graph", PivotGraph())
+    store = feed()
+    by_domain = alert(db, domain="c2.example.net")
+    by_hash = alert(db, hashes=["d41d8cd98f00b204e9800998ecf8427e"])
+    unrelated = alert(db, domain="example.org")
+
+    store.apply_delta([
+        {"value": "c2.example.net", "type": "domain", "score": 9},
+        {"value": "d41d8cd98f00b204e9800998ecf8427e", "type": "hash", "score": 7}
+    ])
+    stats = reenrich(db, store)
+    assert stats["alerts_updated"] == 2
+    assert matches(db, by_domain) == ["c2.example.net"]
+    assert matches(db, by_hash) == ["d41d8cd98f00b204e9800998ecf8427e"]
+    assert matches(db, unrelated) == []
+    assert stats["notifications"] == 2
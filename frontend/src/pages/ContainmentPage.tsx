@@ -39,6 +39,8 @@ const ContainmentPage: React.FC<ContainmentPageProps> = ({ currentIncident }) =>
   const [blockDialogOpen, setBlockDialogOpen] = useState(false);
   const [selectedIPs, setSelectedIPs] = useState<string[]>([]);
   const [blockReason, setBlockReason] = useState('');
+  // Requested addresses refused because they fall in protected ranges
+  const [conflicts, setConflicts] = useState<Record<string, { network: string; label: string }[]>>({});
 
   useEffect(() => {
     if (currentIncident) {
@@ -74,6 +76,25 @@ const ContainmentPage: React.FC<ContainmentPageProps> = ({ currentIncident }) =>
     }
   };
 
+  // Containment actions run as background jobs; poll until the job finishes
+  // (or give up after JOB_WAIT_ATTEMPTS polls)
+  const JOB_POLL_MS = 500;
+  const JOB_WAIT_ATTEMPTS = 240;
+  const waitForJob = async (jobId: number): Promise<any> => {
+    for (let attempt = 0; attempt < JOB_WAIT_ATTEMPTS; attempt++) {
+      const response = await fetch(`/api/containment/jobs/${jobId}`);
+      if (!response.ok) {
+        throw new Error(`Job ${jobId} status request failed with HTTP ${response.status}`);
+      }
+      const job = await response.json();
+      if (job.status === 'succeeded' || job.status === 'failed') {
+        return job;
+      }
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_MS));
+    }
+    throw new Error(`Job ${jobId} did not finish within ${(JOB_POLL_MS * JOB_WAIT_ATTEMPTS) / 1000}s`);
+  };
+
   const handleBlockIPs = async () => {
     try {
       const response = await fetch('/api/containment/block-ips', {
@@ -88,17 +109,31 @@ const ContainmentPage: React.FC<ContainmentPageProps> = ({ currentIncident }) =>
         }),
       });
       
+      if (response.status === 409) {
+        // Every address is protected: nothing was queued
+        const data = await response.json();
+        setConflicts(data.detail?.conflicts || {});
+        setBlockDialogOpen(false);
+        return;
+      }
       if (response.ok) {
         const data = await response.json();
-        setBlockedIPs([...blockedIPs, ...data.blocked_ips]);
+        setConflicts(data.conflicts || {});
+        const job = await waitForJob(data.job_id);
+        if (job.status === 'failed') {
+          throw new Error(job.error || `Job ${job.job_id} failed`);
+        }
+        const blocked: string[] = job.result?.blocked_ips || [];
+        setBlockedIPs([...blockedIPs, ...blocked]);
         setSelectedIPs([]);
         setBlockDialogOpen(false);
         setBlockReason('');
         fetchContainmentStatus();
-        alert(`Successfully blocked ${data.blocked_ips.length} IP addresses`);
+        alert(`Successfully blocked ${blocked.length} IP addresses`);
       }
     } catch (error) {
       console.error('Error blocking IPs:', error);
+      alert(`Blocking failed: ${error instanceof Error ? error.message : error}`);
     }
   };
 
@@ -146,6 +181,15 @@ const ContainmentPage: React.FC<ContainmentPageProps> = ({ currentIncident }) =>
         </Typography>
       </Box>
 
+      {Object.keys(conflicts).length > 0 && (
+        <Alert severity="warning" sx={{ mb: 2 }} onClose={() => setConflicts({})}>
+          Not blocked (protected ranges):{' '}
+          {Object.entries(conflicts)
+            .map(([ip, ranges]) => `${ip} (${ranges.map((r) => `${r.label} ${r.network}`).join(', ')})`)
+            .join('; ')}
+        </Alert>
+      )}
+
       <Grid container spacing={3}>
         <Grid item xs={12} md={6}>
           <Card>
@@ -77,7 +77,7 @@ const EradicationPage: React.FC<EradicationPageProps> = ({ currentIncident }) =>
     
     try {
       const indicators = iocSearch.split('\n').map(i => i.trim()).filter(i => i);
-      const response = await fetch('/api/eradication/search-iocs', {
+      const response = await fetch('/api/eradication/search-iocs/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -88,9 +88,26 @@ const EradicationPage: React.FC<EradicationPageProps> = ({ currentIncident }) =>
         }),
       });
       
-      if (response.ok) {
-        const data = await response.json();
-        setThreatIndicators(data.results || []);
+      if (response.ok && response.body) {
+        // Results arrive as NDJSON lines while lookups resolve; show hits as they come in
+        setThreatIndicators([]);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffered += decoder.decode(value, { stream: true });
+          const lines = buffered.split('\n');
+          buffered = lines.pop() || '';
+          const hits = lines
+            .filter(line => line.trim())
+            .map(line => JSON.parse(line))
+            .filter(event => event.type === 'result' && event.malicious);
+          if (hits.length > 0) {
+            setThreatIndicators(previous => [...previous, ...hits]);
+          }
+        }
       }
     } catch (error) {
       console.error('Error searching IOCs:', error);
@@ -115,8 +132,16 @@ const EradicationPage: React.FC<EradicationPageProps> = ({ currentIncident }) =>
       });
       
       if (response.ok) {
-        const data = await response.json();
-        alert(`Applied ${data.success_count} patches successfully`);
+        let rollout = await response.json();
+        while (!['completed', 'halted', 'failed'].includes(rollout.status)) {
+          await new Promise(resolve => setTimeout(resolve, 2000));
+          const progress = await fetch(`/api/eradication/patch-rollouts/${rollout.rollout_id}`);
+          if (!progress.ok) break;
+          rollout = await progress.json();
+        }
+        alert(rollout.status === 'completed'
+          ? `Applied ${rollout.success_count} patches successfully`
+          : `Patch rollout ${rollout.status}: ${rollout.halt_reason || 'see eradication data'}`);
         fetchVulnerabilities();
       }
     } catch (error) {